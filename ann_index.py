@@ -0,0 +1,374 @@
+import os
+import json
+import numpy as np
+from typing import Dict, Iterable, Optional, Tuple
+
+# FAISS opcionális (lásd embedding_manager); e modul FAISS függvényei csak elérhető könyvtár mellett hívhatók
+try:
+    import faiss  # type: ignore
+    _HAS_FAISS = True
+except Exception:
+    faiss = None  # type: ignore
+    _HAS_FAISS = False
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+_ANN_INDEX = "ann.index"
+_ANN_META = "ann.json"
+_IVF_CENTROIDS = "ivf_centroids.npy"
+_IVF_ASSIGN = "ivf_assign.npy"
+
+# Ennél kevesebb vektorra a PQ kódkönyvek (256 középpont / alvektor) nem taníthatók értelmesen
+_PQ_MIN_ROWS = 10_000
+# FAISS ajánlás: listánként legalább ~39 tanítópont
+_TRAIN_POINTS_PER_LIST = 64
+
+
+def resolve_index_type(requested: str, ntotal: int, auto_threshold: int, use_faiss: bool = True) -> str:
+    """A ténylegesen használt indextípus.
+    "auto": a küszöb alatt pontos (flat) keresés, felette IVF-Flat; 2 millió sor felett IVF-PQ,
+    hogy a memóriaigény ne nőjön a teljes mátrix méretével.
+    FAISS nélkül minden közelítő típus a NumPy IVF-re (ivf_flat) képeződik le.
+    """
+    requested = (requested or "auto").strip().lower()
+    if requested == "auto":
+        if ntotal < auto_threshold:
+            return "flat"
+        resolved = "ivf_pq" if ntotal >= 2_000_000 else "ivf_flat"
+    elif requested not in INDEX_TYPES:
+        raise ValueError(f"Ismeretlen indextípus: {requested} (lehetséges: auto, {', '.join(INDEX_TYPES)})")
+    else:
+        resolved = requested
+    if resolved == "ivf_pq" and ntotal < _PQ_MIN_ROWS:
+        resolved = "ivf_flat"
+    if not use_faiss and resolved != "flat":
+        return "ivf_flat"
+    return resolved
+
+
+def default_nlist(ntotal: int, per_sqrt: float = 4.0) -> int:
+    """IVF listák száma: ~per_sqrt·√N, legfeljebb annyi, hogy listánként maradjon elég tanítópont."""
+    nlist = int(per_sqrt * np.sqrt(max(ntotal, 1)))
+    return max(1, min(nlist, ntotal // _TRAIN_POINTS_PER_LIST or 1))
+
+
+def needs_retrain(index, trained_ntotal: int, ntotal: int, params: Dict) -> bool:
+    """Elavult-e a tanított IVF / IVF-PQ index (középpontok, PQ kódkönyvek) a tároló növekedése miatt.
+    A hozzáadás csak a meglévő középpontokhoz rendel: kis első ingest után (pl. nlist=1) az index
+    a további ingestek során egy lassú flat kereséssé fajulna. Újratanítás kell, ha a sorok száma
+    a tanításkorinak legalább kétszerese (így az újratanítás összköltsége amortizáltan O(N)), vagy
+    ha az automatikus listaszám legalább kétszeresen eltér a jelenlegitől.
+    """
+    nlist = getattr(index, "nlist", None)
+    if index is None or nlist is None:
+        return False
+    if ntotal >= 2 * max(int(trained_ntotal), 1):
+        return True
+    if int(params.get("nlist") or 0):
+        return False
+    target = default_nlist(ntotal, per_sqrt=1.0 if isinstance(index, NumpyIVF) else 4.0)
+    return target >= 2 * int(nlist) or int(nlist) >= 2 * target
+
+
+def default_pq_m(dimension: int) -> int:
+    """PQ alvektorok száma: a legnagyobb, amely osztja a dimenziót (alvektoronként ≥ 4 dimenzió)."""
+    for m in (64, 48, 32, 24, 16, 12, 8, 4, 2, 1):
+        if dimension % m == 0 and dimension // m >= 4:
+            return m
+    return 1
+
+
+def _scalar_quantizer_type(vector_dtype: str):
+    """FAISS skalár kvantáló típus (int8: dimenziónkénti min/max tartomány), float32-re None."""
+    if vector_dtype == "float16":
+        return faiss.ScalarQuantizer.QT_fp16  # type: ignore
+    if vector_dtype == "int8":
+        return faiss.ScalarQuantizer.QT_8bit  # type: ignore
+    return None
+
+
+def exceeds_quantizer_range(index, vectors: np.ndarray) -> bool:
+    """Kilógnak-e az új vektorok a FAISS int8 skalár kvantáló tanított (min/max) tartományából.
+    A tartományon kívüli értékeket a kvantáló levágja, ezért ilyenkor újra kell tanítani az indexet.
+    IVF indexeknél a kvantáló a középponttól vett eltérést (reziduumot) kódolja, ezt vetjük össze.
+    Egy kvantálási lépésnyi túllógást eltűrünk (ennyi a kerekítési hiba is).
+    """
+    if not _HAS_FAISS or index is None:
+        return False
+    holder = faiss.downcast_index(index.storage) if hasattr(index, "storage") else index  # type: ignore
+    sq = getattr(holder, "sq", None)
+    if sq is None or sq.qtype != faiss.ScalarQuantizer.QT_8bit:  # type: ignore
+        return False
+    d = int(sq.d)
+    trained = faiss.vector_to_array(sq.trained)  # type: ignore
+    if trained.size != 2 * d:
+        return False
+    x = np.ascontiguousarray(vectors, dtype=np.float32)
+    if getattr(holder, "by_residual", False):
+        _, lists = holder.quantizer.search(x, 1)
+        x = x - holder.quantizer.reconstruct_batch(lists.ravel())
+    vmin, vdiff = trained[:d], trained[d:]
+    step = vdiff / 255.0
+    return bool(np.any((x < vmin - step) | (x > vmin + vdiff + step)))
+
+
+def create_index(index_type: str, dimension: int, ntotal: int, params: Dict):
+    """Üres (még nem tanított) FAISS index létrehozása belső szorzat (IP = cos sim) metrikával.
+    params["vector_dtype"] = float16 / int8 esetén a flat, IVF-Flat és HNSW indexek a vektorokat
+    skalár kvantálva tárolják (az IVF-PQ eleve tömörít).
+    """
+    qtype = _scalar_quantizer_type(params.get("vector_dtype") or "float32")
+    metric = faiss.METRIC_INNER_PRODUCT  # type: ignore
+    if index_type == "flat":
+        if qtype is not None:
+            return faiss.IndexScalarQuantizer(dimension, qtype, metric)  # type: ignore
+        return faiss.IndexFlatIP(dimension)  # type: ignore
+    if index_type == "hnsw":
+        hnsw_m = int(params.get("hnsw_m") or 32)
+        if qtype is not None:
+            index = faiss.IndexHNSWSQ(dimension, qtype, hnsw_m, metric)  # type: ignore
+        else:
+            index = faiss.IndexHNSWFlat(dimension, hnsw_m, metric)  # type: ignore
+        index.hnsw.efConstruction = int(params.get("ef_construction") or 200)
+        return index
+    nlist = int(params.get("nlist") or 0) or default_nlist(ntotal)
+    quantizer = faiss.IndexFlatIP(dimension)  # type: ignore
+    if index_type == "ivf_flat":
+        if qtype is not None:
+            return faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, qtype, metric)  # type: ignore
+        return faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)  # type: ignore
+    pq_m = int(params.get("pq_m") or 0) or default_pq_m(dimension)
+    return faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, 8, faiss.METRIC_INNER_PRODUCT)  # type: ignore
+
+
+def set_search_params(index, params: Dict):
+    """Keresési paraméterek (nprobe / efSearch) beállítása; betöltés után is meg kell hívni."""
+    if hasattr(index, "nprobe"):
+        index.nprobe = max(1, min(int(params.get("nprobe") or 16), int(index.nlist)))
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = int(params.get("ef_search") or 64)
+
+
+def training_sample(store, ntotal: int, nlist: int, seed: int = 0,
+                    points_per_list: int = _TRAIN_POINTS_PER_LIST) -> np.ndarray:
+    """Véletlen (rendezett sorszámú) minta a tárolóból a tanításhoz."""
+    size = min(ntotal, max(nlist * points_per_list, 10_000))
+    if size >= ntotal:
+        rows = np.arange(ntotal)
+    else:
+        rows = np.sort(np.random.default_rng(seed).choice(ntotal, size=size, replace=False))
+    return np.ascontiguousarray(store.vectors(rows), dtype=np.float32)
+
+
+def _nearest_centroid(centroids: np.ndarray, vectors: np.ndarray, chunk: int = 65536) -> np.ndarray:
+    """Minden vektorhoz a legnagyobb belső szorzatú középpont sorszáma (darabolva, korlátos memóriával)."""
+    out = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], chunk):
+        part = np.asarray(vectors[start:start + chunk], dtype=np.float32)
+        out[start:start + chunk] = np.argmax(np.matmul(part, centroids.T), axis=1)
+    return out
+
+
+def spherical_kmeans(x: np.ndarray, nlist: int, iters: int = 15, seed: int = 0) -> np.ndarray:
+    """Gömbi k-means (normalizált középpontok, IP hasonlóság) tisztán NumPy-ban."""
+    rng = np.random.default_rng(seed)
+    nlist = max(1, min(nlist, x.shape[0]))
+    centroids = x[rng.choice(x.shape[0], size=nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = _nearest_centroid(centroids, x)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(x[order], starts, axis=0)
+        # Üres klaszterek újraindítása véletlen mintapontból
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            sums[empty] = x[rng.choice(x.shape[0], size=empty.size, replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = (sums / np.maximum(norms, 1e-12)).astype(np.float32)
+    return centroids
+
+
+class NumpyIVF:
+    """FAISS nélküli közelítő index: k-means durva klaszterezés + invertált listák.
+
+    A vektorok a chunk tárolóban (mmap szegmensek) maradnak; az index csak a középpontokat és
+    a soronkénti listahozzárendelést tárolja. Keresésnél a lekérdezéshez legközelebbi nprobe
+    lista sorait pontozzuk, így a költség ~nlist + nprobe·N/nlist, azaz √N-nel nő.
+    A felülete (ntotal, nprobe, add, search) a FAISS indexekét követi.
+    """
+
+    def __init__(self, store, centroids: np.ndarray, assign: np.ndarray, nprobe: int = 16):
+        self.store = store
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.assign = np.asarray(assign, dtype=np.int32)
+        self.nprobe = nprobe
+        self._lists: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.assign.shape[0])
+
+    @property
+    def nlist(self) -> int:
+        return int(self.centroids.shape[0])
+
+    @classmethod
+    def build(cls, store, params: Dict, seed: int = 0) -> "NumpyIVF":
+        ntotal = len(store)
+        # NumPy-ban a tanítás és a hozzárendelés drágább, ezért kevesebb (~√N) lista
+        nlist = int(params.get("nlist") or 0) or default_nlist(ntotal, per_sqrt=1.0)
+        sample = training_sample(store, ntotal, nlist, seed, points_per_list=32)
+        centroids = spherical_kmeans(sample, nlist, seed=seed)
+        assign = np.concatenate([_nearest_centroid(centroids, block) for block in store.iter_vectors()])
+        index = cls(store, centroids, assign)
+        set_search_params(index, params)
+        return index
+
+    def add(self, vectors: np.ndarray):
+        """Új sorok hozzárendelése a meglévő középpontokhoz (újratanítás nélkül)."""
+        self.assign = np.concatenate([self.assign, _nearest_centroid(self.centroids, vectors)])
+        self._lists = None
+
+    def _inverted_lists(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._lists is None:
+            order = np.argsort(self.assign, kind="stable").astype(np.int64)
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(self.assign, minlength=self.nlist))])
+            self._lists = (order, offsets)
+        return self._lists
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        rows, offsets = self._inverted_lists()
+        m = queries.shape[0]
+        out_scores = np.full((m, k), -np.inf, dtype=np.float32)
+        out_idx = np.full((m, k), -1, dtype=np.int64)
+        nprobe = max(1, min(self.nprobe, self.nlist))
+        probes = np.argpartition(-np.matmul(queries, self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        for q in range(m):
+            candidates = np.concatenate([rows[offsets[c]:offsets[c + 1]] for c in probes[q]])
+            if candidates.size == 0:
+                continue
+            # Rendezett sorszámok: szekvenciálisabb olvasás a memória-leképezett szegmensekből
+            candidates.sort()
+            scores = np.matmul(self.store.vectors(candidates, exact=False), queries[q])
+            kk = min(k, candidates.size)
+            top = np.argpartition(-scores, kk - 1)[:kk]
+            top = top[np.argsort(-scores[top])]
+            out_scores[q, :kk] = scores[top]
+            out_idx[q, :kk] = candidates[top]
+        return out_scores, out_idx
+
+
+def build_from_store(store, index_type: str, params: Dict):
+    """Index felépítése a chunk tároló vektoraiból: tanítás (IVF) mintán, majd blokkonkénti hozzáadás.
+    A FAISS sorazonosítók a hozzáadás sorrendje miatt megegyeznek a tároló sorszámaival.
+    """
+    dimension = store.dimension
+    ntotal = len(store)
+    if dimension is None:
+        return None
+    index = create_index(index_type, dimension, ntotal, params)
+    if not index.is_trained:
+        index.train(training_sample(store, ntotal, int(getattr(index, "nlist", 1))))
+    for block in store.iter_vectors():
+        index.add(np.ascontiguousarray(block, dtype=np.float32))
+    set_search_params(index, params)
+    return index
+
+
+def exact_search(blocks: Iterable[Tuple[int, np.ndarray]], queries: np.ndarray, k: int) -> np.ndarray:
+    """Pontos top-k sorszámok (ground truth) blokkonkénti mátrixszorzással.
+    Blokkonként csak a top-k jelöltet tartjuk meg, és ezeket egyesítjük a futó top-k-val,
+    így a memóriaigény n_queries × (k + blokkméret), nem n_queries × N.
+    """
+    best_scores = np.empty((queries.shape[0], 0), dtype=np.float32)
+    best_rows = np.empty((queries.shape[0], 0), dtype=np.int64)
+    for start, block in blocks:
+        if block.shape[0] == 0:
+            continue
+        scores = np.matmul(queries, block.T)
+        kk = min(k, scores.shape[1])
+        top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+        best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+        best_rows = np.concatenate([best_rows, top + start], axis=1)
+        if best_scores.shape[1] > k:
+            keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+            best_rows = np.take_along_axis(best_rows, keep, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best_rows, order, axis=1)
+
+
+def recall_at_k(approx: np.ndarray, exact: np.ndarray) -> float:
+    """Átlagos recall@k: a pontos top-k hányad része szerepel a közelítő top-k-ban."""
+    if exact.size == 0:
+        return 1.0
+    hits = [len(set(a[a >= 0].tolist()) & set(e.tolist())) / len(e) for a, e in zip(approx, exact)]
+    return float(np.mean(hits))
+
+
+def measure_recall(index, store, k: int = 10, n_queries: int = 200, seed: int = 1) -> float:
+    """Az ANN index recall@k értéke a pontos (flat) kereséshez képest, tárolt vektorokkal mint lekérdezésekkel."""
+    ntotal = len(store)
+    if ntotal == 0:
+        return 1.0
+    rows = np.sort(np.random.default_rng(seed).choice(ntotal, size=min(n_queries, ntotal), replace=False))
+    queries = np.ascontiguousarray(store.vectors(rows), dtype=np.float32)
+    exact = exact_search(store.vector_blocks(), queries, k)
+    _, approx = index.search(queries, min(k, ntotal))
+    return recall_at_k(approx, exact)
+
+
+def save(path: str, index, index_type: str, ntotal: int, recall: Optional[float], vector_dtype: str = "float32",
+         trained_ntotal: Optional[int] = None):
+    """Az index és a leíró (háttér, típus, sorszám, tanításkori sorszám, mért recall) mentése a tároló könyvtárába."""
+    os.makedirs(path, exist_ok=True)
+    if isinstance(index, NumpyIVF):
+        backend = "numpy"
+        for name, array in ((_IVF_CENTROIDS, index.centroids), (_IVF_ASSIGN, index.assign)):
+            tmp = os.path.join(path, name + ".tmp.npy")
+            np.save(tmp, array)
+            os.replace(tmp, os.path.join(path, name))
+    else:
+        backend = "faiss"
+        tmp = os.path.join(path, _ANN_INDEX + ".tmp")
+        faiss.write_index(index, tmp)  # type: ignore
+        os.replace(tmp, os.path.join(path, _ANN_INDEX))
+    with open(os.path.join(path, _ANN_META), "w", encoding="utf-8") as f:
+        json.dump({"backend": backend, "type": index_type, "vector_dtype": vector_dtype,
+                   "ntotal": int(ntotal), "trained_ntotal": int(trained_ntotal if trained_ntotal is not None else ntotal),
+                   "recall_at_k": recall}, f)
+
+
+def load(path: str, index_type: str, ntotal: int, store=None, vector_dtype: str = "float32"):
+    """Mentett index betöltése, ha háttere, típusa és sorszáma egyezik; különben None (újraépítés kell).
+    store megadása esetén a NumPy IVF indexet keressük (a vektorokat a tárolóból olvassa).
+    Visszaadja: (index, mért recall, a tanításkori sorszám).
+    """
+    meta_path = os.path.join(path, _ANN_META)
+    if not os.path.exists(meta_path):
+        return None, None, 0
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    backend = "numpy" if store is not None else "faiss"
+    if (meta.get("backend", "faiss") != backend or meta.get("type") != index_type
+            or meta.get("vector_dtype", "float32") != vector_dtype or int(meta.get("ntotal", -1)) != ntotal):
+        return None, None, 0
+    trained = int(meta.get("trained_ntotal", ntotal))
+    if backend == "numpy":
+        files = [os.path.join(path, name) for name in (_IVF_CENTROIDS, _IVF_ASSIGN)]
+        if not all(os.path.exists(f) for f in files):
+            return None, None, 0
+        return NumpyIVF(store, np.load(files[0]), np.load(files[1])), meta.get("recall_at_k"), trained
+    if not os.path.exists(os.path.join(path, _ANN_INDEX)):
+        return None, None, 0
+    return faiss.read_index(os.path.join(path, _ANN_INDEX)), meta.get("recall_at_k"), trained  # type: ignore
+
+
+def remove(path: str):
+    for name in (_ANN_INDEX, _ANN_META, _IVF_CENTROIDS, _IVF_ASSIGN):
+        file_path = os.path.join(path, name)
+        if os.path.exists(file_path):
+            os.remove(file_path)
@@ -0,0 +1,85 @@
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+
+
+class SemanticAnswerCache:
+    """Válasz cache a lekérdezés embeddingje alapján.
+
+    Találat akkor van, ha egy korábbi kérdés vektora legalább `threshold` koszinusz-hasonlóságú,
+    a visszakeresett chunk-azonosító halmaz azonos (tehát az LLM ugyanazt a kontextust kapná),
+    az index verziója nem változott, és a bejegyzés nem járt le (TTL). A méretet LRU korlátozza.
+    A megspórolt generálási időt a bejegyzéskor mért LLM késleltetés alapján összesítjük.
+    """
+
+    def __init__(self, max_entries: int = 128, ttl_seconds: float = 3600.0, threshold: float = 0.95):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self.threshold = float(threshold)
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def lookup(self, query_vector: np.ndarray, chunk_ids: List[int], index_version: Tuple) -> Optional[Dict]:
+        key_chunks = frozenset(int(c) for c in chunk_ids)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            candidates = [
+                (entry_id, entry) for entry_id, entry in self._entries.items()
+                if entry["chunk_ids"] == key_chunks and entry["index_version"] == index_version
+            ]
+            if candidates:
+                matrix = np.vstack([entry["vector"] for _, entry in candidates])
+                sims = matrix @ np.asarray(query_vector, dtype=np.float32)
+                best = int(np.argmax(sims))
+                if float(sims[best]) >= self.threshold:
+                    entry_id, entry = candidates[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    self.saved_seconds += entry["latency"]
+                    return {"answer": entry["answer"], "sources": entry["sources"], "similarity": float(sims[best])}
+            self.misses += 1
+        return None
+
+    def store(self, query_vector: np.ndarray, chunk_ids: List[int], index_version: Tuple,
+              answer: str, sources: List[Dict], latency: float):
+        with self._lock:
+            self._entries[self._next_id] = {
+                "vector": np.asarray(query_vector, dtype=np.float32),
+                "chunk_ids": frozenset(int(c) for c in chunk_ids),
+                "index_version": index_version,
+                "answer": answer,
+                "sources": sources,
+                "latency": float(latency),
+                "created": time.time(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _expire(self, now: float):
+        if self.ttl_seconds <= 0:
+            return
+        expired = [k for k, e in self._entries.items() if now - e["created"] > self.ttl_seconds]
+        for k in expired:
+            del self._entries[k]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "saved_seconds": self.saved_seconds,
+        }
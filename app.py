@@ -3,7 +3,7 @@ import os
 import time
 from rag_system import RAGSystem
 from groq_client import GroqClient
-from config import Config
+from config import get_config
 
 # Oldal konfiguráció
 st.set_page_config(
@@ -139,13 +139,39 @@ def initialize_rag_system(engine_key: str = "v1"):
     """A RAG rendszert inicializálja és cache-eli."""
     with st.spinner('🔄 Rendszer inicializálása... Ez az első indításkor több percig is eltarthat, ha dokumentumokat kell feldolgozni.'):
         rag_system = RAGSystem()
-        # Groq API melegítése (cold start elkerülésére)
-        try:
-            _ = rag_system.groq_client.test_connection()
-        except Exception:
-            pass
+        # Groq API melegítése háttérben (cold start elkerülésére), a felület nem vár rá
+        rag_system.warm_up()
     return rag_system
 
+def render_download(response):
+    """Letöltés gomb a válasszal és a forráslistával."""
+    dl_text = response['answer']
+    if response.get('sources'):
+        dl_text += "\n\nForrások:\n" + "\n".join([f"- {s['document']} (oldal: {s.get('pages','-')}, relevancia: {s['relevance']})" for s in response['sources']])
+    st.download_button("⬇️ Válasz letöltése (TXT)", data=dl_text, file_name="valasz.txt")
+
+def render_sources(sources):
+    """Források megjelenítése két hasábban."""
+    if not sources:
+        return
+    st.markdown("##### Források:")
+    # Két hasábos megjelenítés nagy kijelzőn
+    cols = st.columns(2)
+    for j, source in enumerate(sources):
+        col = cols[j % 2]
+        page_str = source.get('pages') or "-"
+        with col:
+            st.markdown(
+                f'<div class="source-box">'
+                f'<div class="mb-1"><span class="badge badge-blue">Forrás {j+1}</span>'
+                f'<span class="badge badge-gray">Oldal: {page_str}</span>'
+                f'<span class="badge badge-gray">Relevancia: {source["relevance"]}</span></div>'
+                f'<strong>{source["document"]}</strong><br>'
+                f'<i>"{source["preview"]}"</i>'
+                f'</div>',
+                unsafe_allow_html=True
+            )
+
 def initialize_app_state():
     """Az alkalmazás session state-jét inicializálja."""
     if 'chat_history' not in st.session_state:
@@ -254,7 +280,7 @@ def main():
         st.header("📄 Dokumentum Kezelés")
         
         # API kulcs ellenőrzése
-        config = Config()
+        config = get_config()
         if not config.GROQ_API_KEY or config.GROQ_API_KEY == "your_groq_api_key_here":
             st.error("❌ Groq API kulcs nincs beállítva! Állítsd be a .env fájlban.")
             st.stop()
@@ -287,6 +313,12 @@ def main():
                         st.success("✅ Groq API kapcsolat OK!")
                     else:
                         st.error("❌ Groq API kapcsolat hiba!")
+            if st.button("Beállítások újratöltése", help="A .streamlit/secrets.toml és a környezeti változók újraolvasása"):
+                try:
+                    rag_system.reload_config()
+                    st.success("✅ Beállítások újratöltve.")
+                except Exception as e:
+                    st.error(f"❌ {e}")
 
         # Fájl feltöltés (további dokumentumokhoz)
         with st.expander("📤 Új PDF-ek Hozzáadása"):
@@ -301,6 +333,8 @@ def main():
                     results = rag_system.add_documents(uploaded_files)
                     if results["success"]:
                         st.markdown(f'<div class="success-box">✅ Sikeresen hozzáadva {len(results["success"]) } dokumentum</div>', unsafe_allow_html=True)
+                    if results.get("skipped"):
+                        st.info(f"ℹ️ {len(results['skipped'])} dokumentum már szerepel az indexben (változatlan tartalom), kihagyva.")
                     if results["errors"]:
                         for error in results["errors"]:
                             st.markdown(f'<div class="error-box">❌ {error["filename"]}: {error["error"]}</div>', unsafe_allow_html=True)
@@ -308,12 +342,25 @@ def main():
 
         # Keresési beállítások
         with st.expander("🔎 Keresési Beállítások", expanded=False):
-            cfg = Config()
+            cfg = get_config()
             top_k = st.slider(
                 "Top-K (visszaadott kontextus darabok száma)",
-                min_value=1, max_value=20, value=cfg.TOP_K, step=1,
+                min_value=1, max_value=40, value=cfg.TOP_K, step=1,
                 help="A legrelevánsabb szövegrészletek száma, amelyet a modell kontextusként megkap."
             )
+            # Szűrés: csak a kiválasztott jogszabály(ok), nyelv(ek) és oldaltartomány chunkjai között keresünk
+            store = rag_system.embedding_manager.chunk_store
+            filter_docs = st.multiselect("Csak ezekben a dokumentumokban", store.document_names())
+            filter_langs = st.multiselect("Nyelv", store.languages())
+            page_cols = st.columns(2)
+            page_from = page_cols[0].number_input("Oldaltól", min_value=0, value=0, step=1, help="0 = nincs korlát")
+            page_to = page_cols[1].number_input("Oldalig", min_value=0, value=0, step=1, help="0 = nincs korlát")
+            search_filters = {
+                "document_name": filter_docs,
+                "language": filter_langs,
+                "page_from": int(page_from) or None,
+                "page_to": int(page_to) or None,
+            }
 
         # Rendszer statisztikák
         with st.expander("📊 Rendszer Állapot", expanded=False):
@@ -321,10 +368,50 @@ def main():
             st.metric("Dokumentumok száma", stats.get("documents", 0))
             st.metric("Feldolgozott szövegrészletek", stats.get("chunks", 0))
             st.info(f"**Állapot:** {stats.get('status', 'Ismeretlen')}")
+            if stats.get("index"):
+                ix = stats["index"]
+                recall = f", recall@10: {ix['recall_at_k']:.3f}" if ix.get("recall_at_k") is not None else ""
+                st.caption(f"Keresőindex: {ix['backend']} / {ix['type']} / {ix['vector_dtype']}{recall}")
+            if stats.get("query_cache"):
+                qc = stats["query_cache"]
+                st.caption(f"Lekérdezés-embedding cache: {qc['hits']} találat / {qc['misses']} hiány ({qc['hit_rate'] * 100:.0f}%)")
+            if stats.get("answer_cache"):
+                ac = stats["answer_cache"]
+                st.caption(f"Válasz cache: {ac['hits']} találat / {ac['misses']} hiány ({ac['hit_rate'] * 100:.0f}%), megspórolt idő: {ac['saved_seconds']:.1f} s")
+            if stats.get("startup"):
+                timings = ", ".join(
+                    f"{name}: {seconds:.2f} s" if seconds is not None else f"{name}: folyamatban"
+                    for name, seconds in stats["startup"].items()
+                )
+                st.caption(f"Indulás: {timings}")
+            if stats.get("llm"):
+                llm = stats["llm"]
+                p95 = f", p95: {llm['p95_seconds']:.2f} s" if llm.get("p95_seconds") is not None else ""
+                st.caption(f"Groq API: {llm['calls']} hívás, {llm['errors']} hiba, {llm['retries']} újrapróbálás{p95}, megszakító: {llm['breaker']}")
+            if stats.get("prompt_cache"):
+                pc = stats["prompt_cache"]
+                st.caption(f"Prompt prefix cache (helyi modell): {pc['hit_ratio'] * 100:.0f}% cache-elt token, "
+                           f"költség −{pc['cost_saving'] * 100:.0f}%, prefill −{pc['saved_prefill_ms']:.0f} ms ({pc['requests']} kérés)")
             if stats.get("document_list"):
                 st.markdown("**Betöltött dokumentumok listája**")
                 for doc in sorted(stats["document_list"]):
                     st.write(f"• {doc}")
+            # Dokumentum törlése (pl. hatályon kívül helyezett jogszabály)
+            if stats.get("document_list"):
+                doc_to_delete = st.selectbox("Dokumentum törlése az indexből", ["—"] + stats["document_list"])
+                if doc_to_delete != "—" and st.button("🗑️ Kiválasztott dokumentum törlése"):
+                    deleted = rag_system.delete_document(document_name=doc_to_delete)
+                    st.success(f"✅ {doc_to_delete}: {deleted} szövegrészlet eltávolítva.")
+                    st.rerun()
+            # Mappa újraszkennelése: csak az új vagy módosult PDF-ek kerülnek feldolgozásra
+            if st.button("🔄 Mappa újraszkennelése"):
+                with st.spinner("📖 Új vagy módosult dokumentumok keresése..."):
+                    events = list(rag_system.process_documents_with_progress())
+                changed = [e for e in events if e.get("status") in ("added", "replaced")]
+                failed = [e for e in events if e.get("error")]
+                st.success(f"✅ {len(changed)} új/módosult dokumentum feldolgozva, {len(events) - len(changed) - len(failed)} változatlan.")
+                for e in failed:
+                    st.error(f"❌ {e['filename'] or ''} {e['error']}")
             # RAG motor újraindítása (cache törlés)
             if st.button("♻️ RAG motor újraindítása"):
                 st.session_state["engine_key"] = str(time.time())
@@ -347,46 +434,44 @@ def main():
 
         # Kérdés feldolgozása és azonnali megjelenítése
         latest_response = None
-        if ask_button and question.strip():
-            if not rag_system.documents_loaded:
-                st.error("Először helyezz PDF fájlokat a 'documents/uploaded' mappába, majd indítsd újra az alkalmazást oldalfrissítéssel!")
-            else:
-                with st.spinner('🤔 Gondolkodom és a választ fordítom...'):
-                    latest_response = rag_system.query(question, top_k=top_k)
-                    st.session_state.chat_history.insert(0, {"question": question, "response": latest_response})
-
-        # Ha most nincs friss válasz, mutassuk a legutóbbit
-        if latest_response is None and st.session_state.chat_history:
+        if ask_button and question.strip() and not rag_system.documents_loaded:
+            st.error("Először helyezz PDF fájlokat a 'documents/uploaded' mappába, majd indítsd újra az alkalmazást oldalfrissítéssel!")
+        elif ask_button and question.strip():
+            # Streamelt válasz: a források a visszakeresés után azonnal, a válasz tokenenként jelenik meg
+            st.markdown("---")
+            st.markdown("#### Válasz")
+            answer_box = st.empty()
+            download_box = st.empty()
+            sources_box = st.container()
+            answer_box.markdown("🔎 Keresés a dokumentumokban...")
+            answer_text = ""
+            pc = None
+            for event in rag_system.query_stream(question, top_k=top_k, filters=search_filters):
+                if event["type"] == "sources":
+                    with sources_box:
+                        render_sources(event["sources"])
+                    answer_box.markdown("🤔 Gondolkodom és a választ fordítom...")
+                elif event["type"] == "token":
+                    answer_text += event["text"]
+                    answer_box.markdown(answer_text + "▌")
+                elif event["type"] == "done":
+                    latest_response = {"answer": event["answer"], "sources": event["sources"]}
+                    pc = event.get("prompt_cache")
+            answer_box.markdown(latest_response["answer"])
+            if pc:
+                st.caption(f"Prompt prefix cache (helyi modell): {pc['cached_tokens']}/{pc['prompt_tokens']} cache-elt token "
+                           f"({pc['hit_ratio'] * 100:.0f}%), költség −{pc['cost_saving'] * 100:.0f}%, prefill −{pc['saved_prefill_ms']:.0f} ms")
+            with download_box:
+                render_download(latest_response)
+            st.session_state.chat_history.insert(0, {"question": question, "response": latest_response})
+        elif st.session_state.chat_history:
+            # Ha most nincs friss válasz, mutassuk a legutóbbit
             latest_response = st.session_state.chat_history[0]["response"]
-
-        if latest_response:
             st.markdown("---")
             st.markdown("#### Válasz")
             st.markdown(latest_response['answer'])
-            # Letöltés gomb
-            dl_text = latest_response['answer']
-            if latest_response.get('sources'):
-                dl_text += "\n\nForrások:\n" + "\n".join([f"- {s['document']} (oldal: {s.get('pages','-')}, relevancia: {s['relevance']})" for s in latest_response['sources']])
-            st.download_button("⬇️ Válasz letöltése (TXT)", data=dl_text, file_name="valasz.txt")
-
-            if latest_response.get('sources'):
-                st.markdown("##### Források:")
-                # Két hasábos megjelenítés nagy kijelzőn
-                cols = st.columns(2)
-                for j, source in enumerate(latest_response['sources']):
-                    col = cols[j % 2]
-                    page_str = source.get('pages') or "-"
-                    with col:
-                        st.markdown(
-                            f'<div class="source-box">'
-                            f'<div class="mb-1"><span class="badge badge-blue">Forrás {j+1}</span>'
-                            f'<span class="badge badge-gray">Oldal: {page_str}</span>'
-                            f'<span class="badge badge-gray">Relevancia: {source["relevance"]}</span></div>'
-                            f'<strong>{source["document"]}</strong><br>'
-                            f'<i>"{source["preview"]}"</i>'
-                            f'</div>',
-                            unsafe_allow_html=True
-                        )
+            render_download(latest_response)
+            render_sources(latest_response.get('sources'))
 
     with tab_history:
         if st.session_state.chat_history:
@@ -0,0 +1,523 @@
+"""Mikro-benchmarkok a RAG pipeline forró pontjaihoz.
+
+Használat:
+    python benchmarks.py mmr --n 400 --k 20
+    python benchmarks.py retrieval --queries kerdesek.txt --k 10
+    python benchmarks.py ann --n 300000 --k 10 [--backend numpy]
+    python benchmarks.py quant --chunks "data/chunks/HUN_alaptörvény_chunks.json" [--queries kerdesek.txt]
+    python benchmarks.py bm25 --chunks "data/chunks/HUN_alaptörvény_chunks.json" [--queries kerdesek.txt]
+    python benchmarks.py startup [--eager]
+    python benchmarks.py transport --calls 50 --concurrency 8 --fail-every 3
+    python benchmarks.py prompt-cache --chunks "data/chunks/HUN_alaptörvény_chunks.json" [--queries kerdesek.txt]
+"""
+import argparse
+import time
+from typing import Callable, List
+import numpy as np
+from utils import mmr_select_indices
+
+
+def _legacy_mmr(sims_to_query: np.ndarray, emb: np.ndarray, k: int, lambda_param: float) -> List[int]:
+    """A korábbi, tiszta Python MMR ciklus (összehasonlítási alap)."""
+    k = max(1, min(k, len(sims_to_query)))
+    pairwise = np.matmul(emb, emb.T)
+    selected_idx = []
+    candidate_idx = list(range(len(sims_to_query)))
+    first = int(np.argmax(sims_to_query))
+    selected_idx.append(first)
+    candidate_idx.remove(first)
+    while len(selected_idx) < k and candidate_idx:
+        mmr_scores = []
+        for idx in candidate_idx:
+            diversity_penalty = max(pairwise[idx, j] for j in selected_idx)
+            score = lambda_param * sims_to_query[idx] - (1 - lambda_param) * diversity_penalty
+            mmr_scores.append((score, idx))
+        mmr_scores.sort(reverse=True)
+        best_idx = mmr_scores[0][1]
+        selected_idx.append(best_idx)
+        candidate_idx.remove(best_idx)
+    return selected_idx
+
+
+def _random_unit_vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    v = rng.standard_normal((n, dim)).astype("float32")
+    v /= np.linalg.norm(v, axis=1, keepdims=True)
+    return v
+
+
+def _time_ms(fn: Callable, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, (time.perf_counter() - t0) * 1000.0)
+    return best
+
+
+def bench_mmr(args):
+    emb = _random_unit_vectors(args.n, args.dim, args.seed)
+    query = _random_unit_vectors(1, args.dim, args.seed + 1)[0]
+    sims = emb @ query
+    legacy = _legacy_mmr(sims, emb, args.k, args.lam)
+    fast = mmr_select_indices(sims, emb, args.k, args.lam)
+    t_legacy = _time_ms(lambda: _legacy_mmr(sims, emb, args.k, args.lam), args.repeat)
+    t_fast = _time_ms(lambda: mmr_select_indices(sims, emb, args.k, args.lam), args.repeat)
+    print(f"MMR n={args.n} k={args.k} dim={args.dim} lambda={args.lam}")
+    print(f"  régi (Python ciklus): {t_legacy:8.3f} ms")
+    print(f"  NumPy (futó max):     {t_fast:8.3f} ms  ({t_legacy / max(t_fast, 1e-9):.1f}x)")
+    print(f"  azonos kiválasztás:   {legacy == fast}")
+
+
+def _load_queries(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def bench_retrieval(args):
+    """Lekérdezésenkénti keresés vs. search_similar_batch a mentett indexen."""
+    from embedding_manager import EmbeddingManager
+
+    manager = EmbeddingManager()
+    if not manager.load_index():
+        print("❌ Nincs mentett index (data/embeddings).")
+        return
+    queries = _load_queries(args.queries)
+
+    manager._query_cache.clear()
+    t0 = time.perf_counter()
+    single = [manager.search_similar(q, args.k) for q in queries]
+    t_single = (time.perf_counter() - t0) * 1000.0
+
+    manager._query_cache.clear()
+    t0 = time.perf_counter()
+    batched = manager.search_similar_batch(queries, args.k)
+    t_batch = (time.perf_counter() - t0) * 1000.0
+
+    same = all([r["chunk_id"] for r in a] == [r["chunk_id"] for r in b] for a, b in zip(single, batched))
+    print(f"Keresés {len(queries)} lekérdezéssel, k={args.k}")
+    print(f"  egyenként:  {t_single:8.1f} ms ({t_single / max(len(queries), 1):.2f} ms/lekérdezés)")
+    print(f"  kötegelten: {t_batch:8.1f} ms ({t_batch / max(len(queries), 1):.2f} ms/lekérdezés)")
+    print(f"  azonos találatok: {same}")
+
+
+class _ArrayStore:
+    """Minimális, ChunkStore-szerű csomagoló egy memóriabeli mátrix köré (az ann_index függvényeihez)."""
+
+    def __init__(self, vectors: np.ndarray, block_size: int = 65536):
+        self._vectors = vectors
+        self._block_size = block_size
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    @property
+    def dimension(self) -> int:
+        return int(self._vectors.shape[1])
+
+    def vectors(self, rows: np.ndarray, exact: bool = True) -> np.ndarray:
+        return self._vectors[rows]
+
+    def vector_blocks(self):
+        return [(s, self._vectors[s:s + self._block_size]) for s in range(0, len(self._vectors), self._block_size)]
+
+    def iter_vectors(self):
+        for _, block in self.vector_blocks():
+            yield block
+
+
+def bench_ann(args):
+    """Indextípusok összevetése: építési idő, lekérdezési késleltetés és recall@k a pontos kereséshez képest."""
+    import ann_index
+    use_faiss = ann_index._HAS_FAISS and args.backend != "numpy"
+    # Klaszterezett szintetikus adat (a valós embeddingek sem egyenletes eloszlásúak)
+    rng = np.random.default_rng(args.seed)
+    centers = _random_unit_vectors(max(args.n // 500, 1), args.dim, args.seed)
+    vectors = centers[rng.integers(0, len(centers), args.n)] + 0.3 * _random_unit_vectors(args.n, args.dim, args.seed + 1)
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype("float32")
+    store = _ArrayStore(vectors)
+    queries = vectors[rng.choice(args.n, size=args.queries, replace=False)] + 0.05 * _random_unit_vectors(args.queries, args.dim, args.seed + 2)
+    queries = np.ascontiguousarray(queries / np.linalg.norm(queries, axis=1, keepdims=True), dtype=np.float32)
+    exact = ann_index.exact_search(store.vector_blocks(), queries, args.k)
+    params = {"nlist": args.nlist, "nprobe": args.nprobe, "ef_search": args.ef_search}
+
+    backend = "FAISS" if use_faiss else "NumPy"
+    print(f"ANN indexek ({backend}), n={args.n}, dim={args.dim}, {args.queries} lekérdezés, k={args.k}")
+    done = set()
+    for index_type in args.types.split(","):
+        resolved = ann_index.resolve_index_type(index_type, args.n, auto_threshold=0, use_faiss=use_faiss)
+        if resolved in done:
+            continue
+        done.add(resolved)
+        t0 = time.perf_counter()
+        if use_faiss:
+            index = ann_index.build_from_store(store, resolved, params)
+            search = index.search
+        elif resolved == "flat":
+            search = lambda q, k: (None, ann_index.exact_search(store.vector_blocks(), q, k))
+        else:
+            search = ann_index.NumpyIVF.build(store, params).search
+        build_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for q in queries:
+            search(q[None, :], args.k)
+        per_query_ms = (time.perf_counter() - t0) * 1000.0 / len(queries)
+        _, approx = search(queries, args.k)
+        recall = ann_index.recall_at_k(approx, exact)
+        print(f"  {resolved:9s} építés {build_s:7.1f} s | {per_query_ms:7.3f} ms/lekérdezés | recall@{args.k}: {recall:.3f}")
+
+
+def bench_quant(args):
+    """float16 / int8 kvantálás: tárméret és recall@k veszteség a float32 kereséshez képest,
+    újrarangsorolással (top k·factor pontos vektorokkal) és anélkül.
+    """
+    import json
+    import ann_index
+    from chunk_store import quantize, dequantize
+
+    if args.chunks:
+        from embedding_manager import EmbeddingManager
+        manager = EmbeddingManager()
+        with open(args.chunks, "r", encoding="utf-8") as f:
+            chunks = [c for c in json.load(f) if str(c).strip()]
+        vectors = manager.encode_texts(chunks)
+        if args.queries:
+            queries = manager.encode_queries(_load_queries(args.queries))
+        else:
+            queries = None
+        source = f"{args.chunks} ({len(chunks)} chunk)"
+    else:
+        vectors = _random_unit_vectors(args.n, args.dim, args.seed)
+        queries = None
+        source = f"szintetikus ({args.n} × {args.dim})"
+    if queries is None:
+        # Lekérdezés helyett zajjal eltolt tárolt vektorok
+        rng = np.random.default_rng(args.seed + 1)
+        rows = rng.choice(len(vectors), size=min(args.n_queries, len(vectors)), replace=False)
+        queries = vectors[rows] + 0.1 * _random_unit_vectors(len(rows), vectors.shape[1], args.seed + 2)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    k = min(args.k, len(vectors))
+    exact = ann_index.exact_search([(0, vectors)], queries, k)
+
+    print(f"Kvantálás, forrás: {source}, {len(queries)} lekérdezés, k={k}, rerank factor={args.factor}")
+    print(f"  float32  {vectors.nbytes / 1e6:8.2f} MB | recall@{k}: 1.000")
+    for dtype in ("float16", "int8"):
+        codes, scales = quantize(vectors, dtype)
+        size = codes.nbytes + (scales.nbytes if scales is not None else 0)
+        approx_vectors = dequantize(codes, scales)
+        approx = ann_index.exact_search([(0, approx_vectors)], queries, k)
+        candidates = ann_index.exact_search([(0, approx_vectors)], queries, min(k * args.factor, len(vectors)))
+        reranked = np.stack([
+            c[np.argsort(-np.matmul(vectors[c], q))][:k] for c, q in zip(candidates, queries)
+        ])
+        print(f"  {dtype:8s} {size / 1e6:8.2f} MB ({vectors.nbytes / size:.1f}× kisebb) | "
+              f"recall@{k}: {ann_index.recall_at_k(approx, exact):.3f} | rerank után: {ann_index.recall_at_k(reranked, exact):.3f}")
+
+
+def bench_bm25(args):
+    """BM25 index építési ideje és lekérdezésenkénti késleltetése (a lexikális útvonal célja: < 1 ms)."""
+    import json
+    from bm25_index import BM25Index
+
+    with open(args.chunks, "r", encoding="utf-8") as f:
+        chunks = [str(c) for c in json.load(f)]
+    chunks = chunks * max(1, args.replicate)
+    queries = _load_queries(args.queries) if args.queries else [
+        "XXIII. cikk választójog", "Országgyűlés feladatai", "Alkotmánybíróság hatásköre",
+        "köztársasági elnök megbízatása", "tulajdonhoz való jog", "R) cikk Alaptörvény jogrendszer alapja",
+    ]
+    t0 = time.perf_counter()
+    index = BM25Index.build(chunks)
+    index.search("", 1)  # a függő postingok beolvasztása
+    build_ms = (time.perf_counter() - t0) * 1000.0
+    per_query_ms = _time_ms(lambda: [index.search(q, args.k) for q in queries], args.repeat) / len(queries)
+    print(f"BM25: {len(chunks)} chunk, {len(index.vocab)} kifejezés, építés {build_ms:.1f} ms")
+    print(f"  keresés: {per_query_ms:.3f} ms/lekérdezés (k={args.k})")
+    rows, scores = index.search(queries[0], 3)
+    for row, score in zip(rows, scores):
+        print(f"  [{score:6.2f}] {chunks[int(row)][:90]!r}")
+
+
+_STARTUP_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+import rag_system
+import_s = time.perf_counter() - t0
+heavy = [m for m in ("torch", "sentence_transformers", "groq", "faiss", "PyPDF2", "langdetect") if m in sys.modules]
+t0 = time.perf_counter()
+system = rag_system.RAGSystem()
+init_s = time.perf_counter() - t0
+t0 = time.perf_counter()
+if system.documents_loaded:
+    system.embedding_manager.search_similar("Országgyűlés", 5)
+first_s = time.perf_counter() - t0
+print(json.dumps({"import": import_s, "heavy": heavy, "init": init_s, "first_query": first_s,
+                  "startup": system.startup_info()}))
+"""
+
+
+def bench_startup(args):
+    """Hidegindítás friss Python folyamatban: import, RAGSystem() és az első keresés ideje,
+    valamint hogy mely nehéz modulok töltődtek be már az importnál (lusta vs. azonnali mód).
+    """
+    import json
+    import os
+    import subprocess
+    import sys
+
+    env = dict(os.environ, LAZY_INIT="false" if args.eager else "true")
+    out = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT], env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        print(out.stderr)
+        return
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    mode = "azonnali" if args.eager else "lusta"
+    print(f"Hidegindítás ({mode} mód)")
+    print(f"  import rag_system: {result['import'] * 1000:8.1f} ms | betöltött nehéz modulok: {', '.join(result['heavy']) or '-'}")
+    print(f"  RAGSystem():       {result['init'] * 1000:8.1f} ms (a felület ezután jelenhet meg)")
+    print(f"  első keresés:      {result['first_query'] * 1000:8.1f} ms (lusta módban a modell betöltésére is várhat)")
+    model = result["startup"].get("model_load")
+    if model is not None:
+        print(f"  modell betöltés:   {model * 1000:8.1f} ms")
+
+
+def _mock_groq_server(fail_every: int, latency_ms: float, retry_after: float, outage: bool):
+    """Helyi, OpenAI/Groq-kompatibilis mock szerver: minden fail_every-edik kérésre 429-et
+    (Retry-After fejléccel) vagy 503-at ad, outage módban mindig 503-at; egyébként egy rövid választ.
+    """
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    counter = {"n": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: dict, headers: dict = None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with lock:
+                counter["n"] += 1
+                n = counter["n"]
+            time.sleep(latency_ms / 1000.0)
+            if outage:
+                return self._send(503, {"error": {"message": "unavailable"}})
+            if fail_every and n % fail_every == 0:
+                if (n // fail_every) % 2:
+                    return self._send(429, {"error": {"message": "rate limited"}}, {"Retry-After": str(retry_after)})
+                return self._send(503, {"error": {"message": "unavailable"}})
+            self._send(200, {
+                "id": f"mock-{n}", "object": "chat.completion", "created": int(time.time()), "model": "mock",
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "OK"}}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            })
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, counter
+
+
+def bench_transport(args):
+    """GroqClient a közös, újrapróbáló HTTP transporttal egy helyi mock szerver ellen:
+    párhuzamos hívások 429/503 hibákkal, majd kiesés (a megszakító nyitása) szimulálása.
+    """
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+
+    server, counter = _mock_groq_server(args.fail_every, args.latency_ms, args.retry_after, outage=False)
+    os.environ.update({
+        "GROQ_BASE_URL": f"http://127.0.0.1:{server.server_address[1]}",
+        "GROQ_API_KEY": os.environ.get("GROQ_API_KEY") or "mock",
+        "LLM_BACKOFF_BASE": str(args.backoff),
+        "LLM_BREAKER_RESET": "60",
+    })
+    from config import reload_config
+    reload_config()
+    from groq_client import GroqClient
+
+    client = GroqClient()
+    chunks = [{"document_name": "mock.pdf", "text": "Mock kontextus."}]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        answers = list(pool.map(lambda i: client.generate_response(f"kérdés {i}", chunks), range(args.calls)))
+    elapsed = time.perf_counter() - t0
+    ok = sum(1 for a in answers if not a.startswith("Hiba történt"))
+    stats = client.http_stats()
+    print(f"Transport: {args.calls} hívás, {args.concurrency} párhuzamos, minden {args.fail_every}. kérés 429/503")
+    print(f"  sikeres válasz: {ok}/{args.calls}, szerver kérések: {counter['n']}, idő: {elapsed:.2f} s")
+    print(f"  mérések: {stats}")
+    server.shutdown()
+
+    # Kiesés: a szerver mindig 503-at ad, a megszakító a küszöb után hálózati hívás nélkül utasít el
+    outage, outage_counter = _mock_groq_server(0, args.latency_ms, args.retry_after, outage=True)
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{outage.server_address[1]}"
+    client.reload_config(reload_config())
+    answers = [client.generate_response("kérdés", chunks) for _ in range(args.calls)]
+    print(f"  kiesés: {outage_counter['n']} szerver kérés {args.calls} hívásra, megszakító: {client.http_pool.breaker.state}")
+    print(f"  utolsó válasz: {answers[-1]}")
+    outage.shutdown()
+
+
+def _legacy_build_messages(client, query: str, context_chunks: list) -> list:
+    """A korábbi prompt elrendezés: a kérdés elöl, a kontextus relevancia sorrendben, utasítások a végén."""
+    budget = client._context_budget(query, client._get_system_prompt())
+    context = client._build_context([{k: v for k, v in c.items() if k != "chunk_id"} for c in context_chunks], budget)
+    prompt = f"""
+FELHASZNÁLÓ KÉRDÉSE:
+"{query}"
+
+RELEVÁNS DOKUMENTUMRÉSZLETEK (eredeti nyelven):
+---
+{context}
+---
+
+UTASÍTÁSOK:
+- Mindig magyarul válaszolj.
+- Az idézeteket a kontextus EREDETI nyelvén add meg. Ha román idézet szerepel, tegyél mellé rövid magyar értelmezést/fordítást. Ha magyar az idézet, ne erőltesd román idézetet.
+- Ha a kontextus nem elegendő, jelezd egyértelműen.
+"""
+    return [{"role": "system", "content": client._get_system_prompt()}, {"role": "user", "content": prompt}]
+
+
+def bench_prompt_cache(args):
+    """Prompt prefix cache találati arány: régi (kérdés elöl) vs. stabil prefixű prompt elrendezés.
+    A kontextust BM25 kereséssel állítjuk elő (embedding modell nélkül), a cache-t a helyi
+    PrefixCacheSimulator modellezi; lekérdezésenként a cache-elt tokenek aránya, a becsült
+    költség- és prefill-megtakarítás.
+    """
+    import json
+    from bm25_index import BM25Index
+    from config import get_config
+    from groq_client import GroqClient
+    from prompt_cache import PrefixCacheSimulator
+    from token_counter import get_token_counter
+
+    with open(args.chunks, "r", encoding="utf-8") as f:
+        chunks = [str(c) for c in json.load(f)]
+    queries = _load_queries(args.queries) if args.queries else [
+        "Mit mond az Alaptörvény a választójogról?", "Kinek van választójoga az országgyűlési választásokon?",
+        "Mi az Országgyűlés feladata?", "Milyen hatáskörei vannak az Országgyűlésnek?",
+        "Mi az Alkotmánybíróság hatásköre?", "Ki fordulhat az Alkotmánybírósághoz?",
+        "Meddig tart a köztársasági elnök megbízatása?", "Hogyan választják a köztársasági elnököt?",
+        "Mit mond az Alaptörvény a tulajdonhoz való jogról?", "Mi az Alaptörvény R) cikke?",
+    ]
+    index = BM25Index.build(chunks)
+    name = args.chunks.replace("\\", "/").split("/")[-1]
+    client = GroqClient(client=object())
+    counter = get_token_counter(get_config())
+
+    layouts = {
+        "régi": lambda q, ctx: _legacy_build_messages(client, q, ctx),
+        "stabil prefix": lambda q, ctx: client._build_messages(q, ctx),
+    }
+    print(f"Prompt cache: {len(queries)} kérdés, k={args.k}, blokk {args.block} token, "
+          f"min. prefix {args.min_prefix} token, tokenizer: {counter.name}")
+    for label, build in layouts.items():
+        sim = PrefixCacheSimulator(counter, block_tokens=args.block, min_prefix_tokens=args.min_prefix)
+        print(f"  [{label}]")
+        for query in queries:
+            rows, scores = index.search(query, args.k)
+            top = float(scores[0]) if len(scores) else 1.0
+            context = [{"chunk_id": int(r), "text": chunks[int(r)], "document_name": name,
+                        "similarity_score": float(s) / top} for r, s in zip(rows, scores)]
+            report = sim.observe(build(query, context))
+            print(f"    {report['cached_tokens']:5d}/{report['prompt_tokens']:5d} token cache-ből "
+                  f"({report['hit_ratio'] * 100:5.1f}%), költség −{report['cost_saving'] * 100:4.1f}%, "
+                  f"prefill −{report['saved_prefill_ms']:5.1f} ms  {query[:50]}")
+        total = sim.stats()
+        print(f"    összesen: {total['hit_ratio'] * 100:.1f}% cache-elt token, költség −{total['cost_saving'] * 100:.1f}%, "
+              f"prefill −{total['saved_prefill_ms']:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG mikro-benchmarkok")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_mmr = sub.add_parser("mmr", help="MMR kiválasztás: régi vs. vektorizált")
+    p_mmr.add_argument("--n", type=int, default=400)
+    p_mmr.add_argument("--k", type=int, default=20)
+    p_mmr.add_argument("--dim", type=int, default=384)
+    p_mmr.add_argument("--lam", type=float, default=0.6)
+    p_mmr.add_argument("--repeat", type=int, default=5)
+    p_mmr.add_argument("--seed", type=int, default=0)
+    p_mmr.set_defaults(func=bench_mmr)
+
+    p_ret = sub.add_parser("retrieval", help="Keresés: egyenként vs. kötegelt (search_similar_batch)")
+    p_ret.add_argument("--queries", required=True, help="Szövegfájl, soronként egy lekérdezés")
+    p_ret.add_argument("--k", type=int, default=10)
+    p_ret.set_defaults(func=bench_retrieval)
+
+    p_ann = sub.add_parser("ann", help="Indextípusok: késleltetés és recall@k (flat / IVF / HNSW; FAISS nélkül NumPy IVF)")
+    p_ann.add_argument("--n", type=int, default=300000)
+    p_ann.add_argument("--dim", type=int, default=384)
+    p_ann.add_argument("--k", type=int, default=10)
+    p_ann.add_argument("--queries", type=int, default=500)
+    p_ann.add_argument("--types", default="flat,ivf_flat,ivf_pq,hnsw")
+    p_ann.add_argument("--nlist", type=int, default=0)
+    p_ann.add_argument("--nprobe", type=int, default=16)
+    p_ann.add_argument("--ef-search", type=int, default=64)
+    p_ann.add_argument("--backend", choices=["auto", "numpy"], default="auto")
+    p_ann.add_argument("--seed", type=int, default=0)
+    p_ann.set_defaults(func=bench_ann)
+
+    p_q = sub.add_parser("quant", help="float16 / int8 kvantálás: méret és recall@k veszteség")
+    p_q.add_argument("--chunks", help="Chunk JSON (pl. data/chunks/HUN_alaptörvény_chunks.json); enélkül szintetikus adat")
+    p_q.add_argument("--queries", help="Szövegfájl, soronként egy kérdés (enélkül zajos tárolt vektorok)")
+    p_q.add_argument("--n", type=int, default=20000)
+    p_q.add_argument("--dim", type=int, default=384)
+    p_q.add_argument("--n-queries", type=int, default=200)
+    p_q.add_argument("--k", type=int, default=10)
+    p_q.add_argument("--factor", type=int, default=4)
+    p_q.add_argument("--seed", type=int, default=0)
+    p_q.set_defaults(func=bench_quant)
+
+    p_bm = sub.add_parser("bm25", help="BM25 lexikális index: építés és lekérdezési késleltetés")
+    p_bm.add_argument("--chunks", default="data/chunks/HUN_alaptörvény_chunks.json")
+    p_bm.add_argument("--queries", help="Szövegfájl, soronként egy lekérdezés")
+    p_bm.add_argument("--replicate", type=int, default=1, help="A korpusz többszörözése nagyobb méret szimulálására")
+    p_bm.add_argument("--k", type=int, default=20)
+    p_bm.add_argument("--repeat", type=int, default=20)
+    p_bm.set_defaults(func=bench_bm25)
+
+    p_st = sub.add_parser("startup", help="Hidegindítás: import, inicializálás és első keresés ideje")
+    p_st.add_argument("--eager", action="store_true", help="Azonnali (nem lusta) mód mérése")
+    p_st.set_defaults(func=bench_startup)
+
+    p_tr = sub.add_parser("transport", help="Groq HTTP transport: újrapróbálás, Retry-After, megszakító (helyi mock szerver)")
+    p_tr.add_argument("--calls", type=int, default=50)
+    p_tr.add_argument("--concurrency", type=int, default=8)
+    p_tr.add_argument("--fail-every", type=int, default=3, help="Minden n-edik kérés 429 / 503 (0 = soha)")
+    p_tr.add_argument("--retry-after", type=float, default=0.2, help="A 429 válaszok Retry-After értéke (s)")
+    p_tr.add_argument("--latency-ms", type=float, default=20.0)
+    p_tr.add_argument("--backoff", type=float, default=0.05, help="LLM_BACKOFF_BASE a méréshez")
+    p_tr.set_defaults(func=bench_transport)
+
+    p_pc = sub.add_parser("prompt-cache", help="Prompt prefix cache találati arány: régi vs. stabil prefixű elrendezés")
+    p_pc.add_argument("--chunks", default="data/chunks/HUN_alaptörvény_chunks.json")
+    p_pc.add_argument("--queries", help="Szövegfájl, soronként egy kérdés")
+    p_pc.add_argument("--k", type=int, default=5)
+    p_pc.add_argument("--block", type=int, default=128, help="Cache blokkméret tokenben")
+    p_pc.add_argument("--min-prefix", type=int, default=1024, help="A cache-elhető legrövidebb prefix tokenben")
+    p_pc.set_defaults(func=bench_prompt_cache)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
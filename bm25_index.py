@@ -0,0 +1,177 @@
+import os
+import re
+import json
+import threading
+import unicodedata
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_VOCAB = "vocab.json"
+_ARRAYS = "postings.npz"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Gyakori magyar funkciószavak (nem hordoznak keresési információt)
+HUNGARIAN_STOPWORDS = frozenset("""
+a az egy és s is nem hogy ha de vagy mint meg már még csak azt ezt ez az
+van volt lesz lett legyen kell lehet pedig illetve valamint továbbá amely amelyek aki akik
+ami amit amik ahol amikor mert mely melyek azaz ill stb sem se el ki be le fel
+""".split())
+
+# Egyszerű, ragozásra toleráns "prefix-stemming": a hosszú szavakat az első N karakterükre vágjuk
+# (pl. országgyűlés / országgyűlésnek / országgyűlési → ugyanaz a kifejezés). Rövid szavak, számok
+# és római számok (cikkszámok) változatlanok maradnak.
+_STEM_PREFIX = 7
+_ROMAN_RE = re.compile(r"^[ivxlcdm]+$")
+
+
+def tokenize(text: str) -> List[str]:
+    """Magyar szöveg tokenizálása: NFC normalizálás, casefold (az ékezetek megmaradnak),
+    szó-tokenek, stopszavak elhagyása, hosszú szavak prefix-vágása.
+    """
+    text = unicodedata.normalize("NFC", text or "").casefold()
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        if token in HUNGARIAN_STOPWORDS or not token.strip("_"):
+            continue
+        if len(token) > _STEM_PREFIX and not token.isdigit() and not _ROMAN_RE.match(token):
+            token = token[:_STEM_PREFIX]
+        tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """Tömör, invertált BM25 index a chunk szövegekre (a sorazonosítók a ChunkStore soraival egyeznek).
+
+    A posting listák CSR elrendezésben vannak (kifejezésenként egy [offset, offset+df) szelet a
+    sor- és súlytömbökben). A súlyokat (idf · BM25 tf-tag) előre kiszámoljuk, így lekérdezéskor
+    csak a lekérdezés kifejezéseinek szeleteit kell összegyűjteni és soronként összegezni.
+    Az új chunkok függő listába kerülnek, és a következő keresés előtt egyetlen lépésben
+    olvadnak be (ingest ritka, keresés gyakori).
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._rows = np.zeros(0, dtype=np.int64)
+        self._tf = np.zeros(0, dtype=np.float32)
+        self._weights = np.zeros(0, dtype=np.float32)
+        self._doc_len = np.zeros(0, dtype=np.float32)
+        # Függő (még be nem olvasztott) postingok: (kifejezés, sor, tf) hármasok
+        self._pending_terms: List[int] = []
+        self._pending_rows: List[int] = []
+        self._pending_tf: List[int] = []
+        self._pending_len: List[int] = []
+
+    def __len__(self) -> int:
+        return int(self._doc_len.shape[0]) + len(self._pending_len)
+
+    def add(self, start_row: int, texts: Iterable[str]):
+        """Chunkok felvétele start_row-tól kezdődő, folytonos sorazonosítókkal."""
+        with self._lock:
+            row = start_row
+            if row != len(self):
+                raise ValueError(f"BM25 index: nem folytonos sorazonosító ({row} != {len(self)})")
+            for text in texts:
+                tokens = tokenize(text)
+                counts: Dict[int, int] = {}
+                for token in tokens:
+                    term = self.vocab.setdefault(token, len(self.vocab))
+                    counts[term] = counts.get(term, 0) + 1
+                for term, tf in counts.items():
+                    self._pending_terms.append(term)
+                    self._pending_rows.append(row)
+                    self._pending_tf.append(tf)
+                self._pending_len.append(len(tokens))
+                row += 1
+
+    def _merge_pending(self):
+        """A függő postingok beolvasztása a CSR tömbökbe és a súlyok újraszámolása (avgdl változik)."""
+        if not self._pending_len:
+            return
+        vocab_size = len(self.vocab)
+        base_terms = np.repeat(np.arange(len(self._offsets) - 1, dtype=np.int64), np.diff(self._offsets))
+        terms = np.concatenate([base_terms, np.asarray(self._pending_terms, dtype=np.int64)])
+        rows = np.concatenate([self._rows, np.asarray(self._pending_rows, dtype=np.int64)])
+        tf = np.concatenate([self._tf, np.asarray(self._pending_tf, dtype=np.float32)])
+        order = np.argsort(terms, kind="stable")
+        self._rows, self._tf = rows[order], tf[order]
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=vocab_size))]).astype(np.int64)
+        self._doc_len = np.concatenate([self._doc_len, np.asarray(self._pending_len, dtype=np.float32)])
+        self._pending_terms, self._pending_rows, self._pending_tf, self._pending_len = [], [], [], []
+        self._compute_weights()
+
+    def _compute_weights(self):
+        n = max(len(self._doc_len), 1)
+        avgdl = float(self._doc_len.mean()) if len(self._doc_len) else 1.0
+        df = np.diff(self._offsets).astype(np.float32)
+        idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+        term_idf = np.repeat(idf, np.diff(self._offsets))
+        dl = self._doc_len[self._rows]
+        norm = self.k1 * (1.0 - self.b + self.b * dl / max(avgdl, 1e-9))
+        self._weights = (term_idf * self._tf * (self.k1 + 1.0) / (self._tf + norm)).astype(np.float32)
+
+    def search(self, query: str, k: int, allowed_rows: Optional[np.ndarray] = None,
+               excluded_rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k sor BM25 pontszám szerint: (sorok, pontszámok), csökkenő sorrendben.
+        allowed_rows: csak ezek a sorok (szűrés), excluded_rows: kizárt sorok (tombstone).
+        """
+        with self._lock:
+            self._merge_pending()
+            term_ids = sorted({self.vocab[t] for t in tokenize(query) if t in self.vocab})
+            if not term_ids or k <= 0:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            rows = np.concatenate([self._rows[self._offsets[t]:self._offsets[t + 1]] for t in term_ids])
+            weights = np.concatenate([self._weights[self._offsets[t]:self._offsets[t + 1]] for t in term_ids])
+        if allowed_rows is not None:
+            mask = np.isin(rows, allowed_rows)
+            rows, weights = rows[mask], weights[mask]
+        if excluded_rows is not None and excluded_rows.size:
+            mask = ~np.isin(rows, excluded_rows)
+            rows, weights = rows[mask], weights[mask]
+        if rows.size == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights).astype(np.float32)
+        k = min(k, unique_rows.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return unique_rows[top], scores[top]
+
+    # --- Perzisztencia ---
+    def save(self, path: str):
+        with self._lock:
+            self._merge_pending()
+            os.makedirs(path, exist_ok=True)
+            tmp = os.path.join(path, "postings.tmp.npz")
+            np.savez(tmp, offsets=self._offsets, rows=self._rows, tf=self._tf, doc_len=self._doc_len)
+            os.replace(tmp, os.path.join(path, _ARRAYS))
+            with open(os.path.join(path, _VOCAB + ".tmp"), "w", encoding="utf-8") as f:
+                json.dump({"k1": self.k1, "b": self.b, "vocab": self.vocab}, f, ensure_ascii=False)
+            os.replace(os.path.join(path, _VOCAB + ".tmp"), os.path.join(path, _VOCAB))
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        vocab_path, arrays_path = os.path.join(path, _VOCAB), os.path.join(path, _ARRAYS)
+        if not os.path.exists(vocab_path) or not os.path.exists(arrays_path):
+            return None
+        with open(vocab_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls(k1=float(meta.get("k1", 1.5)), b=float(meta.get("b", 0.75)))
+        index.vocab = {t: int(i) for t, i in meta["vocab"].items()}
+        with np.load(arrays_path) as arrays:
+            index._offsets = arrays["offsets"]
+            index._rows = arrays["rows"]
+            index._tf = arrays["tf"]
+            index._doc_len = arrays["doc_len"]
+        index._compute_weights()
+        return index
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "BM25Index":
+        index = cls()
+        index.add(0, texts)
+        return index
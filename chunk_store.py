@@ -0,0 +1,703 @@
+import os
+import json
+import bisect
+import shutil
+import threading
+import numpy as np
+from typing import List, Dict, Optional, Iterator, Tuple
+
+# Oszlopfájlok egy tárolt szegmensen belül
+_VECTORS = "vectors.npy"
+_VECTORS_Q = "vectors_q.npy"
+_SCALES = "scales.npy"
+_DOC_ID = "doc_id.npy"
+_PAGE_START = "page_start.npy"
+_PAGE_END = "page_end.npy"
+_CHUNK_INDEX = "chunk_index.npy"
+_TEXT_OFFSETS = "text_offsets.npy"
+_TEXT_BLOB = "text.bin"
+_DOCUMENTS = "documents.json"
+_MANIFEST = "manifest.json"
+_TOMBSTONES = "tombstones.npy"
+_SEGMENT_FILES = (_VECTORS, _DOC_ID, _PAGE_START, _PAGE_END, _CHUNK_INDEX, _TEXT_OFFSETS, _TEXT_BLOB)
+
+VECTOR_DTYPES = ("float32", "float16", "int8")
+# Kvantált pontozásnál ennyi sor kerül egyszerre float32-re alakításra (korlátos átmeneti memória)
+_SCORE_CHUNK = 16384
+# Blokkméret (sor) a teljes tároló bejárásához: csak ennyi sor van egyszerre float32-ként a memóriában
+_VECTOR_BLOCK = 16384
+
+
+def quantize(vectors: np.ndarray, vector_dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Skalár kvantálás: float16, vagy int8 dimenziónkénti szimmetrikus skálával (max|x_d| / 127).
+    A skála szegmensenként készül (összevonáskor és tömörítéskor az egyesített sorokon újraszámolva),
+    így egy később hozzáadott, tágabb tartományú dokumentum sem vágódik le.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vector_dtype == "float16":
+        return vectors.astype(np.float16), None
+    if vector_dtype == "int8":
+        scales = np.abs(vectors).max(axis=0) / 127.0 if vectors.shape[0] else np.ones(vectors.shape[1], dtype=np.float32)
+        scales = np.maximum(scales, 1e-12).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8)
+        return codes, scales
+    raise ValueError(f"Ismeretlen vektor típus: {vector_dtype} (lehetséges: {', '.join(VECTOR_DTYPES)})")
+
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    vectors = np.asarray(codes, dtype=np.float32)
+    return vectors * scales if scales is not None else vectors
+
+
+class _Segment:
+    """Egy lemezen tárolt, oszlopos szegmens memória-leképezett (mmap) nézete.
+    A vektorok float32 .npy-ben és/vagy kvantálva (float16, ill. int8 + dimenziónkénti skála),
+    a fix szélességű oszlopok int32/int64 .npy-ben, a chunk szövegek egyetlen UTF-8 blobban,
+    offset tömbbel indexelve vannak.
+    """
+
+    def __init__(self, name: str, vectors: Optional[np.ndarray], doc_id: np.ndarray, page_start: np.ndarray,
+                 page_end: np.ndarray, chunk_index: np.ndarray, text_offsets: np.ndarray,
+                 text_blob: np.ndarray, codes: Optional[np.ndarray] = None, scales: Optional[np.ndarray] = None):
+        self.name = name
+        self.vectors = vectors
+        self.codes = codes
+        self.scales = scales
+        self.doc_id = doc_id
+        self.page_start = page_start
+        self.page_end = page_end
+        self.chunk_index = chunk_index
+        self.text_offsets = text_offsets
+        self.text_blob = text_blob
+
+    def __len__(self) -> int:
+        return int(self.doc_id.shape[0])
+
+    def text(self, i: int) -> str:
+        start, end = int(self.text_offsets[i]), int(self.text_offsets[i + 1])
+        return bytes(self.text_blob[start:end]).decode("utf-8")
+
+    @property
+    def dimension(self) -> int:
+        return int((self.vectors if self.vectors is not None else self.codes).shape[1])
+
+    def exact(self, rows=slice(None)) -> np.ndarray:
+        """float32 vektorok: a pontos oszlopból, ha tároltuk, különben visszaalakítva a kvantáltból."""
+        if self.vectors is not None:
+            return np.asarray(self.vectors[rows])
+        return dequantize(self.codes[rows], self.scales)
+
+    def approx(self, rows) -> np.ndarray:
+        """Vektorok a kvantált oszlopból (ha van), így a pontos oszlop lapjai nem töltődnek be."""
+        if self.codes is not None:
+            return dequantize(self.codes[rows], self.scales)
+        return np.asarray(self.vectors[rows])
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """IP pontszámok (lekérdezések × sorok), kvantált oszlopnál a kvantált tartományban:
+        int8 esetén a skálát a lekérdezésbe olvasztjuk, (q·s)·c = q·(s·c).
+        """
+        if self.codes is None:
+            return np.matmul(queries, np.asarray(self.vectors).T)
+        q = queries * self.scales if self.scales is not None else queries
+        out = np.empty((queries.shape[0], len(self)), dtype=np.float32)
+        for start in range(0, len(self), _SCORE_CHUNK):
+            part = np.asarray(self.codes[start:start + _SCORE_CHUNK], dtype=np.float32)
+            out[:, start:start + part.shape[0]] = np.matmul(q, part.T)
+        return out
+
+    @classmethod
+    def open(cls, path: str) -> "_Segment":
+        def col(name):
+            return np.load(os.path.join(path, name), mmap_mode="r")
+
+        def optional_col(name):
+            return col(name) if os.path.exists(os.path.join(path, name)) else None
+
+        blob_path = os.path.join(path, _TEXT_BLOB)
+        if os.path.getsize(blob_path) > 0:
+            blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            blob = np.zeros(0, dtype=np.uint8)
+        scales = optional_col(_SCALES)
+        return cls(os.path.basename(path), optional_col(_VECTORS), col(_DOC_ID), col(_PAGE_START), col(_PAGE_END),
+                   col(_CHUNK_INDEX), col(_TEXT_OFFSETS), blob, codes=optional_col(_VECTORS_Q),
+                   scales=np.asarray(scales) if scales is not None else None)
+
+    @staticmethod
+    def write(path: str, vectors: np.ndarray, doc_id: np.ndarray, page_start: np.ndarray,
+              page_end: np.ndarray, chunk_index: np.ndarray, text_offsets: np.ndarray,
+              text_blob: bytes, vector_dtype: str = "float32", keep_exact: bool = True):
+        os.makedirs(path, exist_ok=True)
+        if vector_dtype == "float32" or keep_exact:
+            np.save(os.path.join(path, _VECTORS), np.ascontiguousarray(vectors, dtype=np.float32))
+        if vector_dtype != "float32":
+            codes, scales = quantize(vectors, vector_dtype)
+            np.save(os.path.join(path, _VECTORS_Q), codes)
+            if scales is not None:
+                np.save(os.path.join(path, _SCALES), scales)
+        np.save(os.path.join(path, _DOC_ID), np.asarray(doc_id, dtype=np.int32))
+        np.save(os.path.join(path, _PAGE_START), np.asarray(page_start, dtype=np.int32))
+        np.save(os.path.join(path, _PAGE_END), np.asarray(page_end, dtype=np.int32))
+        np.save(os.path.join(path, _CHUNK_INDEX), np.asarray(chunk_index, dtype=np.int32))
+        np.save(os.path.join(path, _TEXT_OFFSETS), np.asarray(text_offsets, dtype=np.int64))
+        with open(os.path.join(path, _TEXT_BLOB), "wb") as f:
+            f.write(text_blob)
+
+
+class ChunkStore:
+    """Oszlopos, csak hozzáfűzős (append-only) chunk tároló szegmensekkel.
+
+    Minden mentés csak a legutóbbi mentés óta hozzáadott sorokat írja ki egy új szegmens
+    könyvtárba (seg_XXXXXX), majd atomikusan frissíti a manifest.json-t (szegmenslista +
+    dokumentumtábla). Így egy új PDF felvétele O(új chunkok) másolással és lemez I/O-val jár.
+    A szegmenseket memória-leképezve (mmap) nyitjuk meg; a chunk szövegek csak a lekért
+    soroknál materializálódnak. A sok kis szegmenst a merge_segments vonja össze (háttérszálon).
+    Az oldalszámoknál a 0 jelentése: ismeretlen.
+    Az új szegmensek vektorai opcionálisan kvantálva (float16 / int8) is tárolódnak; ekkor a
+    keresés a kvantált oszlopot pontozza, a pontos float32 oszlop (ha megtartjuk) csak az
+    újrarangsoroláshoz szükséges soroknál töltődik be.
+    """
+
+    def __init__(self):
+        self.documents: List[Dict] = []
+        self.vector_dtype: str = "float32"
+        self.keep_exact: bool = True
+        self.version: int = 0
+        self._segments: List[_Segment] = []
+        self._seg_starts: List[int] = []
+        self._next_segment: int = 0
+        self._lock = threading.RLock()
+        # Logikailag törölt sorok (a keresés kiszűri őket, a compact() távolítja el)
+        self._tombstones: set = set()
+        self._tombstone_array: Optional[np.ndarray] = None
+        self._tombstones_dirty = False
+        # Dokumentumonkénti sortartományok (szűrt kereséshez), (verzió, sorszám) kulccsal gyorsítótárazva
+        self._row_ranges: Dict[int, List[Tuple[int, int]]] = {}
+        self._row_ranges_key: Optional[Tuple[int, int]] = None
+        # Még nem mentett sorok (blokkonként, hogy ne kelljen teljes mátrixot másolni)
+        self._reset_pending()
+
+    # --- Méret és dokumentumok ---
+    def __len__(self) -> int:
+        return self._persisted_len() + len(self._pending_doc_id)
+
+    def _persisted_len(self) -> int:
+        if not self._segments:
+            return 0
+        return self._seg_starts[-1] + len(self._segments[-1])
+
+    @property
+    def segment_count(self) -> int:
+        return len(self._segments)
+
+    @property
+    def dimension(self) -> Optional[int]:
+        with self._lock:
+            for seg in self._segments:
+                if len(seg) > 0:
+                    return seg.dimension
+            for v in self._pending_vectors:
+                if v.shape[0] > 0:
+                    return int(v.shape[1])
+        return None
+
+    def set_vector_format(self, vector_dtype: str = "float32", keep_exact: bool = True):
+        """A jövőben írt szegmensek vektorformátuma (a meglévők az összevonáskor alakulnak át)."""
+        if vector_dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Ismeretlen vektor típus: {vector_dtype} (lehetséges: {', '.join(VECTOR_DTYPES)})")
+        self.vector_dtype = vector_dtype
+        self.keep_exact = keep_exact or vector_dtype == "float32"
+
+    @property
+    def is_quantized(self) -> bool:
+        return any(seg.codes is not None for seg in self._segments)
+
+    @property
+    def has_exact(self) -> bool:
+        """Minden mentett sornak megvan-e a pontos (float32) vektora."""
+        return all(seg.vectors is not None for seg in self._segments)
+
+    def add_document(self, document_name: str, document_hash: str, language: Optional[str] = None) -> int:
+        self.documents.append({
+            "document_name": document_name,
+            "document_hash": document_hash,
+            "language": language,
+        })
+        return len(self.documents) - 1
+
+    def document_names(self) -> List[str]:
+        return sorted({d.get("document_name", "ismeretlen") for d in self.documents if not d.get("deleted")})
+
+    def languages(self) -> List[str]:
+        return sorted({d["language"] for d in self.documents if d.get("language") and not d.get("deleted")})
+
+    # --- Írás ---
+    def append(self, vectors: np.ndarray, doc_id: int, texts: List[str], chunk_pages: List[Dict]) -> int:
+        """Egy dokumentum chunkjainak hozzáfűzése. Visszaadja az első új sor azonosítóját."""
+        start = len(self)
+        self._pending_vectors.append(np.ascontiguousarray(vectors, dtype=np.float32))
+        for i, text in enumerate(texts):
+            pages = chunk_pages[i] if i < len(chunk_pages) else {}
+            self._pending_doc_id.append(doc_id)
+            self._pending_page_start.append(int(pages.get("page_start") or 0))
+            self._pending_page_end.append(int(pages.get("page_end") or 0))
+            self._pending_chunk_index.append(i)
+            self._pending_texts.append(text)
+        return start
+
+    # --- Olvasás ---
+    def _parts(self) -> List[Tuple[int, object]]:
+        """(kezdő sor, szegmens vagy függő float32 blokk) párok a teljes tárolóra."""
+        with self._lock:
+            parts: List[Tuple[int, object]] = [
+                (start, seg) for start, seg in zip(self._seg_starts, self._segments) if len(seg) > 0
+            ]
+            offset = self._persisted_len()
+            for v in self._pending_vectors:
+                if v.shape[0] > 0:
+                    parts.append((offset, v))
+                offset += v.shape[0]
+        return parts
+
+    def vector_blocks(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """(kezdő sor, float32 vektor blokk) párok a teljes tárolóra, legfeljebb _VECTOR_BLOCK soros
+        szeletekben; pontos oszlopnál másolás nélkül, csak kvantáltan tárolt szegmensnél szeletenként
+        visszaalakítva, így a tároló sosem kerül egyben float32-ként a memóriába
+        (indexépítéshez, nem a keresés forró útjához).
+        """
+        for start, part in self._parts():
+            if not isinstance(part, _Segment):
+                yield start, part
+                continue
+            for offset in range(0, len(part), _VECTOR_BLOCK):
+                yield start + offset, part.exact(slice(offset, offset + _VECTOR_BLOCK))
+
+    def vectors(self, rows: np.ndarray, exact: bool = True) -> np.ndarray:
+        """A megadott sorok vektorai (csak ezek kerülnek beolvasásra).
+        exact=False esetén a kvantált oszlopból olvasunk, ha van (közelítő pontozáshoz).
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        out = np.empty((rows.shape[0], self.dimension or 0), dtype=np.float32)
+        for start, part in self._parts():
+            size = len(part) if isinstance(part, _Segment) else part.shape[0]
+            mask = (rows >= start) & (rows < start + size)
+            if not mask.any():
+                continue
+            local = rows[mask] - start
+            if isinstance(part, _Segment):
+                out[mask] = part.exact(local) if exact else part.approx(local)
+            else:
+                out[mask] = part[local]
+        return out
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """IP pontszámok a teljes tárolóra (lekérdezések × sorok); kvantált szegmenseknél a kvantált oszlopon."""
+        return np.concatenate([
+            part.scores(queries) if isinstance(part, _Segment) else np.matmul(queries, part.T)
+            for _, part in self._parts()
+        ], axis=1)
+
+    def iter_texts(self) -> Iterator[str]:
+        """Az összes chunk szövege sorrendben (pl. a lexikális index újraépítéséhez)."""
+        for seg in list(self._segments):
+            for i in range(len(seg)):
+                yield seg.text(i)
+        yield from list(self._pending_texts)
+
+    def iter_vectors(self) -> Iterator[np.ndarray]:
+        for _, block in self.vector_blocks():
+            yield block
+
+    # --- Szűrés ---
+    def _column(self, rows: np.ndarray, name: str) -> np.ndarray:
+        """Egy fix szélességű oszlop (doc_id, page_start, ...) értékei a megadott sorokra."""
+        out = np.zeros(rows.shape[0], dtype=np.int64)
+        with self._lock:
+            for start, seg in zip(self._seg_starts, self._segments):
+                mask = (rows >= start) & (rows < start + len(seg))
+                if mask.any():
+                    out[mask] = getattr(seg, name)[rows[mask] - start]
+            persisted = self._persisted_len()
+            mask = rows >= persisted
+            if mask.any():
+                out[mask] = np.asarray(getattr(self, f"_pending_{name}"), dtype=np.int64)[rows[mask] - persisted]
+        return out
+
+    def document_row_ranges(self) -> Dict[int, List[Tuple[int, int]]]:
+        """Dokumentumonkénti [kezdő, záró) sortartományok. Egy dokumentum chunkjai egyetlen append
+        hívással, folytonosan kerülnek be (a tömörítés a sorrendet megőrzi), így jellemzően egy
+        tartomány jut rájuk. Egyszer számoljuk a doc_id oszlopokból, és a tároló változásáig érvényes.
+        """
+        with self._lock:
+            key = (self.version, len(self))
+            if self._row_ranges_key == key:
+                return self._row_ranges
+            columns = [np.asarray(seg.doc_id, dtype=np.int64) for seg in self._segments]
+            columns.append(np.asarray(self._pending_doc_id, dtype=np.int64))
+            ids = np.concatenate(columns) if columns else np.zeros(0, dtype=np.int64)
+            ranges: Dict[int, List[Tuple[int, int]]] = {}
+            if ids.size:
+                bounds = np.flatnonzero(np.diff(ids)) + 1
+                starts = np.concatenate([[0], bounds])
+                ends = np.concatenate([bounds, [ids.size]])
+                for start, end in zip(starts.tolist(), ends.tolist()):
+                    ranges.setdefault(int(ids[start]), []).append((start, end))
+            self._row_ranges, self._row_ranges_key = ranges, key
+            return ranges
+
+    def filter_rows(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        """A szűrőfeltételeknek megfelelő élő sorok rendezett tömbje, vagy None, ha nincs érdemi feltétel.
+        Kulcsok: document_name (név vagy lista), language (kód vagy lista), page_from / page_to.
+        A dokumentum- és nyelvszűrés a dokumentumtáblán és a sortartományokon dől el, így a
+        költség az érintett dokumentumok sorainak számával arányos. Oldalszűrésnél az ismeretlen
+        oldalú (0) sorok kiesnek.
+        """
+        if not filters:
+            return None
+        names = filters.get("document_name")
+        languages = filters.get("language")
+        page_from = filters.get("page_from")
+        page_to = filters.get("page_to")
+        names = {names} if isinstance(names, str) else set(names or [])
+        languages = {languages} if isinstance(languages, str) else set(languages or [])
+        if not names and not languages and not page_from and not page_to:
+            return None
+        doc_ids = [
+            i for i, d in enumerate(self.documents)
+            if not d.get("deleted")
+            and (not names or d.get("document_name") in names)
+            and (not languages or d.get("language") in languages)
+        ]
+        ranges = self.document_row_ranges()
+        parts = [np.arange(start, end, dtype=np.int64) for d in doc_ids for start, end in ranges.get(d, [])]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        rows = np.sort(np.concatenate(parts))
+        if page_from or page_to:
+            page_start = self._column(rows, "page_start")
+            page_end = self._column(rows, "page_end")
+            page_end = np.where(page_end > 0, page_end, page_start)
+            mask = page_start > 0
+            if page_from:
+                mask &= page_end >= int(page_from)
+            if page_to:
+                mask &= page_start <= int(page_to)
+            rows = rows[mask]
+        if self.deleted_count:
+            rows = rows[~np.isin(rows, self.tombstone_rows())]
+        return rows
+
+    def get(self, row: int) -> Dict:
+        """Egy sor metaadatainak és szövegének materializálása dict-ként."""
+        row = int(row)
+        if row < 0 or row >= len(self):
+            raise IndexError(row)
+        with self._lock:
+            persisted = self._persisted_len()
+            if row < persisted:
+                s = bisect.bisect_right(self._seg_starts, row) - 1
+                seg, i = self._segments[s], row - self._seg_starts[s]
+                doc_id = int(seg.doc_id[i])
+                page_start = int(seg.page_start[i])
+                page_end = int(seg.page_end[i])
+                chunk_index = int(seg.chunk_index[i])
+                text = seg.text(i)
+            else:
+                i = row - persisted
+                doc_id = self._pending_doc_id[i]
+                page_start = self._pending_page_start[i]
+                page_end = self._pending_page_end[i]
+                chunk_index = self._pending_chunk_index[i]
+                text = self._pending_texts[i]
+        doc = self.documents[doc_id]
+        meta = {
+            "chunk_id": row,
+            "text": text,
+            "document_name": doc["document_name"],
+            "document_hash": doc["document_hash"],
+            "chunk_index": chunk_index,
+        }
+        if page_start:
+            meta["page_start"] = page_start
+        if page_end:
+            meta["page_end"] = page_end
+        return meta
+
+    # --- Perzisztencia ---
+    def save(self, path: str):
+        """A függő sorok kiírása egy új szegmensbe + manifest frissítés (append-only)."""
+        with self._lock:
+            os.makedirs(path, exist_ok=True)
+            if self._pending_doc_id:
+                name = self._new_segment_name()
+                pending_bytes = [t.encode("utf-8") for t in self._pending_texts]
+                offsets = np.cumsum([0] + [len(b) for b in pending_bytes], dtype=np.int64)
+                seg_path = os.path.join(path, name)
+                _Segment.write(
+                    seg_path,
+                    np.concatenate(self._pending_vectors, axis=0),
+                    self._pending_doc_id,
+                    self._pending_page_start,
+                    self._pending_page_end,
+                    self._pending_chunk_index,
+                    offsets,
+                    b"".join(pending_bytes),
+                    vector_dtype=self.vector_dtype,
+                    keep_exact=self.keep_exact,
+                )
+                start = self._persisted_len()
+                self._segments.append(_Segment.open(seg_path))
+                self._seg_starts.append(start)
+                self._reset_pending()
+            self._write_tombstones(path)
+            self._write_manifest(path)
+
+    def merge_segments(self, path: str) -> bool:
+        """Az összes mentett szegmens összevonása egyetlen szegmensbe.
+        Az olvasás a zár nélkül történik (a szegmensek megváltoztathatatlanok), így háttérszálon
+        futtatható; a csere közben hozzáfűzött újabb szegmensek változatlanul megmaradnak.
+        A sorazonosítók nem változnak, mert az összevont szegmens a régiek sorrendi összefűzése.
+        """
+        with self._lock:
+            snapshot = list(self._segments)
+            name = self._new_segment_name()
+        if len(snapshot) < 2:
+            return False
+
+        merged = self._write_merged(os.path.join(path, name), snapshot,
+                                    vector_dtype=self.vector_dtype, keep_exact=self.keep_exact)
+
+        with self._lock:
+            if self._segments[:len(snapshot)] != snapshot:
+                # Közben tömörítés történt: az összevonás eredménye elavult
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+                return False
+            rest = self._segments[len(snapshot):]
+            self._segments = [merged] + rest
+            self._seg_starts = [0]
+            for seg in self._segments[:-1]:
+                self._seg_starts.append(self._seg_starts[-1] + len(seg))
+            self._write_manifest(path)
+        self._remove_segment_dirs(path, snapshot)
+        return True
+
+    def find_documents(self, document_name: Optional[str] = None, document_hash: Optional[str] = None,
+                       include_deleted: bool = False) -> List[int]:
+        """A megadott névvel és/vagy hash-sel rendelkező dokumentumok azonosítói."""
+        return [
+            i for i, d in enumerate(self.documents)
+            if (include_deleted or not d.get("deleted"))
+            and (document_name is None or d.get("document_name") == document_name)
+            and (document_hash is None or d.get("document_hash") == document_hash)
+        ]
+
+    # --- Törlés (tombstone) és tömörítés ---
+    @property
+    def deleted_count(self) -> int:
+        return len(self._tombstones)
+
+    @property
+    def live_count(self) -> int:
+        return len(self) - len(self._tombstones)
+
+    def is_deleted(self, row: int) -> bool:
+        return int(row) in self._tombstones
+
+    def tombstone_rows(self) -> np.ndarray:
+        """A törölt (tombstone-olt) sorok rendezett tömbje."""
+        if self._tombstone_array is None:
+            self._tombstone_array = np.array(sorted(self._tombstones), dtype=np.int64)
+        return self._tombstone_array
+
+    def delete_documents(self, doc_ids: List[int]) -> int:
+        """Dokumentumok logikai törlése: a soraik tombstone-t kapnak, és azonnal kiesnek a
+        keresésből. A hely a compact() hívásakor szabadul fel. Visszaadja az érintett sorok számát.
+        """
+        ids = np.asarray(sorted(set(int(d) for d in doc_ids)), dtype=np.int64)
+        if ids.size == 0:
+            return 0
+        with self._lock:
+            rows: List[np.ndarray] = []
+            for start, seg in zip(self._seg_starts, self._segments):
+                rows.append(np.nonzero(np.isin(seg.doc_id, ids))[0] + start)
+            pending = np.asarray(self._pending_doc_id, dtype=np.int64)
+            rows.append(np.nonzero(np.isin(pending, ids))[0] + self._persisted_len())
+            new_rows = set(int(r) for r in np.concatenate(rows)) - self._tombstones
+            self._tombstones.update(new_rows)
+            self._tombstone_array = None
+            self._tombstones_dirty = True
+            for d in ids:
+                self.documents[int(d)]["deleted"] = True
+        return len(new_rows)
+
+    def compact(self, path: str) -> int:
+        """A tombstone-olt sorok és törölt dokumentumok fizikai eltávolítása: a tároló egyetlen
+        szegmensbe íródik újra, a megmaradó sorok új, folytonos azonosítót kapnak.
+        Visszaadja a felszabadított sorok számát.
+        """
+        with self._lock:
+            self.save(path)
+            snapshot = list(self._segments)
+            if not snapshot or not self._tombstones:
+                return 0
+            doc_map = np.full(len(self.documents), -1, dtype=np.int64)
+            documents: List[Dict] = []
+            for i, doc in enumerate(self.documents):
+                if not doc.get("deleted"):
+                    doc_map[i] = len(documents)
+                    documents.append(doc)
+            dead = self.tombstone_rows()
+            keep = [
+                ~np.isin(np.arange(start, start + len(seg), dtype=np.int64), dead)
+                for start, seg in zip(self._seg_starts, snapshot)
+            ]
+            merged = self._write_merged(os.path.join(path, self._new_segment_name()), snapshot, keep, doc_map,
+                                        vector_dtype=self.vector_dtype, keep_exact=self.keep_exact)
+            removed = sum(len(seg) for seg in snapshot) - len(merged)
+            self.documents = documents
+            self._segments = [merged]
+            self._seg_starts = [0]
+            self._tombstones = set()
+            self._tombstone_array = None
+            self._tombstones_dirty = True
+            self._write_tombstones(path)
+            self._write_manifest(path)
+        self._remove_segment_dirs(path, snapshot)
+        return removed
+
+    def _write_tombstones(self, path: str):
+        if not self._tombstones_dirty:
+            return
+        tmp = os.path.join(path, "tombstones.tmp.npy")
+        np.save(tmp, self.tombstone_rows())
+        os.replace(tmp, os.path.join(path, _TOMBSTONES))
+        self._tombstones_dirty = False
+
+    @staticmethod
+    def _write_merged(seg_path: str, segments: List[_Segment], keep: Optional[List[np.ndarray]] = None,
+                      doc_map: Optional[np.ndarray] = None, vector_dtype: str = "float32",
+                      keep_exact: bool = True) -> _Segment:
+        """Szegmensek sorrendi összefűzése egy új szegmensbe, opcionális sor-szűréssel."""
+        vectors, doc_id, page_start, page_end, chunk_index = [], [], [], [], []
+        blobs: List[bytes] = []
+        lengths: List[np.ndarray] = []
+        for n, seg in enumerate(segments):
+            offsets = np.asarray(seg.text_offsets, dtype=np.int64)
+            blob = bytes(seg.text_blob)
+            if keep is None:
+                rows = slice(None)
+                blobs.append(blob)
+                lengths.append(np.diff(offsets))
+            else:
+                rows = np.nonzero(keep[n])[0]
+                blobs.extend(blob[offsets[i]:offsets[i + 1]] for i in rows)
+                lengths.append(np.diff(offsets)[rows])
+            ids = np.asarray(seg.doc_id[rows], dtype=np.int64)
+            doc_id.append(doc_map[ids] if doc_map is not None else ids)
+            vectors.append(seg.exact(rows))
+            page_start.append(np.asarray(seg.page_start[rows]))
+            page_end.append(np.asarray(seg.page_end[rows]))
+            chunk_index.append(np.asarray(seg.chunk_index[rows]))
+        text_offsets = np.concatenate([np.zeros(1, dtype=np.int64), np.cumsum(np.concatenate(lengths), dtype=np.int64)])
+        _Segment.write(
+            seg_path,
+            np.concatenate(vectors, axis=0),
+            np.concatenate(doc_id),
+            np.concatenate(page_start),
+            np.concatenate(page_end),
+            np.concatenate(chunk_index),
+            text_offsets,
+            b"".join(blobs),
+            vector_dtype=vector_dtype,
+            keep_exact=keep_exact,
+        )
+        return _Segment.open(seg_path)
+
+    @staticmethod
+    def _remove_segment_dirs(path: str, segments: List[_Segment]):
+        # A régi szegmensek törlése (a már megnyitott mmap-ek POSIX alatt érvényesek maradnak)
+        for seg in segments:
+            shutil.rmtree(os.path.join(path, seg.name), ignore_errors=True)
+
+    def _new_segment_name(self) -> str:
+        name = f"seg_{self._next_segment:06d}"
+        self._next_segment += 1
+        return name
+
+    def _write_manifest(self, path: str):
+        self.version += 1
+        manifest = {
+            "version": self.version,
+            "next_segment": self._next_segment,
+            "segments": [seg.name for seg in self._segments],
+            "documents": self.documents,
+        }
+        tmp = os.path.join(path, _MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(path, _MANIFEST))
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        return os.path.exists(os.path.join(path, _MANIFEST)) or os.path.exists(os.path.join(path, _DOCUMENTS))
+
+    @classmethod
+    def load(cls, path: str) -> "ChunkStore":
+        if not os.path.exists(os.path.join(path, _MANIFEST)):
+            cls._migrate_single_segment(path)
+        with open(os.path.join(path, _MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        store = cls()
+        store.documents = manifest.get("documents", [])
+        store.version = int(manifest.get("version", 0))
+        store._next_segment = int(manifest.get("next_segment", 0))
+        start = 0
+        for name in manifest.get("segments", []):
+            seg = _Segment.open(os.path.join(path, name))
+            store._segments.append(seg)
+            store._seg_starts.append(start)
+            start += len(seg)
+        tombstones_path = os.path.join(path, _TOMBSTONES)
+        if os.path.exists(tombstones_path):
+            store._tombstones = set(int(r) for r in np.load(tombstones_path))
+        return store
+
+    @staticmethod
+    def _migrate_single_segment(path: str):
+        """Az egyszegmenses (manifest nélküli) elrendezés áthelyezése seg_000000 alá."""
+        seg_path = os.path.join(path, "seg_000000")
+        os.makedirs(seg_path, exist_ok=True)
+        for name in _SEGMENT_FILES:
+            os.replace(os.path.join(path, name), os.path.join(seg_path, name))
+        with open(os.path.join(path, _DOCUMENTS), "r", encoding="utf-8") as f:
+            documents = json.load(f)
+        manifest = {"version": 1, "next_segment": 1, "segments": ["seg_000000"], "documents": documents}
+        with open(os.path.join(path, _MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.remove(os.path.join(path, _DOCUMENTS))
+
+    @classmethod
+    def from_legacy(cls, chunk_metadata: List[Dict], vectors: np.ndarray) -> "ChunkStore":
+        """A korábbi JSON metaadat + mátrix formátum átalakítása (egyszeri migráció)."""
+        store = cls()
+        doc_ids: Dict[Tuple[str, str], int] = {}
+        for row, meta in enumerate(chunk_metadata):
+            key = (meta.get("document_name", "ismeretlen"), meta.get("document_hash", ""))
+            if key not in doc_ids:
+                doc_ids[key] = store.add_document(key[0], key[1])
+            store._pending_doc_id.append(doc_ids[key])
+            store._pending_page_start.append(int(meta.get("page_start") or 0))
+            store._pending_page_end.append(int(meta.get("page_end") or 0))
+            store._pending_chunk_index.append(int(meta.get("chunk_index", row)))
+            store._pending_texts.append(meta.get("text", ""))
+        store._pending_vectors.append(np.ascontiguousarray(vectors, dtype=np.float32))
+        return store
+
+    def _reset_pending(self):
+        self._pending_vectors: List[np.ndarray] = []
+        self._pending_doc_id: List[int] = []
+        self._pending_page_start: List[int] = []
+        self._pending_page_end: List[int] = []
+        self._pending_chunk_index: List[int] = []
+        self._pending_texts: List[str] = []
@@ -1,6 +1,9 @@
 import os
 import sys
+import threading
+from functools import cached_property
 from pathlib import Path
+from typing import Optional
 import streamlit as st
 from dotenv import load_dotenv
 try:  # Python 3.11+
@@ -12,13 +15,58 @@ except Exception:  # Fallback: nincs tomllib
 load_dotenv()
 
 class Config:
+    """Beállítások pillanatképe: a secrets források és a környezeti változók egyszeri beolvasása,
+    minden beállítás egyszeri feloldása és ellenőrzése a létrehozáskor; utána csak olvasható.
+    Folyamatonként egy példány készül (get_config), újraolvasás a reload_config hívással.
+    """
+
     def __init__(self):
         # Lokális secrets előtöltése (ha létezik .streamlit/secrets.toml)
-        self._secrets = {}
+        object.__setattr__(self, "_secrets", {})
         self._load_local_secrets()
+        # Minden beállítás feloldása most (a cached_property a példány szótárába írja az értéket,
+        # így a későbbi olvasás egyszerű attribútum-hozzáférés), majd ellenőrzés
+        for name, attr in vars(type(self)).items():
+            if isinstance(attr, cached_property):
+                getattr(self, name)
+        self._validate()
         # Könyvtárak létrehozása
         self._ensure_directories()
-        
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"A konfiguráció csak olvasható ({name}); új beállításokhoz használd a reload_config()-ot")
+
+    def _validate(self):
+        """A feloldott értékek ellenőrzése; hibás beállítás esetén induláskor álljunk meg."""
+        errors = []
+        for name in ("EMBED_BATCH_SIZE", "CHUNK_SIZE", "MAX_TOKENS", "CONTEXT_TOKEN_BUDGET", "TOP_K",
+                     "RETRIEVE_N", "RRF_K", "RERANK_FACTOR", "INGEST_EMBED_BATCH", "INDEX_MAX_SEGMENTS",
+                     "ANN_NPROBE", "ANN_HNSW_M", "ANN_EF_CONSTRUCTION", "ANN_EF_SEARCH", "ANSWER_CACHE_SIZE",
+                     "LLM_MAX_CONNECTIONS", "LLM_BREAKER_THRESHOLD", "LLM_CONTEXT_WINDOW",
+                     "PROMPT_CACHE_BLOCK"):
+            if getattr(self, name) < 1:
+                errors.append(f"{name} legyen pozitív")
+        for name in ("EMBED_CACHE_MAX_ENTRIES", "QUERY_CACHE_SIZE", "INGEST_WORKERS", "ANN_AUTO_THRESHOLD",
+                     "ANN_NLIST", "ANN_PQ_M", "MULTIQUERY_DEADLINE", "INGEST_FLUSH_SECONDS", "ANSWER_CACHE_TTL", "LLM_MAX_RETRIES",
+                     "LLM_BACKOFF_BASE", "LLM_BACKOFF_MAX", "LLM_BREAKER_RESET"):
+            if getattr(self, name) < 0:
+                errors.append(f"{name} nem lehet negatív")
+        if self.LLM_TIMEOUT <= 0 or self.LLM_CONNECT_TIMEOUT <= 0:
+            errors.append("LLM_TIMEOUT és LLM_CONNECT_TIMEOUT legyen pozitív")
+        if self.MAX_TOKENS >= self.LLM_CONTEXT_WINDOW:
+            errors.append("MAX_TOKENS legyen kisebb, mint LLM_CONTEXT_WINDOW")
+        if not 0 <= self.CHUNK_OVERLAP < self.CHUNK_SIZE:
+            errors.append("CHUNK_OVERLAP legyen 0 és CHUNK_SIZE közötti")
+        for name in ("DIVERSIFY_LAMBDA", "TOMBSTONE_COMPACT_RATIO", "ANSWER_CACHE_THRESHOLD"):
+            if not 0.0 <= getattr(self, name) <= 1.0:
+                errors.append(f"{name} legyen 0 és 1 közötti")
+        if self.VECTOR_DTYPE not in ("float32", "float16", "int8"):
+            errors.append(f"ismeretlen VECTOR_DTYPE: {self.VECTOR_DTYPE}")
+        if self.ANN_INDEX_TYPE not in ("auto", "flat", "ivf_flat", "ivf_pq", "hnsw"):
+            errors.append(f"ismeretlen ANN_INDEX_TYPE: {self.ANN_INDEX_TYPE}")
+        if errors:
+            raise Exception(f"Hiba a konfigurációban: {'; '.join(errors)}")
+
     def _ensure_directories(self):
         """Szükséges könyvtárak létrehozása"""
         for directory in [self.DOCUMENTS_DIR, self.DATA_DIR, 
@@ -67,7 +115,7 @@ class Config:
             # Ha nem elérhető vagy hiba történik, csendben ignoráljuk
             pass
 
-        self._secrets = merged
+        object.__setattr__(self, "_secrets", merged)
 
     def _get_setting(self, key, default=None, value_type=str):
         """Beállítás lekérése környezeti változóból vagy Streamlit secrets-ből"""
@@ -90,67 +138,280 @@ class Config:
             return float(value)
         return value
     
+    # Lusta indulás: az embedding modell háttérszálon / első használatkor, a Groq melegítés aszinkron
+    @cached_property
+    def LAZY_INIT(self):
+        val = str(self._get_setting("LAZY_INIT", "true")).lower()
+        return val in ("1", "true", "yes", "on")
+
     # API konfiguráció
-    @property
+    @cached_property
     def GROQ_API_KEY(self):
         return self._get_setting("GROQ_API_KEY")
     
+    # Groq API végpont (üres = alapértelmezett; pl. helyi mock szerver teszteléshez)
+    @cached_property
+    def GROQ_BASE_URL(self):
+        return self._get_setting("GROQ_BASE_URL") or None
+
+    # LLM HTTP transport: teljes hívásonkénti határidő (újrapróbálásokkal együtt) és kapcsolódási időkorlát
+    @cached_property
+    def LLM_TIMEOUT(self):
+        return self._get_setting("LLM_TIMEOUT", 60.0, float)
+
+    @cached_property
+    def LLM_CONNECT_TIMEOUT(self):
+        return self._get_setting("LLM_CONNECT_TIMEOUT", 5.0, float)
+
+    # Közös keep-alive kapcsolat-medence mérete (egyidejű Streamlit munkamenetek)
+    @cached_property
+    def LLM_MAX_CONNECTIONS(self):
+        return self._get_setting("LLM_MAX_CONNECTIONS", 10, int)
+
+    # Újrapróbálás 429/5xx és hálózati hibák esetén: jitteres exponenciális visszalépés (Retry-After alsó korlát)
+    @cached_property
+    def LLM_MAX_RETRIES(self):
+        return self._get_setting("LLM_MAX_RETRIES", 3, int)
+
+    @cached_property
+    def LLM_BACKOFF_BASE(self):
+        return self._get_setting("LLM_BACKOFF_BASE", 0.5, float)
+
+    @cached_property
+    def LLM_BACKOFF_MAX(self):
+        return self._get_setting("LLM_BACKOFF_MAX", 8.0, float)
+
+    # Áramkör-megszakító: ennyi egymást követő sikertelen hívás után LLM_BREAKER_RESET másodpercig nincs hívás
+    @cached_property
+    def LLM_BREAKER_THRESHOLD(self):
+        return self._get_setting("LLM_BREAKER_THRESHOLD", 5, int)
+
+    @cached_property
+    def LLM_BREAKER_RESET(self):
+        return self._get_setting("LLM_BREAKER_RESET", 30.0, float)
+
     # Embedding beállítások
-    @property
+    @cached_property
     def EMBEDDING_MODEL(self):
         return self._get_setting("EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
     
+    # Embedding kötegméret (a chunkok token-hossz szerint rendezve kerülnek kötegekbe)
+    @cached_property
+    def EMBED_BATCH_SIZE(self):
+        return self._get_setting("EMBED_BATCH_SIZE", 32, int)
+
+    # Perzisztens embedding cache (modellnév + chunk szöveg hash alapján)
+    @cached_property
+    def ENABLE_EMBED_CACHE(self):
+        val = str(self._get_setting("ENABLE_EMBED_CACHE", "true")).lower()
+        return val in ("1", "true", "yes", "on")
+
+    @cached_property
+    def EMBED_CACHE_MAX_ENTRIES(self):
+        return self._get_setting("EMBED_CACHE_MAX_ENTRIES", 200000, int)
+
+    # Lekérdezés-embedding LRU cache mérete (0 = kikapcsolva)
+    @cached_property
+    def QUERY_CACHE_SIZE(self):
+        return self._get_setting("QUERY_CACHE_SIZE", 256, int)
+
     # Szövegfeldolgozás
-    @property
+    @cached_property
     def CHUNK_SIZE(self):
         return self._get_setting("CHUNK_SIZE", 1000, int)
     
-    @property
+    @cached_property
     def CHUNK_OVERLAP(self):
         return self._get_setting("CHUNK_OVERLAP", 200, int)
     
     # LLM beállítások
-    @property
+    @cached_property
     def MAX_TOKENS(self):
         return self._get_setting("MAX_TOKENS", 2048, int)
     
-    @property
+    @cached_property
     def TEMPERATURE(self):
         return self._get_setting("TEMPERATURE", 0.3, float)
     
     # LLM beállítások (modell és kontextus keret)
-    @property
+    @cached_property
     def LLM_MODEL(self):
         # Alapértelmezett: Groq által támogatott modell
         return self._get_setting("LLM_MODEL", "llama3-8b-8192")
 
-    @property
+    @cached_property
     def CONTEXT_TOKEN_BUDGET(self):
         return self._get_setting("CONTEXT_TOKEN_BUDGET", 1800, int)
 
-    @property
+    # Az LLM tokenizere a kontextus pontos tokenkeretéhez (HF hub azonosító vagy helyi tokenizer.json;
+    # üres vagy nem elérhető esetén becslés)
+    @cached_property
+    def LLM_TOKENIZER(self):
+        return str(self._get_setting("LLM_TOKENIZER", "Xenova/llama3-tokenizer-new") or "").strip()
+
+    # Prompt prefix cache mérése helyi modellel (blokkméret és a cache-elhető minimális prefix tokenben)
+    @cached_property
+    def PROMPT_CACHE_SIMULATE(self):
+        val = str(self._get_setting("PROMPT_CACHE_SIMULATE", "false")).lower()
+        return val in ("1", "true", "yes", "on")
+
+    @cached_property
+    def PROMPT_CACHE_BLOCK(self):
+        return self._get_setting("PROMPT_CACHE_BLOCK", 128, int)
+
+    @cached_property
+    def PROMPT_CACHE_MIN_TOKENS(self):
+        return self._get_setting("PROMPT_CACHE_MIN_TOKENS", 1024, int)
+
+    # Az LLM kontextusablaka tokenben (prompt + kontextus + válasz együtt)
+    @cached_property
+    def LLM_CONTEXT_WINDOW(self):
+        return self._get_setting("LLM_CONTEXT_WINDOW", 8192, int)
+
+    @cached_property
     def TOP_K(self):
         return self._get_setting("TOP_K", 6, int)
 
-    @property
+    @cached_property
     def RETRIEVE_N(self):
         return self._get_setting("RETRIEVE_N", 40, int)
 
-    @property
+    @cached_property
     def ENABLE_MULTIQUERY(self):
         # bool parse: accept "true"/"1"/True
         val = str(self._get_setting("ENABLE_MULTIQUERY", "false")).lower()
         return val in ("1", "true", "yes", "on")
 
-    @property
+    # Multi-query: ennyi másodperc után a RO fordítást elhagyjuk (csak az eredeti keresés marad)
+    @cached_property
+    def MULTIQUERY_DEADLINE(self):
+        return self._get_setting("MULTIQUERY_DEADLINE", 2.5, float)
+
+    @cached_property
     def ENABLE_DIVERSIFY(self):
         val = str(self._get_setting("ENABLE_DIVERSIFY", "true")).lower()
         return val in ("1", "true", "yes", "on")
 
-    @property
+    @cached_property
     def DIVERSIFY_LAMBDA(self):
         return self._get_setting("DIVERSIFY_LAMBDA", 0.6, float)
 
+    # Hibrid keresés: BM25 (lexikális) + dense találatok reciprok rang fúzióval (RRF)
+    @cached_property
+    def ENABLE_HYBRID(self):
+        val = str(self._get_setting("ENABLE_HYBRID", "true")).lower()
+        return val in ("1", "true", "yes", "on")
+
+    @cached_property
+    def RRF_K(self):
+        return self._get_setting("RRF_K", 60, int)
+
+    # Cikk/bekezdés hivatkozások (pl. "IX. cikk (2)") közvetlen feloldása a vektoros keresés előtt
+    @cached_property
+    def ENABLE_REFERENCE_LOOKUP(self):
+        val = str(self._get_setting("ENABLE_REFERENCE_LOOKUP", "true")).lower()
+        return val in ("1", "true", "yes", "on")
+
+    # Betöltési pipeline: PDF kinyerő folyamatok száma (0 = CPU magok száma)
+    @cached_property
+    def INGEST_WORKERS(self):
+        return self._get_setting("INGEST_WORKERS", 0, int)
+
+    # Ennyi kinyert chunk gyűlik össze dokumentumokon át, mielőtt a közös embedding lépés lefut
+    @cached_property
+    def INGEST_EMBED_BATCH(self):
+        return self._get_setting("INGEST_EMBED_BATCH", 512, int)
+
+    # ...vagy legfeljebb ennyi másodpercig várakoznak, hogy a folyamatjelző ne álljon meg a kinyerés alatt
+    @cached_property
+    def INGEST_FLUSH_SECONDS(self):
+        return self._get_setting("INGEST_FLUSH_SECONDS", 2.0, float)
+
+    # Index szegmensek: ennyi szegmens felett háttérben összevonás indul
+    @cached_property
+    def INDEX_MAX_SEGMENTS(self):
+        return self._get_setting("INDEX_MAX_SEGMENTS", 8, int)
+
+    # Ha a törölt (tombstone) sorok aránya ezt meghaladja, mentéskor tömörítés történik
+    @cached_property
+    def TOMBSTONE_COMPACT_RATIO(self):
+        return self._get_setting("TOMBSTONE_COMPACT_RATIO", 0.2, float)
+
+    # Vektorok tárolása/pontozása: float32 | float16 | int8 (dimenziónkénti skálával)
+    @cached_property
+    def VECTOR_DTYPE(self):
+        return str(self._get_setting("VECTOR_DTYPE", "float32")).strip().lower()
+
+    # Kvantálásnál a pontos float32 oszlop megtartása lemezen (újrarangsoroláshoz; mmap, csak a jelöltek töltődnek be)
+    @cached_property
+    def VECTOR_KEEP_EXACT(self):
+        val = str(self._get_setting("VECTOR_KEEP_EXACT", "true")).lower()
+        return val in ("1", "true", "yes", "on")
+
+    # Kvantált / PQ keresés után a top k·RERANK_FACTOR jelölt pontos vektorokkal újrarangsorolva
+    @cached_property
+    def VECTOR_RERANK(self):
+        val = str(self._get_setting("VECTOR_RERANK", "true")).lower()
+        return val in ("1", "true", "yes", "on")
+
+    @cached_property
+    def RERANK_FACTOR(self):
+        return self._get_setting("RERANK_FACTOR", 4, int)
+
+    # Közelítő (ANN) keresőindex FAISS mellett: auto | flat | ivf_flat | ivf_pq | hnsw
+    @cached_property
+    def ANN_INDEX_TYPE(self):
+        return str(self._get_setting("ANN_INDEX_TYPE", "auto")).strip().lower()
+
+    # "auto" módban ennyi chunk felett vált a pontos (flat) keresésről IVF indexre
+    @cached_property
+    def ANN_AUTO_THRESHOLD(self):
+        return self._get_setting("ANN_AUTO_THRESHOLD", 200000, int)
+
+    # IVF listák száma (0 = automatikus, ~4·√N)
+    @cached_property
+    def ANN_NLIST(self):
+        return self._get_setting("ANN_NLIST", 0, int)
+
+    @cached_property
+    def ANN_NPROBE(self):
+        return self._get_setting("ANN_NPROBE", 16, int)
+
+    # IVF-PQ alvektorok száma (0 = automatikus a dimenzió alapján)
+    @cached_property
+    def ANN_PQ_M(self):
+        return self._get_setting("ANN_PQ_M", 0, int)
+
+    @cached_property
+    def ANN_HNSW_M(self):
+        return self._get_setting("ANN_HNSW_M", 32, int)
+
+    @cached_property
+    def ANN_EF_CONSTRUCTION(self):
+        return self._get_setting("ANN_EF_CONSTRUCTION", 200, int)
+
+    @cached_property
+    def ANN_EF_SEARCH(self):
+        return self._get_setting("ANN_EF_SEARCH", 64, int)
+
+    # Szemantikus válasz cache (közel azonos kérdés + azonos kontextus esetén nincs LLM hívás)
+    @cached_property
+    def ENABLE_ANSWER_CACHE(self):
+        val = str(self._get_setting("ENABLE_ANSWER_CACHE", "true")).lower()
+        return val in ("1", "true", "yes", "on")
+
+    @cached_property
+    def ANSWER_CACHE_SIZE(self):
+        return self._get_setting("ANSWER_CACHE_SIZE", 128, int)
+
+    @cached_property
+    def ANSWER_CACHE_TTL(self):
+        return self._get_setting("ANSWER_CACHE_TTL", 3600, float)
+
+    @cached_property
+    def ANSWER_CACHE_THRESHOLD(self):
+        return self._get_setting("ANSWER_CACHE_THRESHOLD", 0.95, float)
+
     # Fájl útvonalak
     DOCUMENTS_DIR = "documents/uploaded"
     DATA_DIR = "data"
@@ -163,4 +424,29 @@ class Config:
     
     # Nyelvek (információs jellegű – a jelenlegi pipeline főként HU-ra optimalizált)
     INPUT_LANGUAGE = "hu"  # Magyar
-    OUTPUT_LANGUAGE = "hu"  # Magyar
\ No newline at end of file
+    OUTPUT_LANGUAGE = "hu"  # Magyar
+
+
+_config: Optional[Config] = None
+_config_lock = threading.Lock()
+
+
+def get_config() -> Config:
+    """A folyamat közös konfigurációs pillanatképe (első híváskor készül el)."""
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = Config()
+    return _config
+
+
+def reload_config() -> Config:
+    """Új pillanatkép a secrets fájlok és a környezeti változók újraolvasásával.
+    A már létrehozott komponensek a régi példányt tartják meg, amíg át nem adjuk nekik az újat.
+    """
+    global _config
+    config = Config()
+    with _config_lock:
+        _config = config
+    return config
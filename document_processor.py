@@ -1,13 +1,18 @@
 import os
 import json
 import hashlib
-from typing import List, Dict, Tuple
-from langdetect import detect
-from config import Config
+from typing import List, Dict, Tuple, Optional
+from config import get_config
+from reference_index import extract_chunk_references
+
+def extract_pdf(file_path: str, file_hash: Optional[str] = None) -> Tuple[List[str], Dict]:
+    """Modul szintű belépési pont a folyamat-medencés (ProcessPoolExecutor) kinyeréshez."""
+    return DocumentProcessor().process_pdf(file_path, file_hash=file_hash)
+
 
 class DocumentProcessor:
     def __init__(self):
-        self.config = Config()
+        self.config = get_config()
         self._ensure_directories()
     
     def _ensure_directories(self):
@@ -19,9 +24,10 @@ class DocumentProcessor:
         ]:
             os.makedirs(directory, exist_ok=True)
     
-    def process_pdf(self, file_path: str) -> Tuple[List[str], Dict]:
+    def process_pdf(self, file_path: str, file_hash: Optional[str] = None) -> Tuple[List[str], Dict]:
         """PDF fájl feldolgozása PyPDF2-vel (pure-Python), oldalszintű chunkolással.
         Cél: elkerülni a PyMuPDF (fitz) natív fordítását a Cloud környezetben.
+        Ha a hívó már kiszámolta a fájl hash-ét, átadhatja, így nem olvassuk be újra.
         """
         try:
             from PyPDF2 import PdfReader
@@ -50,11 +56,15 @@ class DocumentProcessor:
                 "file_name": os.path.basename(file_path),
                 "total_pages": total_pages,
                 "file_size": os.path.getsize(file_path),
-                "file_hash": self._get_file_hash(file_path),
+                "file_hash": file_hash or self.get_file_hash(file_path),
                 "language": self._detect_language(full_text),
                 # Chunk -> oldal megfeleltetés a további pipeline-hoz
                 "chunk_pages": chunk_pages,
+                # Chunkonkénti cikk/bekezdés hivatkozások (pl. "IX. cikk", "IX. cikk (2)", "Art. 5")
+                "chunk_references": extract_chunk_references(all_chunks),
             }
+            # A tokenszámokat nem itt (a kinyerő munkafolyamatban) számoljuk: a tokenizer betöltése
+            # (esetleg letöltése) folyamatonként ismétlődne; az indexelés a szülőfolyamatban számol
 
             return all_chunks, metadata
 
@@ -121,11 +131,12 @@ class DocumentProcessor:
         try:
             if not text.strip(): return "unknown"
             sample_text = text[:1500]
+            from langdetect import detect
             return detect(sample_text)
         except:
             return "unknown"
     
-    def _get_file_hash(self, file_path: str) -> str:
+    def get_file_hash(self, file_path: str) -> str:
         """Fájl hash számítása"""
         hash_md5 = hashlib.md5()
         with open(file_path, "rb") as f:
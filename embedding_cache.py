@@ -0,0 +1,112 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from typing import List, Dict
+
+
+class EmbeddingCache:
+    """Lemezen tárolt embedding cache (SQLite), kulcs: (modellnév, chunk szöveg SHA-256).
+
+    Újraépítéskor, modell-újraindításkor vagy újrachunkoláskor az azonos szövegű chunkokat
+    nem kell újra kódolni. A méretet a max_entries korlátozza: túllépéskor a legrégebben
+    használt bejegyzések törlődnek (LRU a last_used oszlop alapján).
+    """
+
+    _BATCH = 500  # SQLite paraméterlimit alatt maradó IN (...) lista méret
+
+    def __init__(self, path: str, model_name: str, max_entries: int = 200_000):
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max(1, int(max_entries))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used INTEGER NOT NULL,"
+            " PRIMARY KEY (model, text_hash)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: List[str]) -> Dict[int, np.ndarray]:
+        """Cache találatok: {szöveg index: vektor}. A találatok last_used értéke frissül."""
+        hashes = [self.text_hash(t) for t in texts]
+        positions: Dict[str, List[int]] = {}
+        for i, h in enumerate(hashes):
+            positions.setdefault(h, []).append(i)
+        found: Dict[int, np.ndarray] = {}
+        unique = list(positions)
+        now = int(time.time())
+        with self._lock:
+            for start in range(0, len(unique), self._BATCH):
+                part = unique[start:start + self._BATCH]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    [self.model_name, *part],
+                ).fetchall()
+                for h, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    for i in positions[h]:
+                        found[i] = vector
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                        [(now, self.model_name, h) for h, _ in rows],
+                    )
+            self._conn.commit()
+        self.hits += len(found)
+        self.misses += len(texts) - len(found)
+        return found
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        if not texts:
+            return
+        now = int(time.time())
+        rows = [
+            (self.model_name, self.text_hash(t), np.asarray(v, dtype=np.float32).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        # 10% ráhagyással törlünk, hogy ne minden beszúrásnál fusson az eviction
+        to_delete = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE (model, text_hash) IN "
+            "(SELECT model, text_hash FROM embeddings ORDER BY last_used LIMIT ?)",
+            (to_delete,),
+        )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses, "max_entries": self.max_entries}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,9 +1,18 @@
 import os
 import json
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Optional
-from config import Config
+from typing import TYPE_CHECKING, List, Dict, Optional
+from config import get_config
+from chunk_store import ChunkStore
+from embedding_cache import EmbeddingCache
+import ann_index
+from bm25_index import BM25Index
+from reference_index import ReferenceIndex, extract_chunk_references, parse_query_references
+from token_counter import ChunkTokenCounts, APPROX, get_token_counter
 
 # FAISS opcionális: ha nincs elérhető wheel (pl. Python 3.13), essünk vissza NumPy alapú keresésre
 try:
@@ -13,165 +22,833 @@ except Exception:
     faiss = None  # type: ignore
     _HAS_FAISS = False
 
+if TYPE_CHECKING:  # a sentence_transformers (torch) betöltése csak a modell első használatakor
+    from sentence_transformers import SentenceTransformer
+
 class EmbeddingManager:
     def __init__(self):
-        self.config = Config()
+        self.config = get_config()
         self.model_name = str(self.config.EMBEDDING_MODEL).strip()
-        self.model: Optional[SentenceTransformer] = None
+        # Az embedding modell lustán töltődik be (model property / preload_model)
+        self._model: Optional["SentenceTransformer"] = None
+        self._model_lock = threading.Lock()
+        self.model_load_seconds: Optional[float] = None
         # FAISS index csak akkor, ha elérhető a könyvtár
         self._use_faiss: bool = bool(_HAS_FAISS)
         self.index: Optional[object] = None
-        # NumPy alapú fallback mátrix (IP/koz-szim hasonlóság normalizált vektorokra)
-        self.embeddings_matrix: Optional[np.ndarray] = None
-        self.chunk_metadata: List[Dict] = []
+        # A FAISS index típusa (flat / ivf_flat / ivf_pq / hnsw) és a mért recall@k a pontos kereséshez képest
+        self.index_type: str = "flat"
+        self.ann_recall: Optional[float] = None
+        # A tároló mérete az IVF / IVF-PQ index utolsó tanításakor (az újratanítás eldöntéséhez)
+        self._trained_ntotal = 0
+        self._ann_dirty = False
+        # Oszlopos tároló: vektorok (NumPy fallback keresés alapja) + chunk metaadatok
+        self.chunk_store = self._configure_store(ChunkStore())
+        self._merge_thread: Optional[threading.Thread] = None
+        # Lexikális (BM25) index a chunk szövegekre, a tároló soraival azonos sorazonosítókkal
+        self.lexical_index = BM25Index()
+        self._lexical_dirty = False
+        # Cikk/bekezdés hivatkozás → sorok keresőtábla (közvetlen feloldáshoz)
+        self.reference_index = ReferenceIndex()
+        self._references_dirty = False
+        # Chunkonkénti LLM tokenszámok (ingest során számolva, a kontextus csomagolásához)
+        self.token_counts = ChunkTokenCounts()
+        self._token_counts_dirty = False
+        self._token_counts_lock = threading.Lock()
+        self._recount_thread: Optional[threading.Thread] = None
+        # Az utolsó encode_texts futás statisztikái (chunk/s, kötegek, padding)
+        self.last_encode_stats: Dict = {}
+        self._embedding_cache: Optional[EmbeddingCache] = None
+        # Lekérdezés-embedding LRU cache
+        self._query_cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self.query_cache_hits = 0
+        self.query_cache_misses = 0
         self._ensure_directories()
-        self._load_model()
-    
+        if not self.config.LAZY_INIT:
+            self._load_model()
+
+    @property
+    def model(self) -> "SentenceTransformer":
+        """Az embedding modell; ha még nincs betöltve (vagy háttérben töltődik), itt megvárjuk."""
+        if self._model is None:
+            self._load_model()
+        return self._model
+
+    @property
+    def model_loaded(self) -> bool:
+        return self._model is not None
+
+    def preload_model(self) -> Optional[threading.Thread]:
+        """A modell betöltése háttérszálon, hogy az első lekérdezésnek már ne kelljen várnia."""
+        if self._model is not None:
+            return None
+
+        def _run():
+            try:
+                self._load_model()
+            except Exception as e:
+                print(f"Hiba a modell háttérbetöltése során: {str(e)}")
+
+        thread = threading.Thread(target=_run, name="embedding-model-load", daemon=True)
+        thread.start()
+        return thread
+
+    def _configure_store(self, store: ChunkStore) -> ChunkStore:
+        store.set_vector_format(self.config.VECTOR_DTYPE, self.config.VECTOR_KEEP_EXACT)
+        return store
+
     def _ensure_directories(self):
         os.makedirs(self.config.EMBEDDINGS_DIR, exist_ok=True)
     
     def _load_model(self):
-        try:
-            print(f"--- EmbeddingManager: Kísérlet az embedding modell betöltésére: '{self.model_name}' ---")
-            self.model = SentenceTransformer(self.model_name)
-            print(f"--- EmbeddingManager: Embedding modell sikeresen betöltve: '{self.model_name}' ---")
-        except Exception as e:
-            detailed_error = str(e)
-            print(f"--- EmbeddingManager: Hiba az embedding modell betöltése során. Használt modellnév: '{self.model_name}'. Részletes hiba: {detailed_error} ---")
-            raise Exception(f"Hiba az embedding modell betöltése során: {detailed_error}")
+        with self._model_lock:
+            if self._model is not None:
+                return
+            try:
+                print(f"--- EmbeddingManager: Kísérlet az embedding modell betöltésére: '{self.model_name}' ---")
+                t0 = time.perf_counter()
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name)
+                self.model_load_seconds = time.perf_counter() - t0
+                print(f"--- EmbeddingManager: Embedding modell sikeresen betöltve: '{self.model_name}' ({self.model_load_seconds:.1f} s) ---")
+            except Exception as e:
+                detailed_error = str(e)
+                print(f"--- EmbeddingManager: Hiba az embedding modell betöltése során. Használt modellnév: '{self.model_name}'. Részletes hiba: {detailed_error} ---")
+                raise Exception(f"Hiba az embedding modell betöltése során: {detailed_error}")
     
     def create_embeddings(self, chunks: List[str], document_metadata: Dict) -> Optional[np.ndarray]:
         if not chunks or self.model is None:
             return None
         try:
             print(f"Embeddings létrehozása {len(chunks)} darab szövegrészletből...")
-            embeddings = self.model.encode(chunks, show_progress_bar=True, normalize_embeddings=True)
-            
-            chunk_pages = document_metadata.get("chunk_pages", [])
-            for i, chunk in enumerate(chunks):
-                page_start = None
-                page_end = None
-                if i < len(chunk_pages):
-                    page_start = chunk_pages[i].get("page_start")
-                    page_end = chunk_pages[i].get("page_end")
-
-                meta = {
-                    "chunk_id": len(self.chunk_metadata),
-                    "text": chunk,
-                    "document_name": document_metadata["file_name"],
-                    "document_hash": document_metadata["file_hash"],
-                    "chunk_index": i
-                }
-                if page_start is not None:
-                    meta["page_start"] = page_start
-                if page_end is not None:
-                    meta["page_end"] = page_end
-
-                self.chunk_metadata.append(meta)
-            return embeddings.astype('float32')
+            embeddings = self.encode_texts(chunks)
+            self.add_embeddings(chunks, document_metadata, embeddings)
+            return embeddings
         except Exception as e:
             raise Exception(f"Hiba az embeddings létrehozása során: {str(e)}")
-    
+
+    def encode_documents(self, documents_chunks: List[List[str]]) -> List[np.ndarray]:
+        """Több dokumentum chunkjainak közös, hossz szerint kötegelt kódolása; az eredmény
+        dokumentumonként szétosztva. A tárolót nem módosítja.
+        """
+        if self.model is None:
+            raise Exception("Az embedding modell nincs betöltve")
+        texts = [t for chunks in documents_chunks for t in chunks]
+        if not texts:
+            return [np.zeros((0, 0), dtype="float32") for _ in documents_chunks]
+        try:
+            print(f"Embeddings létrehozása {len(texts)} darab szövegrészletből ({len(documents_chunks)} dokumentum)...")
+            embeddings = self.encode_texts(texts)
+        except Exception as e:
+            raise Exception(f"Hiba az embeddings létrehozása során: {str(e)}")
+        bounds = np.cumsum([0] + [len(chunks) for chunks in documents_chunks])
+        return [embeddings[bounds[i]:bounds[i + 1]] for i in range(len(documents_chunks))]
+
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        """Szövegek kódolása token-hossz szerint rendezett, azonos méretű kötegekben.
+        A hasonló hosszú chunkok egy kötegbe kerülnek, így kevesebb a padding; az eredmény
+        az eredeti sorrendbe kerül vissza. A futás áteresztőképességét a last_encode_stats tárolja.
+        """
+        n = len(texts)
+        dimension = self.model.get_sentence_embedding_dimension()
+        out = np.empty((n, dimension), dtype="float32")
+        if n == 0:
+            return out
+
+        # Perzisztens cache: csak a még nem látott szövegek mennek a modellhez
+        cache = self._get_embedding_cache()
+        cached = cache.get_many(texts) if cache is not None else {}
+        for i, vector in cached.items():
+            out[i] = vector
+        todo = np.array([i for i in range(n) if i not in cached], dtype=np.int64)
+        if todo.size == 0:
+            self.last_encode_stats = {"chunks": n, "cache_hits": n, "batches": 0, "seconds": 0.0}
+            print(f"⚡ Embedding: {n} chunk, mind a cache-ből")
+            return out
+
+        batch_size = max(1, self.config.EMBED_BATCH_SIZE)
+        lengths = self._token_lengths([texts[i] for i in todo])
+        order = todo[np.argsort(-lengths, kind="stable")]
+        lengths_by_row = np.zeros(n, dtype=np.int64)
+        lengths_by_row[todo] = lengths
+
+        t0 = time.perf_counter()
+        padded_tokens = 0
+        batches = 0
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            vectors = self.model.encode(
+                [texts[i] for i in idx],
+                batch_size=len(idx),
+                show_progress_bar=False,
+                normalize_embeddings=True,
+            )
+            out[idx] = np.asarray(vectors, dtype="float32")
+            padded_tokens += int(lengths_by_row[idx].max()) * len(idx)
+            batches += 1
+        elapsed = time.perf_counter() - t0
+        if cache is not None:
+            cache.put_many([texts[i] for i in todo], out[todo])
+
+        encoded = int(todo.size)
+        self.last_encode_stats = {
+            "chunks": n,
+            "encoded": encoded,
+            "cache_hits": n - encoded,
+            "batches": batches,
+            "batch_size": batch_size,
+            "seconds": elapsed,
+            "chunks_per_sec": encoded / elapsed if elapsed > 0 else float("inf"),
+            # Hasznos tokenek aránya a kötegek (max hossz × méret) tokenjeihez képest
+            "padding_efficiency": float(lengths.sum()) / padded_tokens if padded_tokens else 1.0,
+        }
+        print(
+            f"⚡ Embedding: {n} chunk ({n - encoded} a cache-ből), {batches} köteg ({batch_size}/köteg), {elapsed:.2f} s, "
+            f"{self.last_encode_stats['chunks_per_sec']:.1f} chunk/s, "
+            f"padding hatékonyság {self.last_encode_stats['padding_efficiency'] * 100:.0f}%"
+        )
+        return out
+
+    def _get_embedding_cache(self) -> Optional[EmbeddingCache]:
+        """A perzisztens embedding cache lusta megnyitása (ha engedélyezett)."""
+        if not self.config.ENABLE_EMBED_CACHE:
+            return None
+        if self._embedding_cache is None:
+            try:
+                path = os.path.join(self.config.EMBEDDINGS_DIR, "embedding_cache.sqlite")
+                self._embedding_cache = EmbeddingCache(path, self.model_name, self.config.EMBED_CACHE_MAX_ENTRIES)
+            except Exception as e:
+                print(f"ℹ️ Az embedding cache nem nyitható meg, cache nélkül folytatjuk: {str(e)}")
+                return None
+        return self._embedding_cache
+
+    def _token_lengths(self, texts: List[str]) -> np.ndarray:
+        """Chunkok token-hossza a modell tokenizálójával (a max_seq_length-re vágva);
+        ha a tokenizáló nem érhető el, a karakterhossz a közelítés.
+        """
+        max_len = int(getattr(self.model, "max_seq_length", 0) or 0)
+        try:
+            ids = self.model.tokenizer(texts, add_special_tokens=True, truncation=False)["input_ids"]
+            lengths = np.array([len(x) for x in ids], dtype=np.int64)
+        except Exception:
+            lengths = np.array([len(t) for t in texts], dtype=np.int64)
+            max_len = 0
+        if max_len > 0:
+            lengths = np.minimum(lengths, max_len)
+        return np.maximum(lengths, 1)
+
+    def add_embeddings(self, chunks: List[str], document_metadata: Dict, embeddings: np.ndarray):
+        """Egy dokumentum már kódolt chunkjainak felvétele a tárolóba."""
+        doc_id = self.chunk_store.add_document(
+            document_metadata["file_name"],
+            document_metadata["file_hash"],
+            document_metadata.get("language"),
+        )
+        start = self.chunk_store.append(embeddings, doc_id, chunks, document_metadata.get("chunk_pages", []))
+        self.lexical_index.add(start, chunks)
+        self._lexical_dirty = True
+        references = document_metadata.get("chunk_references")
+        if references is None or len(references) != len(chunks):
+            references = extract_chunk_references(chunks)
+        self.reference_index.add(start, references)
+        self._references_dirty = True
+        self._add_token_counts(start, chunks)
+
+    def _add_token_counts(self, start: int, chunks: List[str]):
+        counter = get_token_counter(self.config)
+        with self._token_counts_lock:
+            if self.token_counts.tokenizer != counter.name:
+                if len(self.token_counts) == 0:
+                    self.token_counts = ChunkTokenCounts(counter.name)
+                else:
+                    # Más tokenizerrel számolt meglévő darabszámok: újraszámolás a tárolt szövegekből
+                    self.token_counts = ChunkTokenCounts.build(counter, (self.chunk_store.get(row)["text"] for row in range(start)))
+            self.token_counts.add(start, counter.count_batch(chunks))
+            self._token_counts_dirty = True
+
+    def attach_token_counts(self, results: List[Dict]):
+        """A találatok "token_count" kulcsa az ingest során tárolt tokenszámból (ha ismert)."""
+        for r in results:
+            count = self.token_counts.get(int(r.get("chunk_id", -1)))
+            if count is not None:
+                r["token_count"] = count
+
     def build_index(self, embeddings: Optional[np.ndarray]):
+        """Az új vektorok felvétele a keresőindexbe.
+        A vektorokat a create_embeddings már a chunk tárolóba írta; NumPy flat módban a tároló
+        blokkjai közvetlenül kereshetők, FAISS és NumPy IVF módban ide adjuk hozzá őket.
+        """
         if embeddings is None:
             return
         try:
-            if self._use_faiss:
-                dimension = embeddings.shape[1]
-                if self.index is None:
-                    self.index = faiss.IndexFlatIP(dimension)  # type: ignore
-                # FAISS azonnal normalizált vektorokkal IP = cos sim
-                self.index.add(embeddings)  # type: ignore
-                total = int(self.index.ntotal)  # type: ignore
-                print(f"✅ Index építése kész (FAISS). Összesen {total} embedding.")
-            else:
-                if self.embeddings_matrix is None:
-                    self.embeddings_matrix = embeddings.astype("float32")
-                else:
-                    # vertikális összefűzés
-                    self.embeddings_matrix = np.vstack([self.embeddings_matrix, embeddings.astype("float32")])
-                print(f"✅ Index építése kész (NumPy). Összesen {self.embeddings_matrix.shape[0]} embedding.")
+            desired = self._desired_index_type()
+            if desired != self.index_type or (self.index is None and (self._use_faiss or desired != "flat")):
+                # Első építés vagy a méretküszöb átlépése: teljes újraépítés a tárolóból
+                self._rebuild_index()
+            elif self.index is not None and self.index.ntotal + len(embeddings) != len(self.chunk_store):
+                # Az index lemaradt a tárolóhoz képest (pl. egy korábbi sikertelen építés): újraépítés
+                self._rebuild_index()
+            elif ann_index.exceeds_quantizer_range(self.index, embeddings):
+                # Az int8 kvantáló tartománya a korábbi adatokon tanult: a kilógó új vektorok
+                # levágódnának, ezért a teljes tárolón újratanítunk
+                print("ℹ️ Az új vektorok kilógnak az int8 kvantáló tartományából, az index újratanítása...")
+                self._rebuild_index()
+            elif ann_index.needs_retrain(self.index, self._trained_ntotal, len(self.chunk_store), self._ann_params()):
+                # A tároló a tanítás óta jelentősen nőtt: új középpontok (és PQ kódkönyvek) a teljes tárolón
+                print(f"ℹ️ Az ANN index {self._trained_ntotal} soron tanult, most {len(self.chunk_store)} sor: újratanítás...")
+                self._rebuild_index()
+            elif self.index is not None:
+                # FAISS azonnal normalizált vektorokkal IP = cos sim (IVF: a meglévő középpontokhoz)
+                self.index.add(np.ascontiguousarray(embeddings, dtype=np.float32))  # type: ignore
+                self._ann_dirty = True
+            backend = "FAISS" if self._use_faiss else "NumPy"
+            print(f"✅ Index építése kész ({backend}, {self.index_type}). Összesen {len(self.chunk_store)} embedding.")
         except Exception as e:
             raise Exception(f"Hiba az index építése során: {str(e)}")
     
-    def search_similar(self, query: str, k: int = 5) -> List[Dict]:
-        if self.model is None or len(self.chunk_metadata) == 0:
+    def search_similar(self, query: str, k: int = 5, return_embeddings: bool = False,
+                       filters: Optional[Dict] = None) -> List[Dict]:
+        """Top-k hasonló chunk keresése.
+        return_embeddings=True esetén minden találat mellé a tárolt (normalizált) vektor is
+        bekerül az "embedding" kulcs alá, így az MMR-nek nem kell újrakódolnia a szövegeket.
+        A chunk szövegek csak a visszaadott találatoknál materializálódnak.
+        filters: lásd ChunkStore.filter_rows (document_name, language, page_from, page_to).
+        """
+        return self.search_similar_batch([query], k, return_embeddings=return_embeddings, filters=filters)[0]
+
+    def search_similar_batch(self, queries: List[str], k: int = 5, return_embeddings: bool = False,
+                             filters: Optional[Dict] = None,
+                             query_vectors: Optional[np.ndarray] = None) -> List[List[Dict]]:
+        """Több lekérdezés keresése egyszerre: egyetlen kódolási lépés (a cache-ben nem szereplő
+        lekérdezésekre), egyetlen index.search a lekérdezés-mátrixra, illetve NumPy módban
+        szegmensenként egyetlen mátrixszorzás. Lekérdezésenként egy találati listát ad vissza.
+        Szűrők esetén csak a feltételeknek megfelelő sorokat pontozzuk (az ANN index nélkül).
+        query_vectors: a hívó által már kódolt lekérdezések (ilyenkor nincs újabb cache-keresés).
+        """
+        if not queries:
             return []
+        if self.chunk_store.live_count == 0 or self.model is None:
+            return [[] for _ in queries]
         try:
-            query_embedding = self.model.encode([query], normalize_embeddings=True).astype("float32")
-            results: List[Dict] = []
-            if self._use_faiss and self.index is not None:
-                scores, indices = self.index.search(query_embedding, k)  # type: ignore
-                for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
-                    if idx != -1 and idx < len(self.chunk_metadata):
-                        result = self.chunk_metadata[idx].copy()
-                        result["similarity_score"] = float(score)
-                        result["rank"] = i + 1
-                        results.append(result)
-                return results
-            # NumPy fallback
-            if self.embeddings_matrix is None or self.embeddings_matrix.size == 0:
-                return []
-            # IP pontszám: mivel normalizált a kimenet, ez ~cosine sim
-            scores_np = np.matmul(self.embeddings_matrix, query_embedding[0])
+            if query_vectors is not None:
+                query_matrix = np.asarray(query_vectors, dtype=np.float32).reshape(len(queries), -1)
+            else:
+                query_matrix = self.encode_queries(queries)
             if k <= 0:
                 k = 5
-            k = min(k, scores_np.shape[0])
-            top_idx = np.argpartition(-scores_np, k - 1)[:k]
-            # Rendezzük véglegesen
-            top_idx = top_idx[np.argsort(-scores_np[top_idx])]
-            for i, idx in enumerate(top_idx, 1):
-                if 0 <= int(idx) < len(self.chunk_metadata):
-                    result = self.chunk_metadata[int(idx)].copy()
-                    result["similarity_score"] = float(scores_np[int(idx)])
-                    result["rank"] = i
-                    results.append(result)
-            return results
+            rerank = self._rerank_enabled()
+            fetch_k = k * max(1, self.config.RERANK_FACTOR) if rerank else k
+            rows = self.chunk_store.filter_rows(filters)
+            if rows is not None:
+                if rows.size == 0:
+                    return [[] for _ in queries]
+                scores, indices = self._filtered_search(query_matrix, rows, fetch_k)
+            elif self.index is not None:
+                # A törölt sorok miatt annyival többet kérünk, hogy k élő találat maradjon
+                fetch = min(fetch_k + self.chunk_store.deleted_count, int(self.index.ntotal))  # type: ignore
+                scores, indices = self.index.search(query_matrix, fetch)  # type: ignore
+            else:
+                scores, indices = self._numpy_search(query_matrix, fetch_k)
+            if rerank:
+                scores, indices = self._rerank_exact(query_matrix, scores, indices)
+            return [self._build_results(scores[q], indices[q], k, return_embeddings) for q in range(len(queries))]
         except Exception as e:
             print(f"Hiba a keresés során: {str(e)}")
+            return [[] for _ in queries]
+
+    def _numpy_search(self, query_matrix: np.ndarray, k: int):
+        """NumPy fallback: szegmensenkénti IP pontszám a (memória-leképezett, esetleg kvantált) tárolón."""
+        # IP pontszám: mivel normalizált a kimenet, ez ~cosine sim; alak: (lekérdezések, sorok)
+        scores_np = self.chunk_store.scores(query_matrix)
+        if self.chunk_store.deleted_count:
+            scores_np[:, self.chunk_store.tombstone_rows()] = -np.inf
+        k = min(k, self.chunk_store.live_count)
+        top_idx = np.argpartition(-scores_np, k - 1, axis=1)[:, :k]
+        # Rendezzük véglegesen
+        top_scores = np.take_along_axis(scores_np, top_idx, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top_scores, order, axis=1), np.take_along_axis(top_idx, order, axis=1)
+
+    def _filtered_search(self, query_matrix: np.ndarray, rows: np.ndarray, k: int, chunk: int = 65536):
+        """Pontozás csak a megadott (szűrt) sorokon; a vektorok darabonként, a kvantált oszlopból olvasva."""
+        scores_np = np.concatenate([
+            np.matmul(query_matrix, self.chunk_store.vectors(rows[start:start + chunk], exact=False).T)
+            for start in range(0, rows.size, chunk)
+        ], axis=1)
+        k = min(k, rows.size)
+        top_idx = np.argpartition(-scores_np, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores_np, top_idx, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top_scores, order, axis=1), rows[np.take_along_axis(top_idx, order, axis=1)]
+
+    def search_lexical(self, query: str, k: int = 5, filters: Optional[Dict] = None) -> List[Dict]:
+        """BM25 keresés az invertált indexen (pontos kifejezésekre, pl. "XXIII. cikk").
+        A találatok "bm25_score" kulcsot kapnak; dense hasonlóságot nem tartalmaznak.
+        """
+        if self.chunk_store.live_count == 0 or k <= 0:
             return []
-    
+        try:
+            allowed = self.chunk_store.filter_rows(filters)
+            if allowed is not None and allowed.size == 0:
+                return []
+            excluded = self.chunk_store.tombstone_rows() if self.chunk_store.deleted_count else None
+            rows, scores = self.lexical_index.search(query, k, allowed_rows=allowed, excluded_rows=excluded)
+            results: List[Dict] = []
+            for row, score in zip(rows, scores):
+                result = self.chunk_store.get(int(row))
+                result["bm25_score"] = float(score)
+                result["rank"] = len(results) + 1
+                results.append(result)
+            return results
+        except Exception as e:
+            print(f"Hiba a lexikális keresés során: {str(e)}")
+            return []
+
+    def _rebuild_lexical_index(self):
+        self.lexical_index = BM25Index.build(self.chunk_store.iter_texts())
+        self._lexical_dirty = True
+
+    def lookup_references(self, query: str, k: int = 5, filters: Optional[Dict] = None,
+                          query_vector: Optional[np.ndarray] = None) -> List[Dict]:
+        """A kérdésben explicit módon megnevezett cikkek/bekezdések (pl. "IX. cikk (2)", "Art. 5")
+        chunkjai a hivatkozás-táblából, vektoros keresés nélkül.
+        A találatok "reference" kulcsot kapnak; legfeljebb k chunk. Ha k-nál több chunk illeszkedik
+        (pl. az "IX. cikk" több jogszabályban is szerepel), a tárolt vektorok és a kérdés vektora
+        közötti hasonlóság dönt, különben kulcsonként chunksorrendben.
+        """
+        keys = parse_query_references(query)
+        if not keys or k <= 0 or self.chunk_store.live_count == 0:
+            return []
+        try:
+            rows = self.chunk_store.filter_rows(filters)
+            allowed = set(rows.tolist()) if rows is not None else None
+            matches: List[tuple] = []
+            seen = set()
+            for key in keys:
+                for row in self.reference_index.lookup([key]):
+                    if row in seen or row >= len(self.chunk_store) or self.chunk_store.is_deleted(row):
+                        continue
+                    if allowed is not None and row not in allowed:
+                        continue
+                    seen.add(row)
+                    matches.append((row, key))
+            scores: Optional[np.ndarray] = None
+            if len(matches) > k:
+                if query_vector is None:
+                    query_vector = self.encode_query(query)
+                vectors = self.chunk_store.vectors(np.asarray([row for row, _ in matches], dtype="int64"))
+                scores = np.matmul(vectors, np.asarray(query_vector, dtype=np.float32).reshape(-1))
+                order = np.argsort(-scores, kind="stable")[:k]
+            else:
+                order = np.arange(len(matches))
+            results: List[Dict] = []
+            for i in order:
+                row, key = matches[int(i)]
+                result = self.chunk_store.get(row)
+                result["reference"] = key
+                if scores is not None:
+                    result["similarity_score"] = float(scores[i])
+                result["rank"] = len(results) + 1
+                results.append(result)
+            return results
+        except Exception as e:
+            print(f"Hiba a hivatkozás feloldása során: {str(e)}")
+            return []
+
+    def _rebuild_reference_index(self):
+        self.reference_index = ReferenceIndex.build_from_store(self.chunk_store)
+        self._references_dirty = True
+
+    def _rerank_enabled(self) -> bool:
+        """Van-e értelme a pontos újrarangsorolásnak: közelítő (kvantált / PQ) pontszámok és elérhető pontos vektorok."""
+        if not self.config.VECTOR_RERANK or not self.chunk_store.has_exact:
+            return False
+        if self._use_faiss and self.index is not None:
+            return self.config.VECTOR_DTYPE != "float32" or self.index_type == "ivf_pq"
+        return self.chunk_store.is_quantized
+
+    def _rerank_exact(self, query_matrix: np.ndarray, scores: np.ndarray, indices: np.ndarray):
+        """A jelöltek újrapontozása a pontos (float32) vektorokkal, lekérdezésenként csökkenő sorrendben."""
+        new_scores = np.full(scores.shape, -np.inf, dtype=np.float32)
+        new_indices = np.full(indices.shape, -1, dtype=np.int64)
+        for q in range(indices.shape[0]):
+            rows = indices[q][indices[q] >= 0]
+            if rows.size == 0:
+                continue
+            exact = np.matmul(self.chunk_store.vectors(rows), query_matrix[q])
+            order = np.argsort(-exact)
+            new_scores[q, :rows.size] = exact[order]
+            new_indices[q, :rows.size] = rows[order]
+        return new_scores, new_indices
+
+    def _build_results(self, scores: np.ndarray, indices: np.ndarray, k: int, return_embeddings: bool) -> List[Dict]:
+        results: List[Dict] = []
+        for score, idx in zip(scores, indices):
+            idx = int(idx)
+            if idx == -1 or idx >= len(self.chunk_store) or self.chunk_store.is_deleted(idx):
+                continue
+            result = self.chunk_store.get(idx)
+            result["similarity_score"] = float(score)
+            result["rank"] = len(results) + 1
+            results.append(result)
+            if len(results) >= k:
+                break
+        if return_embeddings:
+            self._attach_embeddings(results)
+        return results
+
+    @property
+    def index_version(self) -> tuple:
+        """Az index tartalmának verziója (mentés, hozzáfűzés vagy törlés után megváltozik)."""
+        return (self.chunk_store.version, len(self.chunk_store), self.chunk_store.deleted_count)
+
+    def encode_query(self, query: str) -> np.ndarray:
+        """Egyetlen lekérdezés kódolása (lásd encode_queries)."""
+        return self.encode_queries([query])[0]
+
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Lekérdezések kódolása korlátos LRU cache-sel (kulcs: modellnév + normalizált szöveg).
+        Az ismételt kérdések és a multi-query duplikátumai így nem futtatják újra a modellt;
+        a cache-ben nem szereplő lekérdezések egyetlen encode hívásban kódolódnak.
+        """
+        texts = [unicodedata.normalize("NFC", " ".join(q.split())) for q in queries]
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        with self._query_cache_lock:
+            for i, text in enumerate(texts):
+                key = (self.model_name, text)
+                vector = self._query_cache.get(key)
+                if vector is not None:
+                    self._query_cache.move_to_end(key)
+                    self.query_cache_hits += 1
+                    vectors[i] = vector
+                else:
+                    self.query_cache_misses += 1
+        missing = sorted({texts[i] for i, v in enumerate(vectors) if v is None})
+        if missing:
+            encoded = self.model.encode(missing, normalize_embeddings=True).astype("float32")
+            fresh = dict(zip(missing, encoded))
+            with self._query_cache_lock:
+                for text, vector in fresh.items():
+                    vector.setflags(write=False)
+                    self._query_cache[(self.model_name, text)] = vector
+                    self._query_cache.move_to_end((self.model_name, text))
+                while len(self._query_cache) > max(0, self.config.QUERY_CACHE_SIZE):
+                    self._query_cache.popitem(last=False)
+            for i, text in enumerate(texts):
+                if vectors[i] is None:
+                    vectors[i] = fresh[text]
+        return np.vstack(vectors).astype("float32", copy=False)
+
+    def query_cache_stats(self) -> Dict:
+        total = self.query_cache_hits + self.query_cache_misses
+        return {
+            "size": len(self._query_cache),
+            "hits": self.query_cache_hits,
+            "misses": self.query_cache_misses,
+            "hit_rate": self.query_cache_hits / total if total else 0.0,
+        }
+
+    def get_embeddings(self, chunk_ids: List[int]) -> Optional[np.ndarray]:
+        """A tárolt vektorok visszaadása chunk_id (= tároló sor) alapján, újrakódolás nélkül."""
+        if not chunk_ids:
+            return None
+        rows = np.asarray(chunk_ids, dtype="int64")
+        if rows.min() < 0 or rows.max() >= len(self.chunk_store):
+            return None
+        return self.chunk_store.vectors(rows)
+
+    def _attach_embeddings(self, results: List[Dict]):
+        vectors = self.get_embeddings([int(r["chunk_id"]) for r in results])
+        if vectors is None:
+            return
+        for r, v in zip(results, vectors):
+            r["embedding"] = v
+
+    def _ann_params(self) -> Dict:
+        return {
+            "nlist": self.config.ANN_NLIST,
+            "nprobe": self.config.ANN_NPROBE,
+            "pq_m": self.config.ANN_PQ_M,
+            "hnsw_m": self.config.ANN_HNSW_M,
+            "ef_construction": self.config.ANN_EF_CONSTRUCTION,
+            "ef_search": self.config.ANN_EF_SEARCH,
+            "vector_dtype": self.config.VECTOR_DTYPE,
+        }
+
+    def _desired_index_type(self) -> str:
+        return ann_index.resolve_index_type(self.config.ANN_INDEX_TYPE, len(self.chunk_store),
+                                            self.config.ANN_AUTO_THRESHOLD, use_faiss=self._use_faiss)
+
+    def _rebuild_index(self):
+        """Keresőindex felépítése a tároló (mmap) vektoraiból; ANN típusnál tanítás és recall mérés.
+        FAISS nélkül flat típusnál nincs index (közvetlen blokk-keresés), különben NumPy IVF.
+        """
+        self.index = None
+        self.index_type = self._desired_index_type()
+        self.ann_recall = None
+        self._ann_dirty = True
+        self._trained_ntotal = len(self.chunk_store)
+        if self.chunk_store.dimension is None:
+            return
+        started = time.perf_counter()
+        if self._use_faiss:
+            self.index = ann_index.build_from_store(self.chunk_store, self.index_type, self._ann_params())
+        elif self.index_type != "flat":
+            self.index = ann_index.NumpyIVF.build(self.chunk_store, self._ann_params())
+        if self.index_type != "flat":
+            self.ann_recall = self.evaluate_ann_recall()
+            print(f"✅ ANN index ({self.index_type}) felépítve {time.perf_counter() - started:.1f} s alatt, "
+                  f"recall@10 a pontos kereséshez képest: {self.ann_recall:.3f}")
+
+    def evaluate_ann_recall(self, k: int = 10, n_queries: int = 200) -> Optional[float]:
+        """Az aktuális ANN index recall@k értéke a pontos (flat) kereséshez képest."""
+        if self.index is None:
+            return None
+        return ann_index.measure_recall(self.index, self.chunk_store, k=k, n_queries=n_queries)
+
+    def index_info(self) -> Dict:
+        return {
+            "backend": "faiss" if self._use_faiss else "numpy",
+            "type": self.index_type,
+            "vector_dtype": self.config.VECTOR_DTYPE,
+            "recall_at_k": self.ann_recall,
+        }
+
+    def _save_ann_index(self, store_path: str):
+        """ANN index mentése a tároló mellé (a flat indexet betöltéskor olcsóbb újraépíteni)."""
+        if self.index_type == "flat":
+            ann_index.remove(store_path)
+        elif self._ann_dirty and self.index is not None:
+            ann_index.save(store_path, self.index, self.index_type, int(self.index.ntotal), self.ann_recall,  # type: ignore
+                           vector_dtype=self.config.VECTOR_DTYPE, trained_ntotal=self._trained_ntotal)
+        self._ann_dirty = False
+
     def save_index(self, filename: str = "legal_docs_index"):
         try:
-            saved_any = False
-            if self._use_faiss and self.index is not None:
-                index_path = os.path.join(self.config.EMBEDDINGS_DIR, f"{filename}.index")
-                faiss.write_index(self.index, index_path)  # type: ignore
-                saved_any = True
-            if (not self._use_faiss) and self.embeddings_matrix is not None:
-                npy_path = os.path.join(self.config.EMBEDDINGS_DIR, f"{filename}.npy")
-                np.save(npy_path, self.embeddings_matrix)
-                saved_any = True
-
-            if saved_any:
-                metadata_path = os.path.join(self.config.EMBEDDINGS_DIR, f"{filename}_metadata.json")
-                with open(metadata_path, 'w', encoding='utf-8') as f:
-                    json.dump(self.chunk_metadata, f, ensure_ascii=False, indent=2)
-                print("✅ Index és metaadatok sikeresen mentve")
-                return True
+            if len(self.chunk_store) == 0:
+                return False
+            store_path = os.path.join(self.config.EMBEDDINGS_DIR, filename)
+            # Append-only: csak a legutóbbi mentés óta hozzáadott sorok kerülnek kiírásra
+            self.chunk_store.save(store_path)
+            print(f"✅ Index és metaadatok sikeresen mentve ({self.chunk_store.segment_count} szegmens)")
+            if self.chunk_store.deleted_count > self.config.TOMBSTONE_COMPACT_RATIO * len(self.chunk_store):
+                self.compact_index(filename)
+            elif self.chunk_store.segment_count > self.config.INDEX_MAX_SEGMENTS:
+                self._schedule_merge(store_path)
+            self._save_ann_index(store_path)
+            if self._lexical_dirty:
+                self.lexical_index.save(os.path.join(store_path, "bm25"))
+                self._lexical_dirty = False
+            if self._references_dirty:
+                self.reference_index.save(store_path)
+                self._references_dirty = False
+            if self._token_counts_dirty:
+                self.token_counts.save(store_path)
+                self._token_counts_dirty = False
+            return True
         except Exception as e:
             print(f"Hiba az index mentése során: {str(e)}")
         return False
     
+    def has_document(self, document_hash: str) -> bool:
+        """Szerepel-e már az indexben (nem törölt) ilyen tartalmú (hash-ű) dokumentum."""
+        return bool(self.chunk_store.find_documents(document_hash=document_hash))
+
+    def find_document_hash(self, document_name: str) -> Optional[str]:
+        """Az azonos nevű, már indexelt dokumentum hash-e (ha van)."""
+        doc_ids = self.chunk_store.find_documents(document_name=document_name)
+        return self.chunk_store.documents[doc_ids[-1]]["document_hash"] if doc_ids else None
+
+    def find_document_ids(self, document_name: str) -> List[int]:
+        """Az azonos nevű, nem törölt dokumentumok azonosítói."""
+        return self.chunk_store.find_documents(document_name=document_name)
+
+    def delete_documents(self, document_name: Optional[str] = None, document_hash: Optional[str] = None,
+                         doc_ids: Optional[List[int]] = None) -> int:
+        """Dokumentum(ok) törlése név és/vagy hash, vagy dokumentum-azonosítók alapján (tombstone).
+        A sorok azonnal kiesnek a keresésből; a hely a compact_index hívásakor szabadul fel.
+        Visszaadja az érintett chunkok számát.
+        """
+        if doc_ids is None:
+            if document_name is None and document_hash is None:
+                return 0
+            doc_ids = self.chunk_store.find_documents(document_name=document_name, document_hash=document_hash)
+        if not doc_ids:
+            return 0
+        deleted = self.chunk_store.delete_documents(doc_ids)
+        print(f"🗑️ {deleted} chunk törlésre jelölve ({len(doc_ids)} dokumentum)")
+        return deleted
+
+    def compact_index(self, filename: str = "legal_docs_index") -> int:
+        """A törölt sorok fizikai eltávolítása és az index újraépítése."""
+        try:
+            if self._merge_thread is not None:
+                self._merge_thread.join()
+            store_path = os.path.join(self.config.EMBEDDINGS_DIR, filename)
+            removed = self.chunk_store.compact(store_path)
+            if removed:
+                self._rebuild_index()
+                self._rebuild_lexical_index()
+                self._rebuild_reference_index()
+                self._save_ann_index(store_path)
+                self.lexical_index.save(os.path.join(store_path, "bm25"))
+                self._lexical_dirty = False
+                self.reference_index.save(store_path)
+                self._references_dirty = False
+                self._rebuild_token_counts()
+                self.token_counts.save(store_path)
+                self._token_counts_dirty = False
+            if removed:
+                print(f"✅ Index tömörítve: {removed} törölt chunk eltávolítva")
+            return removed
+        except Exception as e:
+            raise Exception(f"Hiba az index tömörítése során: {str(e)}")
+
+    def _schedule_merge(self, store_path: str):
+        """Szegmensek összevonása háttérszálon (egyszerre legfeljebb egy fut)."""
+        if self._merge_thread is not None and self._merge_thread.is_alive():
+            return
+
+        def _run():
+            try:
+                if self.chunk_store.merge_segments(store_path):
+                    print(f"✅ Index szegmensek összevonva ({self.chunk_store.segment_count} szegmens)")
+            except Exception as e:
+                print(f"Hiba a szegmensek összevonása során: {str(e)}")
+
+        self._merge_thread = threading.Thread(target=_run, name="index-segment-merge", daemon=True)
+        self._merge_thread.start()
+
     def load_index(self, filename: str = "legal_docs_index") -> bool:
         try:
-            index_path = os.path.join(self.config.EMBEDDINGS_DIR, f"{filename}.index")
-            npy_path = os.path.join(self.config.EMBEDDINGS_DIR, f"{filename}.npy")
-            metadata_path = os.path.join(self.config.EMBEDDINGS_DIR, f"{filename}_metadata.json")
-
-            if self._use_faiss and os.path.exists(index_path) and os.path.exists(metadata_path):
-                self.index = faiss.read_index(index_path)  # type: ignore
-                with open(metadata_path, 'r', encoding='utf-8') as f:
-                    self.chunk_metadata = json.load(f)
-                print(f"✅ Index betöltve (FAISS): {int(self.index.ntotal)} embedding, {len(self.chunk_metadata)} metaadat")  # type: ignore
-                return True
-            if (not self._use_faiss) and os.path.exists(npy_path) and os.path.exists(metadata_path):
-                self.embeddings_matrix = np.load(npy_path).astype("float32")
-                with open(metadata_path, 'r', encoding='utf-8') as f:
-                    self.chunk_metadata = json.load(f)
-                print(f"✅ Index betöltve (NumPy): {self.embeddings_matrix.shape[0]} embedding, {len(self.chunk_metadata)} metaadat")
-                return True
-            return False
+            store_path = os.path.join(self.config.EMBEDDINGS_DIR, filename)
+            if ChunkStore.exists(store_path):
+                self.chunk_store = self._configure_store(ChunkStore.load(store_path))
+            elif not self._load_legacy_index(filename):
+                return False
+
+            self._load_ann_index(store_path)
+            self._load_lexical_index(store_path)
+            self._load_reference_index(store_path)
+            self._load_token_counts(store_path)
+            if self._use_faiss:
+                print(f"✅ Index betöltve (FAISS, {self.index_type}): {int(self.index.ntotal)} embedding, {len(self.chunk_store)} metaadat")  # type: ignore
+            else:
+                print(f"✅ Index betöltve (NumPy, mmap, {self.index_type}): {len(self.chunk_store)} embedding")
+            return True
         except Exception as e:
             print(f"Hiba az index betöltése során: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+    def _load_ann_index(self, store_path: str):
+        """Mentett ANN index betöltése, ha típusa és mérete az aktuális tárolóhoz illik; különben újraépítés."""
+        index_type = self._desired_index_type()
+        if index_type != "flat":
+            store = None if self._use_faiss else self.chunk_store
+            index, recall, trained_ntotal = ann_index.load(store_path, index_type, len(self.chunk_store), store=store,
+                                                           vector_dtype=self.config.VECTOR_DTYPE)
+            if index is not None and not ann_index.needs_retrain(index, trained_ntotal, len(self.chunk_store),
+                                                                 self._ann_params()):
+                ann_index.set_search_params(index, self._ann_params())
+                self.index, self.index_type, self.ann_recall = index, index_type, recall
+                self._trained_ntotal = trained_ntotal
+                self._ann_dirty = False
+                return
+        self._rebuild_index()
+
+    def _load_lexical_index(self, store_path: str):
+        """A mentett BM25 index betöltése; hiányzó vagy elavult index esetén újraépítés és mentés."""
+        bm25_path = os.path.join(store_path, "bm25")
+        index = BM25Index.load(bm25_path)
+        if index is not None and len(index) == len(self.chunk_store):
+            self.lexical_index = index
+            self._lexical_dirty = False
+            return
+        self._rebuild_lexical_index()
+        self.lexical_index.save(bm25_path)
+        self._lexical_dirty = False
+
+    def _load_reference_index(self, store_path: str):
+        """A mentett hivatkozás-tábla betöltése; hiányzó vagy elavult tábla esetén újraépítés és mentés."""
+        index = ReferenceIndex.load(store_path)
+        if index is not None and len(index) == len(self.chunk_store):
+            self.reference_index = index
+            self._references_dirty = False
+            return
+        self._rebuild_reference_index()
+        self.reference_index.save(store_path)
+        self._references_dirty = False
+
+    def _load_token_counts(self, store_path: str):
+        """A tárolt tokenszámok betöltése; hiányzó, elavult vagy más tokenizerrel számolt adat esetén újraszámolás.
+        Becsült (APPROX) darabszámok beállított tokenizer mellett (pl. a tokenizer korábban nem volt
+        elérhető) ideiglenesen használhatók, de háttérszálon újraszámoljuk őket, hogy az indulást
+        ne lassítsa a tokenizer betöltése.
+        """
+        counts = ChunkTokenCounts.load(store_path)
+        configured = (self.config.LLM_TOKENIZER or "").strip() or APPROX
+        if counts is not None and len(counts) == len(self.chunk_store) and counts.tokenizer in (configured, APPROX):
+            self.token_counts = counts
+            self._token_counts_dirty = False
+            if counts.tokenizer != configured:
+                self._schedule_token_recount(store_path)
+            return
+        self._rebuild_token_counts()
+        self.token_counts.save(store_path)
+        self._token_counts_dirty = False
+
+    def _schedule_token_recount(self, store_path: str):
+        """A becsült tokenszámok újraszámolása a beállított tokenizerrel, háttérszálon."""
+        if self._recount_thread is not None and self._recount_thread.is_alive():
+            return
+
+        def _run():
+            try:
+                counter = get_token_counter(self.config)
+                if counter.name == APPROX:
+                    return  # a tokenizer most sem érhető el: maradnak a becsült értékek
+                rows = len(self.chunk_store)
+                counts = ChunkTokenCounts.build(counter, (self.chunk_store.get(row)["text"] for row in range(rows)))
+                with self._token_counts_lock:
+                    if len(self.token_counts) < rows or self.token_counts.tokenizer == counter.name:
+                        return  # közben tömörítés vagy teljes újraszámolás történt
+                    # A számolás alatt hozzáadott sorok pótlása
+                    extra = [self.chunk_store.get(row)["text"] for row in range(rows, len(self.token_counts))]
+                    if extra:
+                        counts.add(rows, counter.count_batch(extra))
+                    self.token_counts = counts
+                    self.token_counts.save(store_path)
+                    self._token_counts_dirty = False
+                print(f"✅ Tokenszámok újraszámolva ({counter.name}): {len(counts)} chunk")
+            except Exception as e:
+                print(f"Hiba a tokenszámok újraszámolása során: {str(e)}")
+
+        self._recount_thread = threading.Thread(target=_run, name="token-recount", daemon=True)
+        self._recount_thread.start()
+
+    def _rebuild_token_counts(self):
+        with self._token_counts_lock:
+            self.token_counts = ChunkTokenCounts.build(get_token_counter(self.config), self.chunk_store.iter_texts())
+            self._token_counts_dirty = True
+
+    def _load_legacy_index(self, filename: str) -> bool:
+        """Régi formátum (.index/.npy + JSON metaadat) beolvasása és átírása az oszlopos formátumba."""
+        index_path = os.path.join(self.config.EMBEDDINGS_DIR, f"{filename}.index")
+        npy_path = os.path.join(self.config.EMBEDDINGS_DIR, f"{filename}.npy")
+        metadata_path = os.path.join(self.config.EMBEDDINGS_DIR, f"{filename}_metadata.json")
+        if not os.path.exists(metadata_path):
+            return False
+        if os.path.exists(npy_path):
+            vectors = np.load(npy_path).astype("float32")
+        elif self._use_faiss and os.path.exists(index_path):
+            legacy_index = faiss.read_index(index_path)  # type: ignore
+            vectors = legacy_index.reconstruct_n(0, int(legacy_index.ntotal))  # type: ignore
+        else:
+            return False
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            chunk_metadata = json.load(f)
+        self.chunk_store = self._configure_store(ChunkStore.from_legacy(chunk_metadata, vectors))
+        print("ℹ️ Régi index formátum átalakítása oszlopos tárolóvá...")
+        self.save_index(filename)
+        return True
@@ -1,23 +1,116 @@
-from groq import Groq
-from typing import List, Dict
-from config import Config
+import re
+import asyncio
+import threading
+from typing import List, Dict, Iterator, Optional, Tuple
+from config import get_config
+from token_counter import get_token_counter
+from prompt_cache import PrefixCacheSimulator
+from utils import knapsack_select
+
+_CONTEXT_SEPARATOR = "\n---\n"
+# Vágási pont: mondatvég, üres sor vagy új bekezdés ("(2) ...") előtti sortörés; a PDF-ből
+# kinyert szöveg egyszerű sortörései mondat közepén is lehetnek, ezek nem számítanak
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;])\s+|\n\s*\n|\n(?=\s*\(\d+\))")
+# Ennél kisebb maradék keretbe már nem vágunk be mondatokat
+_MIN_TRIM_TOKENS = 32
+# A rendszerprompt és az utasítások statikusak: minden kérés byte-azonos elejét adják
+# (szolgáltató- vagy proxy-oldali prefix cache), ezért nem tartalmazhatnak kérésfüggő részt
+SYSTEM_PROMPT = """Te egy magyar jogi asszisztens vagy, aki magyar és román nyelvű jogi dokumentumrészleteket elemez, és mindig magyarul válaszol.
+FONTOS SZABÁLYOK:
+1. Mindig MAGYARUL válaszolj.
+2. Kizárólag a megadott kontextusra támaszkodj. Ha a kontextus nem elegendő, jelezd, hogy nincs elég információ.
+3. Idézz közvetlenül a kontextusból annak EREDETI nyelvén. Ha az idézet román nyelvű, mellékelj rövid magyar értelmezést/fordítást. Ha az idézet magyar, ne erőltesd román idézetet.
+4. Hivatkozz a forrásokra (pl. dokumentumnév; ha lehet: cikk/oldal).
+5. Legyél tömör, pontos és közérthető; a jogi szakkifejezéseket röviden magyarázd el.
+Feladat: Elemezd a rendelkezésre álló szövegrészleteket, és adj pontos, forrásolt választ magyarul a felhasználó kérdésére a kontextus alapján."""
+
+PROMPT_INSTRUCTIONS = """UTASÍTÁSOK:
+- Mindig magyarul válaszolj.
+- Az idézeteket a kontextus EREDETI nyelvén add meg. Ha román idézet szerepel, tegyél mellé rövid magyar értelmezést/fordítást. Ha magyar az idézet, ne erőltesd román idézetet.
+- Ha a kontextus nem elegendő, jelezd egyértelműen.
+- A kérdés a dokumentumrészletek után következik.
+"""
+
+# Üzenetenkénti formázási többlet a chat sablonban (szerep fejlécek, speciális tokenek)
+_MESSAGE_OVERHEAD_TOKENS = 16
 
 class GroqClient:
-    def __init__(self):
-        self.config = Config()
-        self.client = Groq(api_key=self.config.GROQ_API_KEY)
+    def __init__(self, client=None, async_client=None):
+        self.config = get_config()
+        # Egy kompatibilis kliens (pl. helyi hamis Groq kliens teszteléshez) kívülről is átadható;
+        # a groq csomag (httpx, pydantic) csak az első hívásnál töltődik be
+        self._client = client
+        self._pool = None
+        # Helyi prefix cache modell: a kérések prompt-cache találati arányának mérése (opcionális)
+        self.prompt_cache: Optional[PrefixCacheSimulator] = None
+        if self.config.PROMPT_CACHE_SIMULATE:
+            self.prompt_cache = PrefixCacheSimulator(
+                get_token_counter(self.config),
+                block_tokens=self.config.PROMPT_CACHE_BLOCK,
+                min_prefix_tokens=self.config.PROMPT_CACHE_MIN_TOKENS,
+            )
+        # Az utolsó kérés prefix cache jelentése szálanként (a kliens a munkamenetek között közös)
+        self._local = threading.local()
+        self._client_lock = threading.Lock()
+        # Az aszinkron kliens lustán jön létre (azon az eseményhurkon, ahol először használjuk)
+        self._async_client = async_client
+        self._async_disabled = client is not None and async_client is None
+        self._owns_client = client is None
+        self._owns_async_client = async_client is None
     
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from groq import Groq
+                    # Az újrapróbálást, határidőt és megszakítót a közös transport végzi (max_retries=0)
+                    self._client = Groq(api_key=self.config.GROQ_API_KEY, base_url=self.config.GROQ_BASE_URL,
+                                        http_client=self.http_pool.client, timeout=self.http_pool.timeout,
+                                        max_retries=0)
+        return self._client
+
+    def reload_config(self, config):
+        """Új konfiguráció átvétele: a saját Groq kliensek a következő híváskor az új beállításokkal
+        (API kulcs, végpont, és ha az LLM_* értékek változtak, új HTTP medence) épülnek újra;
+        a kívülről átadott kliensek megmaradnak.
+        """
+        with self._client_lock:
+            self.config = config
+            if self._pool is not None:
+                from http_transport import get_http_pool
+                self._pool = get_http_pool(config)
+            if self._owns_client:
+                self._client = None
+            if self._owns_async_client:
+                self._async_client = None
+
+    @property
+    def http_pool(self):
+        """A folyamat közös HTTP medencéje (keep-alive kapcsolatok, újrapróbálás, megszakító, mérések)."""
+        if self._pool is None:
+            from http_transport import get_http_pool
+            self._pool = get_http_pool(self.config)
+        return self._pool
+
+    def http_stats(self) -> Optional[Dict]:
+        """Hívásmérések (hívások, hibák, újrapróbálások, p50/p95 késleltetés, megszakító állapot)."""
+        return self._pool.stats() if self._pool is not None else None
+
+    def _unavailable(self) -> Optional[str]:
+        """Hibaüzenet, ha a megszakító nyitva van (ilyenkor hálózati hívást sem kísérelünk meg)."""
+        if self._pool is None or self._pool.breaker.state != "open":
+            return None
+        return f"a Groq API átmenetileg nem elérhető, újrapróba {self._pool.breaker.retry_in():.0f} s múlva"
+
     def generate_response(self, query: str, context_chunks: List[Dict]) -> str:
+        self._local.prompt_cache = None
+        unavailable = self._unavailable()
+        if unavailable:
+            return f"Hiba történt a válasz generálása során: {unavailable}"
         try:
-            # Építsük fel és vágjuk a kontextust a token kerethez igazítva
-            context = self._build_context(context_chunks, budget=self.config.CONTEXT_TOKEN_BUDGET)
-            prompt = self._build_prompt(query, context)
-            
             response = self.client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": self._get_system_prompt()},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._build_messages(query, context_chunks),
                 model=self.config.LLM_MODEL,
                 max_tokens=self.config.MAX_TOKENS,
                 temperature=self.config.TEMPERATURE
@@ -25,65 +118,159 @@ class GroqClient:
             return response.choices[0].message.content
         except Exception as e:
             return f"Hiba történt a válasz generálása során: {str(e)}"
+
+    def generate_response_stream(self, query: str, context_chunks: List[Dict]) -> Iterator[str]:
+        """A válasz streamelt változata: a tokeneket (szövegdarabokat) érkezésük sorrendjében adja.
+        Hiba esetén egyetlen hibaüzenet darabot ad vissza, a generate_response-szal egyezően.
+        """
+        self._local.prompt_cache = None
+        unavailable = self._unavailable()
+        if unavailable:
+            yield f"Hiba történt a válasz generálása során: {unavailable}"
+            return
+        try:
+            stream = self.client.chat.completions.create(
+                messages=self._build_messages(query, context_chunks),
+                model=self.config.LLM_MODEL,
+                max_tokens=self.config.MAX_TOKENS,
+                temperature=self.config.TEMPERATURE,
+                stream=True,
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        except Exception as e:
+            yield f"Hiba történt a válasz generálása során: {str(e)}"
+
+    def _build_messages(self, query: str, context_chunks: List[Dict]) -> List[Dict]:
+        # Építsük fel a kontextust a token kerethez igazítva
+        system_prompt = self._get_system_prompt()
+        context = self._build_context(context_chunks, budget=self._context_budget(query, system_prompt))
+        prompt = self._build_prompt(query, context)
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+        self._local.prompt_cache = self.prompt_cache.observe(messages) if self.prompt_cache is not None else None
+        return messages
+
+    @property
+    def last_prompt_cache(self) -> Optional[Dict]:
+        """Az ebben a szálban utoljára összeállított kérés prefix cache jelentése (ha a szimuláció be van kapcsolva)."""
+        return getattr(self._local, "prompt_cache", None)
+
+    def _context_budget(self, query: str, system_prompt: str) -> int:
+        """A kontextusra jutó tokenkeret: CONTEXT_TOKEN_BUDGET, de legfeljebb annyi, amennyi az
+        LLM ablakából a rendszerprompt, a prompt sablon a kérdéssel és a válasz (MAX_TOKENS) után marad.
+        """
+        counter = get_token_counter(self.config)
+        fixed = sum(counter.count_batch([system_prompt, self._build_prompt(query, "")])) + 2 * _MESSAGE_OVERHEAD_TOKENS
+        available = self.config.LLM_CONTEXT_WINDOW - self.config.MAX_TOKENS - fixed
+        return max(0, min(self.config.CONTEXT_TOKEN_BUDGET, available))
     
     def _get_system_prompt(self) -> str:
-        return """Te egy magyar jogi asszisztens vagy, aki magyar és román nyelvű jogi dokumentumrészleteket elemez, és mindig magyarul válaszol.
-FONTOS SZABÁLYOK:
-1. Mindig MAGYARUL válaszolj.
-2. Kizárólag a megadott kontextusra támaszkodj. Ha a kontextus nem elegendő, jelezd, hogy nincs elég információ.
-3. Idézz közvetlenül a kontextusból annak EREDETI nyelvén. Ha az idézet román nyelvű, mellékelj rövid magyar értelmezést/fordítást. Ha az idézet magyar, ne erőltesd román idézetet.
-4. Hivatkozz a forrásokra (pl. dokumentumnév; ha lehet: cikk/oldal).
-5. Legyél tömör, pontos és közérthető; a jogi szakkifejezéseket röviden magyarázd el.
-Feladat: Elemezd a rendelkezésre álló szövegrészleteket, és adj pontos, forrásolt választ magyarul a felhasználó kérdésére a kontextus alapján."""
+        return SYSTEM_PROMPT
     
     def _build_context(self, context_chunks: List[Dict], budget: int) -> str:
-        """Kontextus építése és vágása hozzávetőleges token kerethez.
-        Egyszerű karakter/token ~4:1 aránnyal becsülünk a költséghatékonyságért.
+        """Kontextus összeállítása a tokenkeretbe, az LLM tokenizerével mérve.
+
+        A chunkok tokenszáma az ingest során tárolt "token_count" (ha nincs, itt számoljuk).
+        A teljes chunkokból hátizsák-kiválasztással a keretbe férő legnagyobb összrelevanciájú
+        halmazt vesszük; a maradék keretet a legrelevánsabb kimaradt chunk mondathatáron vágott
+        eleje tölti ki. A részletek chunk azonosító szerint rendezve kerülnek a promptba, így
+        ugyanaz a találati halmaz mindig byte-azonos kontextust ad (prompt prefix cache).
         """
         if not context_chunks:
             return "Nincs releváns kontextus találva a dokumentumokban."
 
-        approx_chars_budget = budget * 4  # durva becslés
-        used_chars = 0
-        context_parts = []
-        for i, chunk in enumerate(context_chunks, 1):
-            doc_name = chunk.get('document_name', 'Ismeretlen dokumentum')
-            text = chunk.get('text', '')
-            ps = chunk.get('page_start')
-            pe = chunk.get('page_end')
-            page_str = ""
-            if ps and pe and ps != pe:
-                page_str = f"; oldalak: {ps}–{pe}"
-            elif ps:
-                page_str = f"; oldal: {ps}"
-            piece = f"[Forrás: {doc_name}{page_str}]\n{text}\n"
-            if used_chars + len(piece) > approx_chars_budget:
-                remaining = max(0, approx_chars_budget - used_chars)
-                if remaining > 0:
-                    context_parts.append(piece[:remaining])
+        counter = get_token_counter(self.config)
+        headers = [self._source_header(chunk) for chunk in context_chunks]
+        texts = [chunk.get('text', '') for chunk in context_chunks]
+        missing = [i for i, chunk in enumerate(context_chunks) if chunk.get("token_count") is None]
+        counts = [chunk.get("token_count") for chunk in context_chunks]
+        for i, count in zip(missing, counter.count_batch([texts[i] for i in missing])):
+            counts[i] = count
+        overhead = counter.count_batch([h + _CONTEXT_SEPARATOR for h in headers])
+        costs = [overhead[i] + counts[i] for i in range(len(context_chunks))]
+        values = [self._relevance(chunk) for chunk in context_chunks]
+
+        chosen = knapsack_select(values, costs, budget)
+        pieces = {i: f"{headers[i]}{texts[i]}\n" for i in chosen}
+        used = sum(costs[i] for i in chosen)
+        for i in sorted(set(range(len(context_chunks))) - set(chosen), key=lambda j: -values[j]):
+            remaining = budget - used - overhead[i]
+            if remaining < _MIN_TRIM_TOKENS:
+                continue
+            # a vágásjelölő ("[…]") helyét is hagyjuk meg
+            trimmed, trimmed_tokens = self._trim_to_sentences(texts[i], remaining - 4, counter)
+            if trimmed:
+                pieces[i] = f"{headers[i]}{trimmed} […]\n"
+                used += overhead[i] + trimmed_tokens + 4
+        return _CONTEXT_SEPARATOR.join(pieces[i] for i in sorted(pieces, key=lambda j: self._chunk_order(context_chunks[j], j)))
+
+    @staticmethod
+    def _source_header(chunk: Dict) -> str:
+        doc_name = chunk.get('document_name', 'Ismeretlen dokumentum')
+        ps = chunk.get('page_start')
+        pe = chunk.get('page_end')
+        page_str = ""
+        if ps and pe and ps != pe:
+            page_str = f"; oldalak: {ps}–{pe}"
+        elif ps:
+            page_str = f"; oldal: {ps}"
+        return f"[Forrás: {doc_name}{page_str}]\n"
+
+    @staticmethod
+    def _chunk_order(chunk: Dict, position: int) -> Tuple[int, int]:
+        """Stabil sorrend a kontextusban: tároló sor (chunk_id) szerint, azonosító nélkül a bejövő sorrend."""
+        chunk_id = chunk.get("chunk_id")
+        return (0, int(chunk_id)) if chunk_id is not None else (1, position)
+
+    @staticmethod
+    def _relevance(chunk: Dict) -> float:
+        """A kiválasztás értéke: explicit cikkhivatkozás találata mindent megelőz, különben a
+        fúziós (hibrid) vagy a dense pontszám.
+        """
+        if chunk.get("reference"):
+            return 2.0
+        score = chunk.get("fused_score", chunk.get("similarity_score", 0.0))
+        return max(float(score or 0.0), 1e-3)
+
+    @staticmethod
+    def _trim_to_sentences(text: str, budget: int, counter) -> Tuple[str, int]:
+        """A szöveg leghosszabb, mondat- vagy bekezdéshatáron végződő eleje, amely belefér a keretbe."""
+        bounds = [m.start() for m in _SENTENCE_BOUNDARY.finditer(text)] + [len(text)]
+        segments, start = [], 0
+        for end in bounds:
+            segments.append(text[start:end])
+            start = end
+        total, cut = 0, 0
+        for end, tokens in zip(bounds, counter.count_batch(segments)):
+            if total + tokens > budget:
                 break
-            context_parts.append(piece)
-            used_chars += len(piece)
-        return "\n---\n".join(context_parts)
+            total, cut = total + tokens, end
+        return text[:cut].rstrip(), total
     
     def _build_prompt(self, query: str, context: str) -> str:
-        return f"""
-FELHASZNÁLÓ KÉRDÉSE:
-"{query}"
-
+        # Statikus utasítások → kontextus (chunk azonosító szerint) → a kérdés a legvégén:
+        # a kérdéstől független rész byte-azonos prefixet ad a prompt cache-nek
+        return f"""{PROMPT_INSTRUCTIONS}
 RELEVÁNS DOKUMENTUMRÉSZLETEK (eredeti nyelven):
 ---
 {context}
 ---
 
-UTASÍTÁSOK:
-- Mindig magyarul válaszolj.
-- Az idézeteket a kontextus EREDETI nyelvén add meg. Ha román idézet szerepel, tegyél mellé rövid magyar értelmezést/fordítást. Ha magyar az idézet, ne erőltesd román idézetet.
-- Ha a kontextus nem elegendő, jelezd egyértelműen.
+FELHASZNÁLÓ KÉRDÉSE:
+"{query}"
 """
 
     def translate_to_ro(self, text: str) -> str:
         """Egyszerű HU→RO fordítás a Groq LLM-mel, csak a fordítást adja vissza."""
+        if self._unavailable():
+            return ""
         try:
             response = self.client.chat.completions.create(
                 messages=[
@@ -98,6 +285,33 @@ UTASÍTÁSOK:
         except Exception:
             return ""
 
+    async def atranslate_to_ro(self, text: str) -> str:
+        """A translate_to_ro aszinkron változata (AsyncGroq), hogy a fordítás a kereséssel
+        párhuzamosan futhasson. Injektált szinkron kliens esetén szálon futtatja a szinkron hívást.
+        """
+        if self._async_disabled:
+            return await asyncio.to_thread(self.translate_to_ro, text)
+        if self._unavailable():
+            return ""
+        try:
+            if self._async_client is None:
+                from groq import AsyncGroq
+                self._async_client = AsyncGroq(api_key=self.config.GROQ_API_KEY, base_url=self.config.GROQ_BASE_URL,
+                                               http_client=self.http_pool.async_client(),
+                                               timeout=self.http_pool.timeout, max_retries=0)
+            response = await self._async_client.chat.completions.create(
+                messages=[
+                    {"role": "system", "content": "Egy fordító vagy. Fordítsd le a felhasználó magyar üzenetét román nyelvre. Csak a román fordítást add vissza."},
+                    {"role": "user", "content": text},
+                ],
+                model=self.config.LLM_MODEL,
+                max_tokens=512,
+                temperature=0.0,
+            )
+            return (response.choices[0].message.content or "").strip()
+        except Exception:
+            return ""
+
     def test_connection(self) -> bool:
         try:
             self.client.chat.completions.create(
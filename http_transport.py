@@ -0,0 +1,364 @@
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import httpx
+
+# Újrapróbálható HTTP státuszok: rate limit és átmeneti szerverhibák
+RETRY_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(httpx.TransportError):
+    """A megszakító nyitva van: a hívás hálózati próbálkozás nélkül, azonnal elutasítva."""
+
+
+class CircuitBreaker:
+    """Egyszerű áramkör-megszakító: `threshold` egymást követő sikertelen hívás után
+    `reset_seconds` ideig minden hívást azonnal elutasít (nyitott állapot), utána egyetlen
+    próbahívást enged (félig nyitott); ennek sikere zárja, kudarca újra nyitja.
+    """
+
+    def __init__(self, threshold: int = 5, reset_seconds: float = 30.0):
+        self.threshold = max(1, int(threshold))
+        self.reset_seconds = float(reset_seconds)
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if now - self._opened_at >= self.reset_seconds else "open"
+
+    def retry_in(self) -> float:
+        """Ennyi másodperc múlva enged újra próbahívást (0, ha most is enged)."""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """Eredmény nélkül félbeszakadt hívás (pl. megszakítás, váratlan kivétel) lezárása: az állapot
+        nem változik, de a félig nyitott állapot próbahívás-helye felszabadul, így a megszakító nem
+        ragadhat nyitva.
+        """
+        with self._lock:
+            self._trial_running = False
+
+
+class CallMetrics:
+    """Hívásonkénti mérések (az utolsó `max_calls` hívás): késleltetés, próbálkozások, várakozás, státusz."""
+
+    def __init__(self, max_calls: int = 512):
+        self._calls: deque = deque(maxlen=max_calls)
+        self._lock = threading.Lock()
+        self.total_calls = 0
+        self.total_errors = 0
+        self.total_retries = 0
+        self.rejected = 0
+
+    def record(self, method: str, path: str, status: Optional[int], attempts: int,
+               latency: float, waited: float, error: Optional[str] = None):
+        with self._lock:
+            self._calls.append({
+                "method": method, "path": path, "status": status, "attempts": attempts,
+                "latency": latency, "waited": waited, "error": error, "time": time.time(),
+            })
+            self.total_calls += 1
+            self.total_retries += max(0, attempts - 1)
+            if error is not None or status is None or status >= 400:
+                self.total_errors += 1
+
+    def record_rejected(self):
+        with self._lock:
+            self.rejected += 1
+
+    def recent(self, n: int = 20):
+        with self._lock:
+            return list(self._calls)[-n:]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            latencies = sorted(c["latency"] for c in self._calls)
+        pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+        return {
+            "calls": self.total_calls,
+            "errors": self.total_errors,
+            "retries": self.total_retries,
+            "rejected": self.rejected,
+            "p50_seconds": pct(0.50),
+            "p95_seconds": pct(0.95),
+        }
+
+
+class RetryPolicy:
+    """Újrapróbálási szabály: jitteres exponenciális visszalépés, a Retry-After fejléc tiszteletben
+    tartása, és a hívásonkénti teljes határidő (deadline), amelyen túl nem próbálkozunk újra.
+    """
+
+    def __init__(self, max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 deadline: float = 60.0):
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self.deadline = float(deadline)
+
+    def delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        """Várakozás a következő próbálkozás előtt ("full jitter"; a Retry-After alsó korlát)."""
+        delay = random.uniform(0.0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        retry_after = retry_after_seconds(response) if response is not None else None
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def should_retry(self, attempt: int, elapsed: float, delay: float) -> bool:
+        return attempt < self.max_retries and elapsed + delay < self.deadline
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """A Retry-After (másodperc vagy HTTP dátum) illetve retry-after-ms fejléc értéke másodpercben."""
+    value = response.headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000.0)
+        except ValueError:
+            pass
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _limit_timeout(request: httpx.Request, base: Dict, remaining: float):
+    """A kérés időkorlátainak (connect/read/write/pool) levágása a hívás hátralévő határidejére,
+    hogy az újrapróbálásokkal együtt se lépjük túl a teljes hívásonkénti határidőt.
+    """
+    remaining = max(remaining, 0.001)
+    request.extensions["timeout"] = {
+        key: remaining if value is None else min(float(value), remaining) for key, value in base.items()
+    } or {key: remaining for key in ("connect", "read", "write", "pool")}
+
+
+def _record_response(breaker: CircuitBreaker, metrics: CallMetrics, request: httpx.Request,
+                     response: httpx.Response, attempt: int, start: float, waited: float):
+    """Egy logikai hívás lezárása: megszakító állapot frissítése és mérés rögzítése."""
+    if response.status_code in RETRY_STATUSES:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    metrics.record(request.method, request.url.path, response.status_code, attempt + 1,
+                   time.perf_counter() - start, waited)
+
+
+class RetryingTransport(httpx.BaseTransport):
+    """httpx transport a közös (keep-alive) kapcsolat-medence fölött: 429/5xx és hálózati hibák
+    esetén újrapróbál, a megszakító nyitott állapotában azonnal elutasít, és minden logikai
+    hívásról mérést rögzít. Minden próbálkozás időkorlátja a hívás hátralévő határidejére
+    (policy.deadline) szűkül, így a teljes hívás az újrapróbálásokkal együtt sem tart tovább.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, policy: RetryPolicy,
+                 breaker: CircuitBreaker, metrics: CallMetrics):
+        self._transport = transport
+        self.policy = policy
+        self.breaker = breaker
+        self.metrics = metrics
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.breaker.allow():
+            self.metrics.record_rejected()
+            raise CircuitOpenError(f"Áramkör-megszakító nyitva, újrapróba {self.breaker.retry_in():.0f} s múlva", request=request)
+        start = time.perf_counter()
+        base_timeout = dict(request.extensions.get("timeout") or {})
+        waited = 0.0
+        attempt = 0
+        settled = False
+        try:
+            while True:
+                _limit_timeout(request, base_timeout, self.policy.deadline - (time.perf_counter() - start))
+                try:
+                    response = self._transport.handle_request(request)
+                except httpx.TransportError as e:
+                    delay = self.policy.delay(attempt, None)
+                    if not self.policy.should_retry(attempt, time.perf_counter() - start, delay):
+                        settled = True
+                        self.breaker.record_failure()
+                        self.metrics.record(request.method, request.url.path, None, attempt + 1,
+                                            time.perf_counter() - start, waited, type(e).__name__)
+                        raise
+                else:
+                    delay = self.policy.delay(attempt, response)
+                    if response.status_code not in RETRY_STATUSES or \
+                            not self.policy.should_retry(attempt, time.perf_counter() - start, delay):
+                        settled = True
+                        _record_response(self.breaker, self.metrics, request, response, attempt, start, waited)
+                        return response
+                    response.close()
+                time.sleep(delay)
+                waited += delay
+                attempt += 1
+        finally:
+            if not settled:
+                self.breaker.release()
+
+    def close(self):
+        self._transport.close()
+
+
+class AsyncRetryingTransport(httpx.AsyncBaseTransport):
+    """A RetryingTransport aszinkron párja (AsyncGroq), közös megszakítóval és mérésekkel."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, policy: RetryPolicy,
+                 breaker: CircuitBreaker, metrics: CallMetrics):
+        self._transport = transport
+        self.policy = policy
+        self.breaker = breaker
+        self.metrics = metrics
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.breaker.allow():
+            self.metrics.record_rejected()
+            raise CircuitOpenError(f"Áramkör-megszakító nyitva, újrapróba {self.breaker.retry_in():.0f} s múlva", request=request)
+        start = time.perf_counter()
+        base_timeout = dict(request.extensions.get("timeout") or {})
+        waited = 0.0
+        attempt = 0
+        settled = False
+        try:
+            while True:
+                _limit_timeout(request, base_timeout, self.policy.deadline - (time.perf_counter() - start))
+                try:
+                    response = await self._transport.handle_async_request(request)
+                except httpx.TransportError as e:
+                    delay = self.policy.delay(attempt, None)
+                    if not self.policy.should_retry(attempt, time.perf_counter() - start, delay):
+                        settled = True
+                        self.breaker.record_failure()
+                        self.metrics.record(request.method, request.url.path, None, attempt + 1,
+                                            time.perf_counter() - start, waited, type(e).__name__)
+                        raise
+                else:
+                    delay = self.policy.delay(attempt, response)
+                    if response.status_code not in RETRY_STATUSES or \
+                            not self.policy.should_retry(attempt, time.perf_counter() - start, delay):
+                        settled = True
+                        _record_response(self.breaker, self.metrics, request, response, attempt, start, waited)
+                        return response
+                    await response.aclose()
+                await asyncio.sleep(delay)
+                waited += delay
+                attempt += 1
+        finally:
+            # Megszakítás (CancelledError) vagy váratlan kivétel: a próbahívás helyének felszabadítása
+            if not settled:
+                self.breaker.release()
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class HttpPool:
+    """A folyamat közös HTTP beállításai: egy szinkron httpx.Client (keep-alive kapcsolat-medence,
+    minden GroqClient ugyanazt használja), valamint a megszakító és a mérések. Az aszinkron
+    kliens eseményhurkonként külön készül (async_client), de ugyanazt a megszakítót és mérést kapja.
+    """
+
+    def __init__(self, timeout: float = 60.0, connect_timeout: float = 5.0, max_connections: int = 10,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 breaker_threshold: int = 5, breaker_reset: float = 30.0):
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                   keepalive_expiry=30.0)
+        self.policy = RetryPolicy(max_retries, backoff_base, backoff_max, deadline=timeout)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self.metrics = CallMetrics()
+        self._client: Optional[httpx.Client] = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    transport = RetryingTransport(httpx.HTTPTransport(limits=self.limits), self.policy,
+                                                  self.breaker, self.metrics)
+                    self._client = httpx.Client(transport=transport, timeout=self.timeout)
+        return self._client
+
+    def async_client(self) -> httpx.AsyncClient:
+        transport = AsyncRetryingTransport(httpx.AsyncHTTPTransport(limits=self.limits), self.policy,
+                                           self.breaker, self.metrics)
+        return httpx.AsyncClient(transport=transport, timeout=self.timeout)
+
+    def stats(self) -> Dict:
+        return {**self.metrics.stats(), "breaker": self.breaker.state}
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+_pool: Optional[HttpPool] = None
+_pool_key: Optional[tuple] = None
+_pool_lock = threading.Lock()
+
+
+def _pool_settings(config) -> tuple:
+    return (config.LLM_TIMEOUT, config.LLM_CONNECT_TIMEOUT, config.LLM_MAX_CONNECTIONS, config.LLM_MAX_RETRIES,
+            config.LLM_BACKOFF_BASE, config.LLM_BACKOFF_MAX, config.LLM_BREAKER_THRESHOLD, config.LLM_BREAKER_RESET)
+
+
+def get_http_pool(config) -> HttpPool:
+    """A folyamat közös HTTP medencéje a konfiguráció LLM_* beállításaival. Első híváskor, illetve
+    ha az LLM_* beállítások megváltoztak (reload_config), új medence készül; a régit nem zárjuk le,
+    mert a még futó hívások használhatják (kapcsolatai a szemétgyűjtéskor záródnak).
+    """
+    global _pool, _pool_key
+    key = _pool_settings(config)
+    with _pool_lock:
+        if _pool is None or _pool_key != key:
+            _pool = HttpPool(*key)
+            _pool_key = key
+        return _pool
@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+
+
+class PrefixCacheSimulator:
+    """Helyi modell a szolgáltató- vagy proxy-oldali prompt prefix cache-hez.
+
+    A kérés üzeneteit tokenizáljuk, és `block_tokens` méretű blokkokra bontjuk; minden blokk
+    kulcsa az előző blokk kulcsából és a blokk tokenjeiből képzett lánc-hash (mint a KV-cache
+    blokkoknál), így egy blokk csak akkor találat, ha a teljes előtte álló prefix is egyezik.
+    Kérésenként a cache-ből kiszolgálható vezető tokenek számát, ebből a becsült költség-
+    (kedvezményes árú cache-elt tokenek) és késleltetés-megtakarítást (elmaradó prefill) adjuk.
+    """
+
+    def __init__(self, counter, block_tokens: int = 128, min_prefix_tokens: int = 1024,
+                 max_blocks: int = 100000, cached_discount: float = 0.5,
+                 price_per_million: float = 0.05, prefill_ms_per_1k: float = 20.0):
+        self.counter = counter
+        self.block_tokens = max(1, int(block_tokens))
+        self.min_prefix_tokens = max(0, int(min_prefix_tokens))
+        self.max_blocks = max(1, int(max_blocks))
+        self.cached_discount = float(cached_discount)
+        self.price_per_million = float(price_per_million)
+        self.prefill_ms_per_1k = float(prefill_ms_per_1k)
+        self._blocks: "OrderedDict[int, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    @staticmethod
+    def serialize(messages: List[Dict]) -> str:
+        return "".join(f"<|{m['role']}|>\n{m['content']}\n" for m in messages)
+
+    def observe(self, messages: List[Dict]) -> Dict:
+        """Egy kérés lejátszása a cache-en: a találatok mérése, majd a kérés blokkjainak felvétele."""
+        tokens = self.counter.encode(self.serialize(messages))
+        keys: List[int] = []
+        key = 0
+        for start in range(0, len(tokens) - len(tokens) % self.block_tokens, self.block_tokens):
+            key = hash((key, tuple(tokens[start:start + self.block_tokens])))
+            keys.append(key)
+        with self._lock:
+            hit_blocks = 0
+            for key in keys:
+                if key not in self._blocks:
+                    break
+                self._blocks.move_to_end(key)
+                hit_blocks += 1
+            cached = hit_blocks * self.block_tokens
+            if cached < self.min_prefix_tokens:
+                cached = 0
+            for key in keys[hit_blocks:]:
+                self._blocks[key] = None
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+            self.requests += 1
+            self.prompt_tokens += len(tokens)
+            self.cached_tokens += cached
+        return self._report(len(tokens), cached)
+
+    def _report(self, prompt_tokens: int, cached_tokens: int) -> Dict:
+        full_cost = prompt_tokens * self.price_per_million / 1e6
+        saved_cost = cached_tokens * self.cached_discount * self.price_per_million / 1e6
+        return {
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "hit_ratio": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+            "cost_saving": saved_cost / full_cost if full_cost else 0.0,
+            "saved_usd": saved_cost,
+            "saved_prefill_ms": cached_tokens * self.prefill_ms_per_1k / 1000.0,
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            report = self._report(self.prompt_tokens, self.cached_tokens)
+            report["requests"] = self.requests
+        return report
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+            self.requests = self.prompt_tokens = self.cached_tokens = 0
@@ -1,28 +1,80 @@
+import time
+_IMPORT_START = time.perf_counter()
 import os
+import asyncio
+import threading
+import multiprocessing
 import numpy as np
-from typing import List, Dict
-from document_processor import DocumentProcessor
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import List, Dict, Optional, Iterator, Tuple
+from document_processor import DocumentProcessor, extract_pdf
 from embedding_manager import EmbeddingManager
 from groq_client import GroqClient
-from config import Config
+from config import get_config, reload_config
+from utils import mmr_select_indices, BackgroundEventLoop
+from answer_cache import SemanticAnswerCache
+
+# A modul (és függőségei) importálásának ideje; lusta módban torch / groq nélkül
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_START
 
 class RAGSystem:
     def __init__(self):
-        self.config = Config()
+        self.config = get_config()
         self.document_processor = DocumentProcessor()
         self.embedding_manager = EmbeddingManager()
         self.groq_client = GroqClient()
+        self.answer_cache: Optional[SemanticAnswerCache] = None
+        if self.config.ENABLE_ANSWER_CACHE:
+            self.answer_cache = SemanticAnswerCache(
+                max_entries=self.config.ANSWER_CACHE_SIZE,
+                ttl_seconds=self.config.ANSWER_CACHE_TTL,
+                threshold=self.config.ANSWER_CACHE_THRESHOLD,
+            )
+        self._async_loop: Optional[BackgroundEventLoop] = None
         self.documents_loaded = False
+        # Indulási időmérések másodpercben (import, index betöltés, Groq melegítés)
+        self.startup_timings: Dict[str, Optional[float]] = {"import": IMPORT_SECONDS}
         self.initialize_system()
+        if self.config.LAZY_INIT:
+            # A modell háttérben töltődik; ha az első kérdés előbb érkezik, a model property megvárja
+            self.embedding_manager.preload_model()
+
+    def warm_up(self) -> threading.Thread:
+        """Groq API melegítés (cold start elkerülésére) háttérszálon, a felület blokkolása nélkül."""
+        def _run():
+            t0 = time.perf_counter()
+            if self.groq_client.test_connection():
+                self.startup_timings["groq_warmup"] = time.perf_counter() - t0
+
+        thread = threading.Thread(target=_run, name="groq-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def startup_info(self) -> Dict[str, Optional[float]]:
+        """Indulási időmérések; a modell betöltési ideje None, amíg a betöltés nem fejeződött be."""
+        return {**self.startup_timings, "model_load": self.embedding_manager.model_load_seconds}
 
     def initialize_system(self):
-        if self.embedding_manager.load_index():
+        t0 = time.perf_counter()
+        loaded = self.embedding_manager.load_index()
+        self.startup_timings["index_load"] = time.perf_counter() - t0
+        if loaded:
             self.documents_loaded = True
             print("✅ Meglévő index sikeresen betöltve.")
         else:
             print("ℹ️ Nem található mentett index. A 'documents/uploaded' mappa feldolgozása következik...")
             self.process_documents_from_folder()
 
+    def reload_config(self):
+        """Beállítások újraolvasása (secrets / környezet) és az új pillanatkép átadása a komponenseknek."""
+        config = reload_config()
+        self.config = config
+        self.document_processor.config = config
+        self.groq_client.reload_config(config)
+        self.embedding_manager.config = config
+        self.embedding_manager._configure_store(self.embedding_manager.chunk_store)
+        return config
+
     def process_documents_with_progress(self):
         import glob
         pdf_files = glob.glob(os.path.join(self.config.DOCUMENTS_DIR, "*.pdf"))
@@ -33,70 +85,309 @@ class RAGSystem:
 
         print(f"📄 {total} PDF fájl feldolgozása indul...")
         any_success = False
-        for i, file_path in enumerate(pdf_files, 1):
-            try:
-                print(f"Feldolgozás alatt: {os.path.basename(file_path)}")
-                chunks, metadata = self.document_processor.process_pdf(file_path)
-                embeddings = self.embedding_manager.create_embeddings(chunks, metadata)
-                self.embedding_manager.build_index(embeddings)
-                self.document_processor.save_processed_data(os.path.basename(file_path), chunks, metadata)
-                yield {"current": i, "total": total, "filename": os.path.basename(file_path), "error": None}
+        for i, (file_path, status, error) in enumerate(self._ingest_files(pdf_files), 1):
+            if error:
+                print(f"❌ Hiba a(z) {os.path.basename(file_path)} feldolgozása során: {error}")
+            elif status in ("added", "replaced"):
                 any_success = True
-            except Exception as e:
-                print(f"❌ Hiba a(z) {os.path.basename(file_path)} feldolgozása során: {e}")
-                yield {"current": i, "total": total, "filename": os.path.basename(file_path), "error": str(e)}
+            yield {"current": i, "total": total, "filename": os.path.basename(file_path), "error": error, "status": status}
         if any_success:
             self.embedding_manager.save_index()
             self.documents_loaded = True
             print(f"✅ A mappa feldolgozása befejeződött. Az index elmentve.")
+        elif self.embedding_manager.chunk_store.live_count > 0:
+            self.documents_loaded = True
+            print("✅ A mappa feldolgozása befejeződött. Nem volt új vagy módosult dokumentum.")
         else:
             print("❌ Nem sikerült egyetlen dokumentumot sem feldolgozni.")
 
+    def _ingest_files(self, file_paths: List[str]) -> Iterator[Tuple[str, str, Optional[str]]]:
+        """PDF-ek pipeline-os felvétele az indexbe.
+        1) Tartalom-hash alapú kihagyás (már indexelt tartalom).
+        2) Szövegkinyerés és chunkolás párhuzamosan, folyamat-medencében (ProcessPoolExecutor).
+        3) A kész chunkok egyetlen, dokumentumokon átívelő, kötegelt embedding lépésbe futnak
+           (INGEST_EMBED_BATCH chunk, vagy legkésőbb INGEST_FLUSH_SECONDS után, hogy a folyamatjelző
+           a lassú kinyerés alatt se álljon meg).
+        Dokumentumonként egy (file_path, status, error) hármast ad vissza, befejezési sorrendben;
+        status: "skipped", "added", "replaced" (azonos nevű fájl új tartalommal), "empty" vagy "error".
+        """
+        to_extract: List[Tuple[str, str]] = []
+        seen_hashes = set()
+        for file_path in file_paths:
+            try:
+                file_hash = self.document_processor.get_file_hash(file_path)
+            except Exception as e:
+                yield file_path, "error", str(e)
+                continue
+            if file_hash in seen_hashes or self.embedding_manager.has_document(file_hash):
+                print(f"⏭️ Változatlan dokumentum, kihagyva: {os.path.basename(file_path)}")
+                yield file_path, "skipped", None
+                continue
+            seen_hashes.add(file_hash)
+            to_extract.append((file_path, file_hash))
+
+        batch: List[Tuple[str, List[str], Dict]] = []
+        batch_chunks = 0
+        batch_started = 0.0
+        flush_seconds = self.config.INGEST_FLUSH_SECONDS
+        for item in self._extract_parallel(to_extract, tick=flush_seconds):
+            # None: a kinyerés még fut, de letelt a várakozási idő (ütem a határidős ürítéshez)
+            if item is not None:
+                file_path, result, error = item
+                if error:
+                    yield file_path, "error", error
+                    continue
+                chunks, metadata = result
+                if not chunks:
+                    yield file_path, "empty", None
+                    continue
+                if not batch:
+                    batch_started = time.perf_counter()
+                batch.append((file_path, chunks, metadata))
+                batch_chunks += len(chunks)
+            if batch and (batch_chunks >= self.config.INGEST_EMBED_BATCH
+                          or time.perf_counter() - batch_started >= flush_seconds):
+                yield from self._embed_and_index(batch)
+                batch, batch_chunks = [], 0
+        if batch:
+            yield from self._embed_and_index(batch)
+
+    def _extract_parallel(self, files: List[Tuple[str, str]], tick: Optional[float] = None
+                          ) -> Iterator[Optional[Tuple[str, Optional[Tuple[List[str], Dict]], Optional[str]]]]:
+        """PDF kinyerés több magon; egy fájl vagy egy worker esetén helyben fut.
+        A munkafolyamatok "spawn" módban indulnak: a szülőfolyamatban ekkor már szálak futnak (modell
+        betöltés, háttér eseményhurok, tokenizer), és egy többszálú folyamat fork-olása holtpontot okozhat.
+        tick megadása esetén a párhuzamos ágon ennyi másodpercenként None-t ad, ha nem készült el fájl.
+        """
+        workers = self.config.INGEST_WORKERS or os.cpu_count() or 1
+        workers = min(workers, len(files))
+        if workers > 1:
+            try:
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            except (OSError, NotImplementedError, ValueError) as e:
+                print(f"ℹ️ Folyamat-medence nem indítható ({e}), soros feldolgozás következik.")
+                pool = None
+            if pool is not None:
+                with pool:
+                    futures = {pool.submit(extract_pdf, fp, fh): fp for fp, fh in files}
+                    pending = set(futures)
+                    while pending:
+                        done, pending = wait(pending, timeout=tick, return_when=FIRST_COMPLETED)
+                        if not done:
+                            yield None
+                        for future in done:
+                            file_path = futures[future]
+                            try:
+                                yield file_path, future.result(), None
+                            except Exception as e:
+                                yield file_path, None, str(e)
+                return
+        for file_path, file_hash in files:
+            print(f"Feldolgozás alatt: {os.path.basename(file_path)}")
+            try:
+                yield file_path, self.document_processor.process_pdf(file_path, file_hash=file_hash), None
+            except Exception as e:
+                yield file_path, None, str(e)
+
+    def _embed_and_index(self, batch: List[Tuple[str, List[str], Dict]]) -> Iterator[Tuple[str, str, Optional[str]]]:
+        """Egy dokumentum-köteg chunkjainak közös kódolása, majd dokumentumonkénti indexelés."""
+        try:
+            embeddings_list = self.embedding_manager.encode_documents([chunks for _, chunks, _ in batch])
+        except Exception as e:
+            for file_path, _, _ in batch:
+                yield file_path, "error", str(e)
+            return
+        for (file_path, chunks, metadata), embeddings in zip(batch, embeddings_list):
+            file_name = os.path.basename(file_path)
+            old_ids = self.embedding_manager.find_document_ids(file_name)
+            try:
+                # A régi változatot csak az új sikeres indexelése után töröljük (tombstone),
+                # így hiba esetén a dokumentum kereshető marad
+                self.embedding_manager.add_embeddings(chunks, metadata, embeddings)
+                self.embedding_manager.build_index(embeddings)
+            except Exception as e:
+                # A félig felvett új változat eltávolítása
+                new_ids = [d for d in self.embedding_manager.find_document_ids(file_name) if d not in old_ids]
+                self.embedding_manager.delete_documents(doc_ids=new_ids)
+                yield file_path, "error", str(e)
+                continue
+            try:
+                status = "added"
+                if old_ids:
+                    self.embedding_manager.delete_documents(doc_ids=old_ids)
+                    status = "replaced"
+                self.document_processor.save_processed_data(file_name, chunks, metadata)
+                yield file_path, status, None
+            except Exception as e:
+                yield file_path, "error", str(e)
+
     def process_documents_from_folder(self):
         # Backward compatibility, non-progressive
         for _ in self.process_documents_with_progress():
             pass
 
     def add_documents(self, uploaded_files) -> Dict:
-        results = {"success": [], "errors": [], "total_chunks": 0}
+        results = {"success": [], "skipped": [], "errors": [], "total_chunks": 0}
         new_embeddings_added = False
+        file_paths = []
         for uploaded_file in uploaded_files:
             try:
-                file_path = self._save_uploaded_file(uploaded_file)
-                chunks, metadata = self.document_processor.process_pdf(file_path)
-                embeddings = self.embedding_manager.create_embeddings(chunks, metadata)
-                if embeddings is not None:
-                    self.embedding_manager.build_index(embeddings)
-                    self.document_processor.save_processed_data(uploaded_file.name, chunks, metadata)
-                    results["success"].append({"filename": uploaded_file.name})
-                    new_embeddings_added = True
+                file_paths.append(self._save_uploaded_file(uploaded_file))
             except Exception as e:
                 results["errors"].append({"filename": uploaded_file.name, "error": str(e)})
+
+        for file_path, status, error in self._ingest_files(file_paths):
+            file_name = os.path.basename(file_path)
+            if error:
+                results["errors"].append({"filename": file_name, "error": error})
+            elif status == "skipped":
+                results["skipped"].append({"filename": file_name})
+            elif status in ("added", "replaced"):
+                results["success"].append({"filename": file_name, "replaced": status == "replaced"})
+                new_embeddings_added = True
         
         if new_embeddings_added:
             self.embedding_manager.save_index()
             self.documents_loaded = True
         return results
 
-    def query(self, question: str, top_k: int = None) -> Dict:
+    def delete_document(self, document_name: Optional[str] = None, document_hash: Optional[str] = None) -> int:
+        """Dokumentum eltávolítása (pl. hatályon kívül helyezett jogszabály) teljes újraépítés nélkül."""
+        deleted = self.embedding_manager.delete_documents(document_name=document_name, document_hash=document_hash)
+        if deleted:
+            self.embedding_manager.save_index()
+        return deleted
+
+    def query(self, question: str, top_k: int = None, filters: Optional[Dict] = None) -> Dict:
+        """Kérdés megválaszolása. filters: a keresés szűkítése (document_name, language,
+        page_from, page_to; lásd ChunkStore.filter_rows).
+        """
         if not self.documents_loaded:
             return {"answer": "❌ Nincsenek betöltött dokumentumok. Kérlek, helyezz PDF fájlokat a 'documents/uploaded' mappába, majd indítsd újra az alkalmazást!", "sources": []}
         try:
             # Beállítások
             k = top_k if top_k is not None else self.config.TOP_K
-            retrieve_n = max(k, self.config.RETRIEVE_N)
+            # A kérdés vektora egyszer készül: a keresés, a fúzió és a válasz cache is ezt használja
+            query_vector = self.embedding_manager.encode_query(question)
+            selected = self._retrieve(question, k, filters, query_vector=query_vector)
+            if not selected:
+                return {"answer": "❌ Nem találtam releváns információt a kérdésedre a dokumentumokban.", "sources": []}
+
+            sources = self._format_sources(selected)
+
+            # Szemantikus válasz cache: közel azonos kérdés, azonos kontextus és index verzió esetén
+            # nincs szükség újabb LLM hívásra
+            cache_key = None
+            if self.answer_cache is not None:
+                cache_key = (
+                    query_vector,
+                    [int(s["chunk_id"]) for s in selected],
+                    self.embedding_manager.index_version,
+                )
+                cached = self.answer_cache.lookup(*cache_key)
+                if cached is not None:
+                    return {"answer": cached["answer"], "sources": sources, "cached": True}
+
+            t0 = time.perf_counter()
+            answer = self.groq_client.generate_response(question, selected)
+            latency = time.perf_counter() - t0
+            if cache_key is not None and not answer.startswith("Hiba történt"):
+                self.answer_cache.store(*cache_key, answer=answer, sources=sources, latency=latency)
+            return {"answer": answer, "sources": sources, "prompt_cache": self.groq_client.last_prompt_cache}
+        except Exception as e:
+            return {"answer": f"❌ Hiba történt a lekérdezés során: {str(e)}", "sources": []}
+
+    def query_stream(self, question: str, top_k: int = None, filters: Optional[Dict] = None) -> Iterator[Dict]:
+        """A query streamelt változata. Események sorrendben:
+        {"type": "sources", "sources": [...]} – amint a visszakeresés kész, a generálás előtt;
+        {"type": "token", "text": "..."} – a válasz darabjai érkezésük szerint;
+        {"type": "done", "answer": "...", "sources": [...], "cached": bool} – a teljes válasz
+        (LLM hívásnál "prompt_cache": a kérés prefix cache jelentése, ha a szimuláció be van kapcsolva).
+        """
+        if not self.documents_loaded:
+            answer = "❌ Nincsenek betöltött dokumentumok. Kérlek, helyezz PDF fájlokat a 'documents/uploaded' mappába, majd indítsd újra az alkalmazást!"
+            yield {"type": "done", "answer": answer, "sources": [], "cached": False}
+            return
+        try:
+            k = top_k if top_k is not None else self.config.TOP_K
+            query_vector = self.embedding_manager.encode_query(question)
+            selected = self._retrieve(question, k, filters, query_vector=query_vector)
+            if not selected:
+                answer = "❌ Nem találtam releváns információt a kérdésedre a dokumentumokban."
+                yield {"type": "done", "answer": answer, "sources": [], "cached": False}
+                return
+
+            sources = self._format_sources(selected)
+            yield {"type": "sources", "sources": sources}
+
+            cache_key = None
+            if self.answer_cache is not None:
+                cache_key = (
+                    query_vector,
+                    [int(s["chunk_id"]) for s in selected],
+                    self.embedding_manager.index_version,
+                )
+                cached = self.answer_cache.lookup(*cache_key)
+                if cached is not None:
+                    yield {"type": "token", "text": cached["answer"]}
+                    yield {"type": "done", "answer": cached["answer"], "sources": sources, "cached": True}
+                    return
+
+            t0 = time.perf_counter()
+            parts: List[str] = []
+            for piece in self.groq_client.generate_response_stream(question, selected):
+                parts.append(piece)
+                yield {"type": "token", "text": piece}
+            answer = "".join(parts)
+            latency = time.perf_counter() - t0
+            if cache_key is not None and answer and not answer.startswith("Hiba történt"):
+                self.answer_cache.store(*cache_key, answer=answer, sources=sources, latency=latency)
+            yield {"type": "done", "answer": answer, "sources": sources, "cached": False,
+                   "prompt_cache": self.groq_client.last_prompt_cache}
+        except Exception as e:
+            yield {"type": "done", "answer": f"❌ Hiba történt a lekérdezés során: {str(e)}", "sources": [], "cached": False}
+
+    def _retrieve(self, question: str, k: int, filters: Optional[Dict] = None,
+                  query_vector: Optional[np.ndarray] = None) -> List[Dict]:
+        """Visszakeresés. A kérdésben megnevezett cikkek/bekezdések (pl. "IX. cikk (2)") chunkjai
+        a hivatkozás-táblából kerülnek a lista elejére (több illeszkedő chunk esetén a kérdéshez
+        leghasonlóbbak); ha ezek kiadják a k találatot, a rangsorolt keresés nem fut, különben
+        a maradék helyeket az tölti fel.
+        """
+        pinned: List[Dict] = []
+        if self.config.ENABLE_REFERENCE_LOOKUP:
+            pinned = self.embedding_manager.lookup_references(question, k, filters=filters, query_vector=query_vector)
+            if len(pinned) >= k:
+                for i, s in enumerate(pinned, 1):
+                    s["rank"] = i
+                self.embedding_manager.attach_token_counts(pinned)
+                return pinned
+        selected = self._retrieve_ranked(question, k, filters, query_vector=query_vector)
+        if pinned:
+            pinned_ids = {int(p["chunk_id"]) for p in pinned}
+            selected = pinned + [s for s in selected if int(s.get("chunk_id", -1)) not in pinned_ids][:k - len(pinned)]
+            for i, s in enumerate(selected, 1):
+                s["rank"] = i
+        # Az ingest során tárolt tokenszámok a kontextus csomagolásához
+        self.embedding_manager.attach_token_counts(selected)
+        return selected
 
-            # Multi-query (HU + RO fordítás, ha engedélyezett)
-            queries = [question]
-            if self.config.ENABLE_MULTIQUERY:
-                ro = self.groq_client.translate_to_ro(question)
-                if ro:
-                    queries.append(ro)
+    def _retrieve_ranked(self, question: str, k: int, filters: Optional[Dict] = None,
+                         query_vector: Optional[np.ndarray] = None) -> List[Dict]:
+        """Visszakeresés (opcionális multi-query) és diverzifikált top-k kiválasztás."""
+        retrieve_n = max(k, self.config.RETRIEVE_N)
 
-            # Keresés több lekérdezéssel és egyesítés
+        # Keresés (multi-query esetén HU + RO) és egyesítés
+        result_lists = self._search_queries(question, retrieve_n, filters, query_vector)
+        relevance_key = "similarity_score"
+        if self.config.ENABLE_HYBRID:
+            # Lexikális (BM25) találatok: pontos kifejezések, pl. "XXIII. cikk", "Országgyűlés"
+            result_lists.append(self.embedding_manager.search_lexical(question, retrieve_n, filters=filters))
+            all_results = self._fuse_rrf(question, result_lists, retrieve_n, query_vector)
+            relevance_key = "fused_score"
+        else:
             candidates: Dict[int, Dict] = {}
-            for q in queries:
-                results = self.embedding_manager.search_similar(q, retrieve_n)
+            for results in result_lists:
                 for r in results:
                     cid = int(r.get("chunk_id", -1))
                     if cid not in candidates:
@@ -105,26 +396,25 @@ class RAGSystem:
                         # tartsuk meg a magasabb hasonlóságot
                         if r.get("similarity_score", 0) > candidates[cid].get("similarity_score", 0):
                             candidates[cid] = r
-
             all_results = list(candidates.values())
-            if not all_results:
-                return {"answer": "❌ Nem találtam releváns információt a kérdésedre a dokumentumokban.", "sources": []}
-            
-            # Diverzifikáció (MMR) vagy sima top-k
-            if self.config.ENABLE_DIVERSIFY and len(all_results) > k:
-                selected = self._mmr_select(all_results, k, lambda_param=self.config.DIVERSIFY_LAMBDA)
-            else:
-                selected = sorted(all_results, key=lambda x: x.get("similarity_score", 0), reverse=True)[:k]
-
-            # Rangsor frissítése
-            for i, s in enumerate(selected, 1):
-                s["rank"] = i
+        if not all_results:
+            return []
 
-            answer = self.groq_client.generate_response(question, selected)
-            sources = self._format_sources(selected)
-            return {"answer": answer, "sources": sources}
-        except Exception as e:
-            return {"answer": f"❌ Hiba történt a lekérdezés során: {str(e)}", "sources": []}
+        # Diverzifikáció (MMR) vagy sima top-k
+        if self.config.ENABLE_DIVERSIFY and len(all_results) > k:
+            selected = self._mmr_select(all_results, k, lambda_param=self.config.DIVERSIFY_LAMBDA,
+                                        relevance_key=relevance_key)
+        else:
+            selected = sorted(all_results, key=lambda x: x.get(relevance_key, 0), reverse=True)[:k]
+
+        # Rangsor frissítése
+        for i, s in enumerate(selected, 1):
+            s["rank"] = i
+
+        # A vektorokra csak a kiválasztásig van szükség
+        for s in selected:
+            s.pop("embedding", None)
+        return selected
     
     def _save_uploaded_file(self, uploaded_file) -> str:
         file_path = os.path.join(self.config.DOCUMENTS_DIR, uploaded_file.name)
@@ -144,58 +434,129 @@ class RAGSystem:
                 pages = f"{ps}"
             formatted.append({
                 "document": chunk.get("document_name", "Ismeretlen"),
-                "relevance": f"{chunk.get('similarity_score', 0) * 100:.1f}%",
+                "relevance": chunk["reference"] if chunk.get("reference") else f"{chunk.get('similarity_score', 0) * 100:.1f}%",
                 "preview": chunk.get("text", "")[:250] + "...",
                 "pages": pages
             })
         return formatted
 
-    def _mmr_select(self, results: List[Dict], k: int, lambda_param: float = 0.6) -> List[Dict]:
+    def _search(self, query: str, retrieve_n: int, filters: Optional[Dict] = None,
+                query_vector: Optional[np.ndarray] = None) -> List[Dict]:
+        return self.embedding_manager.search_similar_batch(
+            [query], retrieve_n, return_embeddings=self.config.ENABLE_DIVERSIFY, filters=filters,
+            query_vectors=query_vector[None, :] if query_vector is not None else None,
+        )[0]
+
+    def retrieve_batch(self, questions: List[str], top_k: int = None, filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """Tömeges visszakeresés (pl. offline kiértékeléshez): egyetlen kódolás és egyetlen
+        indexkeresés az összes kérdésre, LLM hívás és diverzifikáció nélkül.
+        """
+        k = top_k if top_k is not None else self.config.TOP_K
+        return self.embedding_manager.search_similar_batch(questions, k, filters=filters)
+
+    def _search_queries(self, question: str, retrieve_n: int, filters: Optional[Dict] = None,
+                        query_vector: Optional[np.ndarray] = None) -> List[List[Dict]]:
+        """Találati listák lekérdezésenként. Multi-query módban az aszinkron pipeline fut."""
+        if not self.config.ENABLE_MULTIQUERY:
+            return [self._search(question, retrieve_n, filters, query_vector)]
+        if self._async_loop is None:
+            self._async_loop = BackgroundEventLoop()
+        return self._async_loop.run(self._asearch_queries(question, retrieve_n, filters, query_vector))
+
+    async def _asearch_queries(self, question: str, retrieve_n: int, filters: Optional[Dict] = None,
+                               query_vector: Optional[np.ndarray] = None) -> List[List[Dict]]:
+        """Az eredeti nyelvű keresés azonnal indul, és átfed a RO fordítással; a lefordított
+        lekérdezés keresése a fordítás megérkezésekor csatlakozik. Ha a fordítás nem készül el
+        MULTIQUERY_DEADLINE másodpercen belül, elhagyjuk, és csak az eredeti találatok maradnak.
+        """
+        original = asyncio.create_task(asyncio.to_thread(self._search, question, retrieve_n, filters, query_vector))
+        translated = None
+        try:
+            ro = await asyncio.wait_for(self.groq_client.atranslate_to_ro(question), timeout=self.config.MULTIQUERY_DEADLINE)
+        except asyncio.TimeoutError:
+            print(f"ℹ️ A fordítás nem érkezett meg {self.config.MULTIQUERY_DEADLINE:.1f} s alatt, csak az eredeti lekérdezéssel keresünk.")
+            ro = ""
+        if ro:
+            translated = asyncio.create_task(asyncio.to_thread(self._search, ro, retrieve_n, filters))
+        results = [await original]
+        if translated is not None:
+            results.append(await translated)
+        return results
+
+    def _fuse_rrf(self, question: str, result_lists: List[List[Dict]], limit: int,
+                  query_vector: Optional[np.ndarray] = None) -> List[Dict]:
+        """Reciprok rang fúzió (RRF): chunkonként Σ 1 / (RRF_K + rang) a találati listákon át.
+        A legjobb `limit` jelölt "fused_score" kulcsot kap (a legjobbhoz normálva, 0–1). A csak
+        lexikálisan talált chunkok dense hasonlóságát (és MMR-hez a vektorát) a tárolóból pótoljuk,
+        a hívó által már kódolt kérdésvektorral (ha nincs megadva, itt kódoljuk).
+        """
+        rrf_k = self.config.RRF_K
+        fused: Dict[int, float] = {}
+        best: Dict[int, Dict] = {}
+        for results in result_lists:
+            for rank, r in enumerate(results, 1):
+                cid = int(r.get("chunk_id", -1))
+                fused[cid] = fused.get(cid, 0.0) + 1.0 / (rrf_k + rank)
+                if cid not in best or r.get("similarity_score", -1.0) > best[cid].get("similarity_score", -1.0):
+                    best[cid] = r
+        if not fused:
+            return []
+        ordered = sorted(fused, key=fused.get, reverse=True)[:limit]
+        top = fused[ordered[0]]
+        results = [best[cid] for cid in ordered]
+        missing = [r for r in results if "similarity_score" not in r]
+        if missing:
+            vectors = self.embedding_manager.get_embeddings([int(r["chunk_id"]) for r in missing])
+            if query_vector is None:
+                query_vector = self.embedding_manager.encode_query(question)
+            for r, v in zip(missing, vectors):
+                r["similarity_score"] = float(np.dot(v, query_vector))
+                if self.config.ENABLE_DIVERSIFY:
+                    r["embedding"] = v
+        for r, cid in zip(results, ordered):
+            r["fused_score"] = fused[cid] / top
+        return results
+
+    def _mmr_select(self, results: List[Dict], k: int, lambda_param: float = 0.6,
+                    relevance_key: str = "similarity_score") -> List[Dict]:
         """Egyszerű MMR kiválasztás a redundancia csökkentésére a legjobb k elemre.
-        A páronkénti hasonlóságot a SentenceTransformer beágyazásokkal számoljuk.
+        A páronkénti hasonlóságot az indexben tárolt beágyazásokkal számoljuk; újrakódolás
+        csak akkor történik, ha a találatok nem hozták magukkal a vektorukat.
+        A relevancia a relevance_key kulcs (alapértelmezés: dense hasonlóság, hibrid módban fúziós pontszám).
         """
         k = max(1, min(k, len(results)))
-        # Query-hasonlóság már adott: similarity_score
-        sims_to_query = np.array([r.get("similarity_score", 0.0) for r in results], dtype=np.float32)
+        sims_to_query = np.array([r.get(relevance_key, 0.0) for r in results], dtype=np.float32)
 
         # Chunk szövegek beágyazása páronkénti hasonlósághoz
         texts = [r.get("text", "") for r in results]
         if not texts or self.embedding_manager.model is None:
-            return sorted(results, key=lambda x: x.get("similarity_score", 0), reverse=True)[:k]
-
-        emb = self.embedding_manager.model.encode(texts, normalize_embeddings=True)
-        emb = emb.astype("float32")
-        # Koszinusz ~ IP normalizált vektoroknál
-        pairwise = np.matmul(emb, emb.T)
-
-        selected_idx = []
-        candidate_idx = list(range(len(results)))
-        # Kezdjünk a legmagasabb query-sim-ű elemmel
-        first = int(np.argmax(sims_to_query))
-        selected_idx.append(first)
-        candidate_idx.remove(first)
-
-        while len(selected_idx) < k and candidate_idx:
-            mmr_scores = []
-            for idx in candidate_idx:
-                diversity_penalty = max(pairwise[idx, j] for j in selected_idx) if selected_idx else 0.0
-                score = lambda_param * sims_to_query[idx] - (1 - lambda_param) * diversity_penalty
-                mmr_scores.append((score, idx))
-            mmr_scores.sort(reverse=True)
-            best_idx = mmr_scores[0][1]
-            selected_idx.append(best_idx)
-            candidate_idx.remove(best_idx)
+            return sorted(results, key=lambda x: x.get(relevance_key, 0), reverse=True)[:k]
+
+        if all(r.get("embedding") is not None for r in results):
+            emb = np.vstack([r["embedding"] for r in results]).astype("float32")
+        else:
+            emb = self.embedding_manager.model.encode(texts, normalize_embeddings=True)
+            emb = emb.astype("float32")
 
+        selected_idx = mmr_select_indices(sims_to_query, emb, k, lambda_param)
         return [results[i] for i in selected_idx]
     
     def get_stats(self) -> Dict:
-        if not self.documents_loaded or not self.embedding_manager.chunk_metadata:
+        store = self.embedding_manager.chunk_store
+        if not self.documents_loaded or store.live_count == 0:
             return {"documents": 0, "chunks": 0, "status": "Nincsenek betöltött dokumentumok"}
         
-        unique_docs = sorted(list({meta.get("document_name", "ismeretlen") for meta in self.embedding_manager.chunk_metadata}))
+        unique_docs = store.document_names()
         return {
             "documents": len(unique_docs),
-            "chunks": len(self.embedding_manager.chunk_metadata),
+            "chunks": store.live_count,
             "status": "Rendszer kész",
-            "document_list": unique_docs
+            "index": self.embedding_manager.index_info(),
+            "query_cache": self.embedding_manager.query_cache_stats(),
+            "answer_cache": self.answer_cache.stats() if self.answer_cache is not None else None,
+            "document_list": unique_docs,
+            "languages": store.languages(),
+            "startup": self.startup_info(),
+            "llm": self.groq_client.http_stats(),
+            "prompt_cache": self.groq_client.prompt_cache.stats() if self.groq_client.prompt_cache is not None else None,
         }
\ No newline at end of file
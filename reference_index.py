@@ -0,0 +1,181 @@
+import os
+import re
+import json
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+_REFERENCES = "references.json"
+
+# Sor eleji cikk-jelölők a jogszabály szövegében:
+#   magyar: "IX. cikk" (római), "3. cikk" (arab), "R) cikk" / "R. cikk" (betűs, pl. az Alaptörvény
+#   Alapvetés része); a PDF kinyerés gyakran szóközt hagy a pont előtt ("VII . cikk")
+#   román: "Art. 5", "ART. 5", "Articolul 5"
+_HU_ARTICLE_LINE = re.compile(r"^\s*(?P<id>[IVXLCDM]+|\d+|[A-Z])\s*(?P<sep>[.)])\s*cikk\b")
+_RO_ARTICLE_LINE = re.compile(r"^\s*(?:Art\.?|ART\.?|Articolul|ARTICOLUL)\s*(?P<num>\d+)\b")
+# Bekezdés: "(2) ..." – csak ha szöveg követi (a margón álló "(1)" / oldalszám sorok nem számítanak)
+_PARAGRAPH_LINE = re.compile(r"^\s*\((?P<num>\d+)\)\s+\S")
+# Szakaszhatárok, amelyek után a szöveg már nem az előző cikkhez tartozik: fejezet / rész / cím,
+# melléklet, záró rendelkezések; román: "CAPITOLUL II", "TITLUL I", "Secțiunea 2", "Anexa nr. 1",
+# "Dispoziții finale". Csak rövid (címsor jellegű) sorokra illesztjük.
+_SECTION_LINE = re.compile(
+    r"^\s*(?:(?:[IVXLCDM]+|\d+)\.\s*(?:fejezet|rész|cím|(?:számú\s+)?melléklet)\b"
+    r"|mellékletek?\b|záró\s+(?:és\s+vegyes\s+)?rendelkezések\b"
+    r"|(?:capitolul|titlul|sec[țţt]iunea|anexa|anexă)\b|dispozi[țţt]ii\s+(?:finale|tranzitorii)\b)",
+    re.IGNORECASE,
+)
+_SECTION_LINE_MAX = 100
+
+# Hivatkozások a kérdés szövegében, pl. "IX. cikk (2)", "ix. cikk (2) bekezdés", "3. cikk 4. bekezdés",
+# "R) cikk", "Art. 5 alin. (2)", "articolul 5"
+_HU_ARTICLE_QUERY = re.compile(
+    r"(?P<id>\b[IVXLCDM]+|\b\d+|\b[A-Z])\s*(?P<sep>[.)])\s*cikk(?:[a-záéíóöőúüű]*)"
+    r"(?:\s*(?:\(\s*(?P<par>\d+)\s*\)|(?P<par2>\d+)\.\s*(?:bekezdés|bek\.)))?",
+    re.IGNORECASE,
+)
+_RO_ARTICLE_QUERY = re.compile(
+    r"\b(?:art\.?|articolul)\s*(?P<num>\d+)(?:\s*(?:alin\.?|alineatul)?\s*\(\s*(?P<par>\d+)\s*\))?",
+    re.IGNORECASE,
+)
+
+
+def _hu_article_key(raw_id: str, sep: str) -> str:
+    """Egységes cikk-kulcs: arab "3. cikk", római "IX. cikk", betűs "R) cikk".
+    Az egybetűs római számokkal (I, V, X, L, C, D, M) egyező betűs cikkek ponttal írva nem
+    különböztethetők meg a római számozásútól, ezek a római kulcsot kapják.
+    """
+    ident = raw_id.strip().upper()
+    if ident.isdigit():
+        return f"{int(ident)}. cikk"
+    if len(ident) == 1 and (sep == ")" or ident not in "IVXLCDM"):
+        return f"{ident}) cikk"
+    return f"{ident}. cikk"
+
+
+def _is_section_line(line: str) -> bool:
+    return len(line.strip()) <= _SECTION_LINE_MAX and bool(_SECTION_LINE.match(line))
+
+
+def _is_heading(line: str) -> bool:
+    """Cikk- vagy szakaszcím sor (pl. "2. cikk", "Art. 6", "II. FEJEZET", "Anexa nr. 1")."""
+    return bool(_HU_ARTICLE_LINE.match(line) or _RO_ARTICLE_LINE.match(line)) or _is_section_line(line)
+
+
+def reference_key(article: str, paragraph: Optional[str] = None) -> str:
+    """Egységes hivatkozás kulcs: "IX. cikk", "IX. cikk (2)", "Art. 5 (1)"."""
+    return f"{article} ({int(paragraph)})" if paragraph else article
+
+
+def extract_chunk_references(chunks: List[str]) -> List[List[str]]:
+    """Strukturális hivatkozások kinyerése egy dokumentum sorrendben lévő chunkjaiból.
+
+    Soronként követjük az aktuális cikket és bekezdést (az állapot chunkról chunkra öröklődik,
+    mert egy cikk több chunkon is átnyúlhat), és minden chunkhoz visszaadjuk az érintett
+    cikk és cikk+bekezdés kulcsokat. Szakaszhatáron (fejezet, melléklet, záró rendelkezések)
+    az állapot törlődik, hogy pl. a mellékletek ne kapják meg az utolsó cikk kulcsát.
+    """
+    article: Optional[str] = None
+    paragraph: Optional[str] = None
+    references: List[List[str]] = []
+    for chunk in chunks:
+        keys: List[str] = []
+        seen: Set[str] = set()
+
+        def mark(key: str):
+            if key not in seen:
+                seen.add(key)
+                keys.append(key)
+
+        lines = chunk.split("\n")
+        # Az előző cikk csak akkor öröklődik, ha a chunk nem új cikk- vagy szakaszcímmel kezdődik
+        # (a chunkolás a cikkcímeknél vág, így ez a gyakori eset)
+        if article and not _is_heading(next((line for line in lines if line.strip()), "")):
+            mark(article)
+        for line in lines:
+            hu = _HU_ARTICLE_LINE.match(line)
+            ro = None if hu else _RO_ARTICLE_LINE.match(line)
+            if hu or ro:
+                article = _hu_article_key(hu.group("id"), hu.group("sep")) if hu else f"Art. {int(ro.group('num'))}"
+                paragraph = None
+                mark(article)
+                continue
+            if article and _is_section_line(line):
+                article = paragraph = None
+                continue
+            par = _PARAGRAPH_LINE.match(line)
+            if par and article:
+                paragraph = par.group("num")
+            if article and paragraph and line.strip():
+                mark(reference_key(article, paragraph))
+        references.append(keys)
+    return references
+
+
+def parse_query_references(text: str) -> List[str]:
+    """A kérdésben explicit módon megnevezett hivatkozások kulcsai (előfordulási sorrendben)."""
+    keys: List[str] = []
+    for m in _HU_ARTICLE_QUERY.finditer(text or ""):
+        keys.append(reference_key(_hu_article_key(m.group("id"), m.group("sep")), m.group("par") or m.group("par2")))
+    for m in _RO_ARTICLE_QUERY.finditer(text or ""):
+        keys.append(reference_key(f"Art. {int(m.group('num'))}", m.group("par")))
+    return list(dict.fromkeys(keys))
+
+
+class ReferenceIndex:
+    """Hivatkozás → chunk azonosítók (tároló sorok) keresőtábla: a kérdésben megnevezett
+    cikkek / bekezdések O(1) idejű feloldásához, embedding és vektoros keresés nélkül.
+    """
+
+    def __init__(self):
+        self.table: Dict[str, List[int]] = {}
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def add(self, start_row: int, chunk_references: Iterable[List[str]]):
+        with self._lock:
+            row = start_row
+            for keys in chunk_references:
+                for key in keys:
+                    self.table.setdefault(key, []).append(row)
+                row += 1
+            self.rows = max(self.rows, row)
+
+    def lookup(self, keys: List[str]) -> List[int]:
+        """A kulcsokhoz tartozó sorok (kulcsonként dokumentum- és chunksorrendben, ismétlés nélkül)."""
+        rows: List[int] = []
+        for key in keys:
+            rows.extend(self.table.get(key, []))
+        return list(dict.fromkeys(rows))
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        tmp = os.path.join(path, _REFERENCES + ".tmp")
+        with self._lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"rows": self.rows, "table": self.table}, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(path, _REFERENCES))
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ReferenceIndex"]:
+        file_path = os.path.join(path, _REFERENCES)
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls()
+        index.rows = int(data.get("rows", 0))
+        index.table = {k: [int(r) for r in v] for k, v in data.get("table", {}).items()}
+        return index
+
+    @classmethod
+    def build_from_store(cls, store) -> "ReferenceIndex":
+        """Újraépítés a tároló szövegeiből, dokumentumonként sorrendben (pl. tömörítés után)."""
+        index = cls()
+        for _, ranges in sorted(store.document_row_ranges().items(), key=lambda item: item[1][0][0]):
+            for start, end in ranges:
+                texts = [store.get(row)["text"] for row in range(start, end)]
+                index.add(start, extract_chunk_references(texts))
+        index.rows = len(store)
+        return index
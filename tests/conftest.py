@@ -0,0 +1,5 @@
+import os
+import sys
+
+# A modulok a repó gyökerében vannak (nincs csomag): tegyük importálhatóvá őket a tesztekből
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,228 @@
+import time
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import http_transport
+from http_transport import (AsyncRetryingTransport, CallMetrics, CircuitBreaker, CircuitOpenError,
+                            RetryPolicy, RetryingTransport, get_http_pool)
+
+
+def _client(handler, max_retries=3, deadline=5.0, threshold=5, reset=30.0, timeout=60.0):
+    """httpx kliens a RetryingTransport-tal egy httpx.MockTransport fölött (hálózat nélkül)."""
+    policy = RetryPolicy(max_retries=max_retries, backoff_base=0.001, backoff_max=0.01, deadline=deadline)
+    breaker = CircuitBreaker(threshold, reset)
+    metrics = CallMetrics()
+    transport = RetryingTransport(httpx.MockTransport(handler), policy, breaker, metrics)
+    return httpx.Client(transport=transport, timeout=timeout), breaker, metrics
+
+
+def _sequence(*statuses, headers=None):
+    """Handler, amely sorban a megadott státuszokkal válaszol, és számolja a kéréseket."""
+    calls = []
+
+    def handler(request):
+        status = statuses[min(len(calls), len(statuses) - 1)]
+        calls.append(request)
+        return httpx.Response(status, headers=headers if status == 429 else None, json={"ok": status == 200})
+
+    return handler, calls
+
+
+def test_retries_transient_errors_until_success():
+    handler, calls = _sequence(503, 429, 200)
+    client, breaker, metrics = _client(handler)
+    response = client.get("http://mock/v1/chat")
+    assert response.status_code == 200
+    assert len(calls) == 3
+    stats = metrics.stats()
+    assert stats["calls"] == 1 and stats["retries"] == 2 and stats["errors"] == 0
+    assert breaker.state == "closed"
+
+
+def test_does_not_retry_client_errors():
+    handler, calls = _sequence(400)
+    client, _, metrics = _client(handler)
+    assert client.get("http://mock/v1/chat").status_code == 400
+    assert len(calls) == 1
+    assert metrics.stats()["errors"] == 1
+
+
+def test_gives_up_after_max_retries():
+    handler, calls = _sequence(503)
+    client, _, metrics = _client(handler, max_retries=2)
+    assert client.get("http://mock/v1/chat").status_code == 503
+    assert len(calls) == 3
+    assert metrics.stats()["retries"] == 2
+
+
+def test_retry_after_header_is_lower_bound():
+    handler, calls = _sequence(429, 200, headers={"retry-after": "0.2"})
+    client, _, metrics = _client(handler)
+    start = time.perf_counter()
+    assert client.get("http://mock/v1/chat").status_code == 200
+    assert time.perf_counter() - start >= 0.2
+    assert metrics.recent(1)[0]["waited"] >= 0.2
+
+
+def test_retry_after_ms_header():
+    response = httpx.Response(429, headers={"retry-after-ms": "1500"})
+    assert http_transport.retry_after_seconds(response) == pytest.approx(1.5)
+
+
+def test_retry_after_beyond_deadline_is_not_waited():
+    handler, calls = _sequence(429, 200, headers={"retry-after": "30"})
+    client, _, _ = _client(handler, deadline=1.0)
+    start = time.perf_counter()
+    assert client.get("http://mock/v1/chat").status_code == 429
+    assert time.perf_counter() - start < 1.0
+    assert len(calls) == 1
+
+
+def test_attempt_timeouts_shrink_to_remaining_deadline():
+    timeouts = []
+
+    def handler(request):
+        timeouts.append(dict(request.extensions["timeout"]))
+        if len(timeouts) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200)
+
+    client, _, _ = _client(handler, deadline=2.0, timeout=60.0)
+    assert client.get("http://mock/v1/chat").status_code == 200
+    assert len(timeouts) == 3
+    for t in timeouts:
+        assert all(value <= 2.0 for value in t.values())
+    assert timeouts[-1]["read"] <= timeouts[0]["read"]
+
+
+def test_transport_errors_are_retried_then_raised():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ConnectError("kapcsolódási hiba", request=request)
+
+    client, breaker, metrics = _client(handler, max_retries=2)
+    with pytest.raises(httpx.ConnectError):
+        client.get("http://mock/v1/chat")
+    assert len(calls) == 3
+    assert metrics.recent(1)[0]["error"] == "ConnectError"
+
+
+def test_breaker_opens_and_rejects_without_network_call():
+    handler, calls = _sequence(503)
+    client, breaker, metrics = _client(handler, max_retries=0, threshold=3, reset=60.0)
+    for _ in range(3):
+        client.get("http://mock/v1/chat")
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        client.get("http://mock/v1/chat")
+    assert len(calls) == 3
+    assert metrics.stats()["rejected"] == 1
+    assert breaker.retry_in() > 0
+
+
+def test_breaker_half_open_trial_success_closes():
+    handler, calls = _sequence(503, 503, 200)
+    client, breaker, _ = _client(handler, max_retries=0, threshold=2, reset=0.05)
+    client.get("http://mock/v1/chat")
+    client.get("http://mock/v1/chat")
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert client.get("http://mock/v1/chat").status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_breaker_half_open_trial_failure_reopens():
+    handler, calls = _sequence(503)
+    client, breaker, _ = _client(handler, max_retries=0, threshold=1, reset=0.05)
+    client.get("http://mock/v1/chat")
+    time.sleep(0.06)
+    client.get("http://mock/v1/chat")
+    assert breaker.state == "open"
+    assert len(calls) == 2
+
+
+def test_breaker_allows_single_trial_in_half_open():
+    breaker = CircuitBreaker(threshold=1, reset_seconds=0.0)
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_unexpected_error_in_trial_releases_breaker():
+    state = {"n": 0}
+
+    def handler(request):
+        state["n"] += 1
+        if state["n"] == 1:
+            return httpx.Response(503)
+        if state["n"] == 2:
+            raise RuntimeError("váratlan hiba")
+        return httpx.Response(200)
+
+    client, breaker, _ = _client(handler, max_retries=0, threshold=1, reset=0.01)
+    client.get("http://mock/v1/chat")
+    time.sleep(0.02)
+    with pytest.raises(RuntimeError):
+        client.get("http://mock/v1/chat")
+    # A félbeszakadt próbahívás után újabb próba engedélyezett (nem ragad nyitva)
+    assert client.get("http://mock/v1/chat").status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_async_transport_retries_and_releases_on_cancel():
+    policy = RetryPolicy(max_retries=3, backoff_base=0.001, backoff_max=0.01, deadline=5.0)
+    breaker = CircuitBreaker(1, 0.01)
+    metrics = CallMetrics()
+    handler, calls = _sequence(503, 200)
+
+    async def run():
+        transport = AsyncRetryingTransport(httpx.MockTransport(handler), policy, breaker, metrics)
+        async with httpx.AsyncClient(transport=transport) as client:
+            response = await client.get("http://mock/v1/chat")
+        return response.status_code
+
+    assert asyncio.run(run()) == 200
+    assert len(calls) == 2 and metrics.stats()["retries"] == 1
+
+    async def slow(request):
+        await asyncio.sleep(10)
+        return httpx.Response(200)
+
+    class SlowTransport(httpx.AsyncBaseTransport):
+        async def handle_async_request(self, request):
+            return await slow(request)
+
+    async def cancelled():
+        breaker.record_failure()
+        await asyncio.sleep(0.02)
+        transport = AsyncRetryingTransport(SlowTransport(), policy, breaker, metrics)
+        async with httpx.AsyncClient(transport=transport) as client:
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(client.get("http://mock/v1/chat"), 0.05)
+
+    asyncio.run(cancelled())
+    assert breaker.allow()
+
+
+def _config(**overrides):
+    values = dict(LLM_TIMEOUT=60.0, LLM_CONNECT_TIMEOUT=5.0, LLM_MAX_CONNECTIONS=10, LLM_MAX_RETRIES=3,
+                  LLM_BACKOFF_BASE=0.5, LLM_BACKOFF_MAX=8.0, LLM_BREAKER_THRESHOLD=5, LLM_BREAKER_RESET=30.0)
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def test_http_pool_is_rebuilt_when_settings_change():
+    first = get_http_pool(_config())
+    assert get_http_pool(_config()) is first
+    second = get_http_pool(_config(LLM_MAX_RETRIES=1, LLM_TIMEOUT=10.0))
+    assert second is not first
+    assert second.policy.max_retries == 1 and second.policy.deadline == 10.0
@@ -0,0 +1,25 @@
+from reference_index import extract_chunk_references, parse_query_references
+
+
+def test_chunk_starting_with_article_heading_does_not_inherit_previous_article():
+    refs = extract_chunk_references(["1. cikk\n(1) Első bekezdés.", "2. cikk\n(1) Második cikk szövege."])
+    assert refs == [["1. cikk", "1. cikk (1)"], ["2. cikk", "2. cikk (1)"]]
+
+
+def test_romanian_chunks_split_at_article_headings():
+    refs = extract_chunk_references(["Art. 5\n(1) Textul articolului.", "\n  Art. 6\n(1) Alt text."])
+    assert refs == [["Art. 5", "Art. 5 (1)"], ["Art. 6", "Art. 6 (1)"]]
+
+
+def test_article_continuing_into_next_chunk_is_carried():
+    refs = extract_chunk_references(["IX. cikk\n(1) Első bekezdés", "folytatás\n(2) Második bekezdés"])
+    assert refs[1] == ["IX. cikk", "IX. cikk (1)", "IX. cikk (2)"]
+
+
+def test_section_heading_resets_article():
+    refs = extract_chunk_references(["X. cikk\n(1) Szöveg", "Záró rendelkezések\n1. Ez a törvény", "1. melléklet a törvényhez"])
+    assert refs[1] == [] and refs[2] == []
+
+
+def test_parse_query_references():
+    assert parse_query_references("Mit mond az IX. cikk (2) bekezdése és az Art. 5?") == ["IX. cikk (2)", "Art. 5"]
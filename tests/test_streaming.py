@@ -0,0 +1,179 @@
+import hashlib
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from answer_cache import SemanticAnswerCache
+from config import reload_config
+from groq_client import GroqClient
+from rag_system import RAGSystem
+
+CHUNKS = [
+    {"chunk_id": 3, "document_name": "alaptorveny.pdf", "text": "Az Országgyűlés Magyarország legfőbb népképviseleti szerve.",
+     "similarity_score": 0.82, "page_start": 12, "page_end": 12},
+    {"chunk_id": 7, "document_name": "alaptorveny.pdf", "text": "Az Országgyűlés megalkotja Magyarország törvényeit.",
+     "similarity_score": 0.74, "page_start": 13, "page_end": 13},
+]
+
+
+def _delta(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class FakeCompletions:
+    """A groq `chat.completions` helyi hamisítványa: stream=True esetén delta darabokat ad."""
+
+    def __init__(self, pieces, fail_at=None, fail_on_create=False):
+        self.pieces = pieces
+        self.fail_at = fail_at
+        self.fail_on_create = fail_on_create
+        self.calls = []
+
+    def create(self, messages, model, max_tokens, temperature, stream=False):
+        self.calls.append({"messages": messages, "stream": stream})
+        if self.fail_on_create:
+            raise RuntimeError("a Groq API nem érhető el")
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="".join(self.pieces)))])
+        return self._stream()
+
+    def _stream(self):
+        yield SimpleNamespace(choices=[])  # a szerepet / usage-t hordozó darabok tartalom nélkül
+        yield _delta(None)
+        for i, piece in enumerate(self.pieces):
+            if self.fail_at is not None and i == self.fail_at:
+                raise RuntimeError("a kapcsolat megszakadt")
+            yield _delta(piece)
+        yield _delta("")
+
+
+class FakeGroq:
+    def __init__(self, *args, **kwargs):
+        self.chat = SimpleNamespace(completions=FakeCompletions(*args, **kwargs))
+
+    @property
+    def calls(self):
+        return self.chat.completions.calls
+
+
+class FakeEmbeddingManager:
+    """A RAGSystem által a streameléshez használt EmbeddingManager felület minimuma."""
+
+    index_version = (1, len(CHUNKS), 0)
+
+    def encode_query(self, question):
+        seed = int(hashlib.md5(question.encode("utf-8")).hexdigest(), 16) % (2 ** 32)
+        vector = np.random.default_rng(seed).normal(size=16).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture(autouse=True)
+def _config(tmp_path, monkeypatch):
+    # Tokenizer letöltés nélkül (becslés), a könyvtárak az ideiglenes mappában
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("LLM_TOKENIZER", "")
+    monkeypatch.setenv("PROMPT_CACHE_SIMULATE", "false")
+    reload_config()
+    yield
+    monkeypatch.undo()
+    reload_config()
+
+
+def _system(fake, answer_cache=True, retrieve=None):
+    """RAGSystem index betöltés nélkül: hamis Groq kliens, rögzített visszakeresési eredmény."""
+    system = RAGSystem.__new__(RAGSystem)
+    system.config = reload_config()
+    system.groq_client = GroqClient(client=fake)
+    system.embedding_manager = FakeEmbeddingManager()
+    system.answer_cache = SemanticAnswerCache() if answer_cache else None
+    system.documents_loaded = True
+    system._retrieve = retrieve or (lambda question, k, filters=None, query_vector=None: [dict(c) for c in CHUNKS])
+    return system
+
+
+def test_client_stream_yields_deltas_in_order():
+    fake = FakeGroq(["Az ", "Országgyűlés ", "alkotja ", "a törvényeket."])
+    pieces = list(GroqClient(client=fake).generate_response_stream("Mit csinál az Országgyűlés?", CHUNKS))
+    assert pieces == ["Az ", "Országgyűlés ", "alkotja ", "a törvényeket."]
+    assert fake.calls[0]["stream"] is True
+
+
+def test_client_stream_error_on_create_yields_single_error_piece():
+    fake = FakeGroq(["x"], fail_on_create=True)
+    pieces = list(GroqClient(client=fake).generate_response_stream("kérdés", CHUNKS))
+    assert len(pieces) == 1
+    assert pieces[0].startswith("Hiba történt a válasz generálása során")
+
+
+def test_client_stream_error_mid_stream_keeps_received_pieces():
+    fake = FakeGroq(["első ", "második ", "harmadik"], fail_at=2)
+    pieces = list(GroqClient(client=fake).generate_response_stream("kérdés", CHUNKS))
+    assert pieces[:2] == ["első ", "második "]
+    assert pieces[2].startswith("Hiba történt") and "megszakadt" in pieces[2]
+
+
+def test_query_stream_event_order_and_done_answer():
+    fake = FakeGroq(["Az Országgyűlés ", "a legfőbb ", "népképviseleti szerv."])
+    events = list(_system(fake).query_stream("Mi az Országgyűlés?"))
+    types = [e["type"] for e in events]
+    assert types[0] == "sources" and types[-1] == "done"
+    assert set(types[1:-1]) == {"token"} and len(types) == 5
+    done = events[-1]
+    assert done["answer"] == "".join(e["text"] for e in events if e["type"] == "token")
+    assert done["answer"] == "Az Országgyűlés a legfőbb népképviseleti szerv."
+    assert done["cached"] is False
+    assert done["sources"] == events[0]["sources"]
+    assert [s["document"] for s in done["sources"]] == ["alaptorveny.pdf", "alaptorveny.pdf"]
+
+
+def test_query_stream_answer_cache_hit_skips_llm():
+    fake = FakeGroq(["Gyorsítótárazható ", "válasz."])
+    system = _system(fake)
+    first = list(system.query_stream("Mi az Országgyűlés?"))
+    second = list(system.query_stream("Mi az Országgyűlés?"))
+    assert len(fake.calls) == 1
+    assert [e["type"] for e in second] == ["sources", "token", "done"]
+    assert second[1]["text"] == first[-1]["answer"]
+    assert second[-1]["cached"] is True and second[-1]["answer"] == "Gyorsítótárazható válasz."
+    assert system.answer_cache.stats()["hits"] == 1
+
+
+def test_query_stream_error_answer_is_not_cached():
+    fake = FakeGroq(["x"], fail_on_create=True)
+    system = _system(fake)
+    events = list(system.query_stream("Mi az Országgyűlés?"))
+    assert [e["type"] for e in events] == ["sources", "token", "done"]
+    assert events[-1]["answer"].startswith("Hiba történt a válasz generálása során")
+    list(system.query_stream("Mi az Országgyűlés?"))
+    assert len(fake.calls) == 2
+    assert system.answer_cache.stats()["size"] == 0
+
+
+def test_query_stream_retrieval_failure_yields_done_only():
+    def failing(question, k, filters=None, query_vector=None):
+        raise RuntimeError("index hiba")
+
+    events = list(_system(FakeGroq(["x"]), retrieve=failing).query_stream("kérdés"))
+    assert len(events) == 1 and events[0]["type"] == "done"
+    assert events[0]["answer"].startswith("❌ Hiba történt a lekérdezés során") and events[0]["sources"] == []
+
+
+def test_query_stream_without_documents():
+    system = _system(FakeGroq(["x"]))
+    system.documents_loaded = False
+    events = list(system.query_stream("kérdés"))
+    assert [e["type"] for e in events] == ["done"]
+    assert events[0]["cached"] is False
+
+
+def test_query_stream_reports_prompt_prefix_cache(monkeypatch):
+    monkeypatch.setenv("PROMPT_CACHE_SIMULATE", "true")
+    monkeypatch.setenv("PROMPT_CACHE_MIN_TOKENS", "0")
+    fake = FakeGroq(["válasz"])
+    system = _system(fake, answer_cache=False)
+    first = list(system.query_stream("Mi az Országgyűlés?"))[-1]["prompt_cache"]
+    second = list(system.query_stream("Mit alkot az Országgyűlés?"))[-1]["prompt_cache"]
+    assert first["prompt_tokens"] > 0 and first["cached_tokens"] == 0
+    # Azonos rendszerprompt és kontextus: a második kérésnek csak a kérdés utáni része új
+    assert 0 < second["cached_tokens"] <= second["prompt_tokens"]
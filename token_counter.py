@@ -0,0 +1,139 @@
+import os
+import re
+import math
+import threading
+import numpy as np
+from typing import Iterable, List, Optional
+
+_COUNTS = "token_counts.npz"
+
+# Tokenizer nélküli becslés neve (a tárolt darabszámok mellé ez kerül tokenizer névként)
+APPROX = "approx"
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def approx_token_count(text: str) -> int:
+    """Óvatos becslés tokenizer nélkül: szavanként ~3 karakter / token (az ékezetes magyar
+    szavak BPE-ben több darabra esnek, mint az angolok), írásjelenként 1 token.
+    """
+    return sum(math.ceil(len(tok) / 3.0) if tok[0].isalnum() or tok[0] == "_" else 1
+               for tok in _WORD_RE.findall(text or ""))
+
+
+class TokenCounter:
+    """Az LLM tokenizerével (Hugging Face `tokenizers`, tokenizer.json) számolt tokenszám.
+    A tokenizer lustán, első használatkor töltődik be; ha nem érhető el (nincs telepítve,
+    offline), a becslésre (approx_token_count) esünk vissza, és a `name` ezt jelzi.
+    """
+
+    def __init__(self, tokenizer_name: str):
+        self.tokenizer_name = (tokenizer_name or "").strip()
+        self._tokenizer = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            if self.tokenizer_name:
+                try:
+                    from tokenizers import Tokenizer
+                    if os.path.exists(self.tokenizer_name):
+                        self._tokenizer = Tokenizer.from_file(self.tokenizer_name)
+                    else:
+                        self._tokenizer = Tokenizer.from_pretrained(self.tokenizer_name)
+                except Exception as e:
+                    print(f"ℹ️ A(z) '{self.tokenizer_name}' tokenizer nem tölthető be ({e}), tokenszám becslés következik.")
+                    self._tokenizer = None
+            self._loaded = True
+
+    @property
+    def name(self) -> str:
+        self._load()
+        return self.tokenizer_name if self._tokenizer is not None else APPROX
+
+    def encode(self, text: str) -> List:
+        """Tokenek (azonosítók; tokenizer nélkül a szó- és írásjel-darabok) a prefix-összehasonlításhoz."""
+        self._load()
+        if self._tokenizer is None:
+            return _WORD_RE.findall(text or "")
+        return self._tokenizer.encode(text or "", add_special_tokens=False).ids
+
+    def count(self, text: str) -> int:
+        return self.count_batch([text])[0]
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        self._load()
+        if not texts:
+            return []
+        if self._tokenizer is None:
+            return [approx_token_count(t) for t in texts]
+        return [len(e.ids) for e in self._tokenizer.encode_batch(list(texts), add_special_tokens=False)]
+
+
+_counter: Optional[TokenCounter] = None
+_counter_lock = threading.Lock()
+
+
+def get_token_counter(config) -> TokenCounter:
+    """A folyamat közös tokenszámlálója (LLM_TOKENIZER); újratöltött konfigurációnál újra készül."""
+    global _counter
+    with _counter_lock:
+        if _counter is None or _counter.tokenizer_name != (config.LLM_TOKENIZER or "").strip():
+            _counter = TokenCounter(config.LLM_TOKENIZER)
+        return _counter
+
+
+class ChunkTokenCounts:
+    """Chunkonkénti tokenszámok a tároló soraival azonos sorazonosítókkal (ingest során számolva),
+    hogy a kontextus összeállításakor ne kelljen újratokenizálni a szövegeket.
+    """
+
+    def __init__(self, tokenizer: str = APPROX):
+        self.tokenizer = tokenizer
+        self.counts = np.zeros(0, dtype=np.int32)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return int(self.counts.shape[0])
+
+    def add(self, start_row: int, counts: Iterable[int]):
+        with self._lock:
+            if start_row != len(self):
+                raise ValueError(f"Tokenszámok: nem folytonos sorazonosító ({start_row} != {len(self)})")
+            self.counts = np.concatenate([self.counts, np.asarray(list(counts), dtype=np.int32)])
+
+    def get(self, row: int) -> Optional[int]:
+        return int(self.counts[row]) if 0 <= row < len(self) else None
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        tmp = os.path.join(path, "token_counts.tmp.npz")
+        with self._lock:
+            np.savez(tmp, counts=self.counts, tokenizer=np.array(self.tokenizer))
+        os.replace(tmp, os.path.join(path, _COUNTS))
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ChunkTokenCounts"]:
+        file_path = os.path.join(path, _COUNTS)
+        if not os.path.exists(file_path):
+            return None
+        with np.load(file_path) as data:
+            index = cls(str(data["tokenizer"]))
+            index.counts = data["counts"].astype(np.int32)
+        return index
+
+    @classmethod
+    def build(cls, counter: TokenCounter, texts: Iterable[str], batch: int = 1024) -> "ChunkTokenCounts":
+        index = cls(counter.name)
+        buf: List[str] = []
+        for text in texts:
+            buf.append(text)
+            if len(buf) >= batch:
+                index.add(len(index), counter.count_batch(buf))
+                buf = []
+        if buf:
+            index.add(len(index), counter.count_batch(buf))
+        return index
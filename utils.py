@@ -1,5 +1,98 @@
-# Ez a fájl jelenleg üres, mivel a funkciókat
-# a releváns modulokba integráltuk a jobb
-# átláthatóság érdekében (pl. document_processor.py).
-# A jövőbeli, megosztott segédfüggvények számára van fenntartva.
-pass
\ No newline at end of file
+"""Megosztott segédfüggvények: vektorizált MMR kiválasztás, hátizsák kiválasztás, háttér asyncio eseményhurok."""
+import asyncio
+import threading
+from typing import List, Any, Coroutine
+import numpy as np
+
+
+def mmr_select_indices(query_sims: np.ndarray, embeddings: np.ndarray, k: int, lambda_param: float = 0.6) -> List[int]:
+    """Maximal Marginal Relevance kiválasztás NumPy-val.
+
+    A jelöltek és a már kiválasztott elemek közötti maximális hasonlóságot egy futó
+    vektorban tartjuk, amit kiválasztásonként egyetlen mátrix-vektor szorzással frissítünk,
+    a következő elemet pedig argmax-szal választjuk. Költség: O(k·n·d), teljes n×n
+    páronkénti mátrix és Python szintű belső ciklus nélkül.
+
+    Args:
+        query_sims: (n,) a jelöltek hasonlósága a lekérdezéshez.
+        embeddings: (n, d) normalizált jelölt vektorok (IP = koszinusz).
+        k: kiválasztandó elemek száma.
+        lambda_param: relevancia/diverzitás súly (1.0 = tiszta relevancia).
+
+    Returns:
+        A kiválasztott jelöltek indexei kiválasztási sorrendben.
+    """
+    sims = np.asarray(query_sims, dtype=np.float32).reshape(-1)
+    n = sims.shape[0]
+    if n == 0:
+        return []
+    k = max(1, min(int(k), n))
+    emb = np.asarray(embeddings, dtype=np.float32)
+
+    relevance = lambda_param * sims
+    penalty_weight = 1.0 - lambda_param
+    available = np.ones(n, dtype=bool)
+
+    first = int(np.argmax(sims))
+    selected = [first]
+    available[first] = False
+    # Futó max-hasonlóság a már kiválasztott halmazhoz
+    max_sim = emb @ emb[first]
+
+    while len(selected) < k:
+        scores = relevance - penalty_weight * max_sim
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_sim, emb @ emb[best], out=max_sim)
+    return selected
+
+
+def knapsack_select(values: List[float], weights: List[int], capacity: int, unit: int = 8) -> List[int]:
+    """0/1 hátizsák: a legnagyobb összértékű elemhalmaz, amelynek összsúlya legfeljebb capacity.
+
+    Dinamikus programozás a kapacitás felett NumPy-sorokkal (elemenként egy vektorizált lépés).
+    A súlyokat `unit` egységekre kerekítjük felfelé (pl. 8 token), így a tábla mérete
+    n × capacity/unit marad, és a kiválasztott halmaz biztosan belefér a keretbe.
+
+    Returns:
+        A kiválasztott elemek indexei növekvő sorrendben.
+    """
+    n = len(values)
+    cap = int(capacity) // unit
+    if n == 0 or cap <= 0:
+        return []
+    w = [max(1, -(-int(x) // unit)) for x in weights]
+    best = np.zeros(cap + 1, dtype=np.float64)
+    take = np.zeros((n, cap + 1), dtype=bool)
+    for i in range(n):
+        if w[i] > cap:
+            continue
+        candidate = best[:cap + 1 - w[i]] + float(values[i])
+        improved = candidate > best[w[i]:]
+        take[i, w[i]:] = improved
+        best[w[i]:] = np.where(improved, candidate, best[w[i]:])
+    selected = []
+    c = int(np.argmax(best))
+    for i in range(n - 1, -1, -1):
+        if take[i, c]:
+            selected.append(i)
+            c -= w[i]
+    return sorted(selected)
+
+
+class BackgroundEventLoop:
+    """Saját daemon szálon futó, hosszú életű asyncio eseményhurok.
+    A szinkron kód (Streamlit) ide küldi a korutinokat; mivel a hurok nem áll le két hívás
+    között, az aszinkron HTTP kliensek kapcsolatai hívásról hívásra újrahasznosíthatók.
+    """
+
+    def __init__(self, name: str = "rag-async-loop"):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def run(self, coro: Coroutine) -> Any:
+        """Korutin futtatása a háttérhurkon, az eredményre blokkolva várva."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()